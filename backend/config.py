@@ -4,16 +4,19 @@
 @Time    : 2021/3/24 9:36 上午
 @FileName: config.py
 @desc: 项目配置文件，可以在这里调参，牺牲时间换取精确度，或者牺牲准确度换取时间
+导入本模块时不做任何硬件探测、文件读写与模型合并，读取配置文件、探测GPU、确定模型路径都在第一次访问对应配置项时进行并缓存
 """
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 import configparser
+import json
 import os
 import re
+import sys
+import threading
 import time
+import types
 from pathlib import Path
-from filesplit.split import Split as Filesplit
-import paddle
 from backend.tools.constant import *
 
 # 项目版本号
@@ -23,20 +26,7 @@ VERSION = "2.0.3"
 BASE_DIR = str(Path(os.path.abspath(__file__)).parent)
 
 # ×××××××××××××××××××× [不要改]读取配置文件 start ××××××××××××××××××××
-# 读取settings.ini配置
-settings_config = configparser.ConfigParser()
 MODE_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini')
-if not os.path.exists(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini')):
-    # 如果没有配置文件，默认使用中文
-    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.ini'), mode='w', encoding='utf-8') as f:
-        f.write('[DEFAULT]\n')
-        f.write('Interface = 简体中文\n')
-        f.write('Language = ch\n')
-        f.write('Mode = fast')
-settings_config.read(MODE_CONFIG_PATH, encoding='utf-8')
-
-# 读取interface下的语言配置,e.g. ch.ini
-interface_config = configparser.ConfigParser()
 INTERFACE_KEY_NAME_MAP = {
     '简体中文': 'ch',
     '繁體中文': 'chinese_cht',
@@ -46,9 +36,34 @@ INTERFACE_KEY_NAME_MAP = {
     'Tiếng Việt': 'vi',
     'Español': 'es'
 }
-interface_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface',
-                              f"{INTERFACE_KEY_NAME_MAP[settings_config['DEFAULT']['Interface']]}.ini")
-interface_config.read(interface_file, encoding='utf-8')
+# 由settings.ini决定的配置项
+SETTINGS_NAMES = ('settings_config', 'interface_file', 'interface_config', 'REC_CHAR_TYPE', 'MODE_TYPE')
+
+
+def load_settings():
+    """
+    读取settings.ini配置及interface下的语言配置(e.g. ch.ini)
+    """
+    if not os.path.exists(MODE_CONFIG_PATH):
+        # 如果没有配置文件，默认使用中文
+        with open(MODE_CONFIG_PATH, mode='w', encoding='utf-8') as f:
+            f.write('[DEFAULT]\n')
+            f.write('Interface = 简体中文\n')
+            f.write('Language = ch\n')
+            f.write('Mode = fast')
+    settings_config = configparser.ConfigParser()
+    settings_config.read(MODE_CONFIG_PATH, encoding='utf-8')
+    interface_config = configparser.ConfigParser()
+    interface_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface',
+                                  f"{INTERFACE_KEY_NAME_MAP[settings_config['DEFAULT']['Interface']]}.ini")
+    interface_config.read(interface_file, encoding='utf-8')
+    return {'settings_config': settings_config,
+            'interface_file': interface_file,
+            'interface_config': interface_config,
+            # 设置识别语言
+            'REC_CHAR_TYPE': settings_config['DEFAULT']['Language'],
+            # 设置识别模式
+            'MODE_TYPE': settings_config['DEFAULT']['Mode']}
 # ×××××××××××××××××××× [不要改]读取配置文件 end ××××××××××××××××××××
 
 
@@ -62,82 +77,83 @@ if re.search(r"[\u4e00-\u9fa5]+", BASE_DIR):
 # 如果路径包含空格，设置路径为非法
 if re.search(r"\s", BASE_DIR):
     IS_LEGAL_PATH = False
-# 如果为程序存放在非法路径则一直提示用户路径不合法
-while not IS_LEGAL_PATH:
-    print(interface_config['Main']['IllegalPathWarning'])
-    time.sleep(3)
+
+
+def check_legal_path():
+    """
+    如果为程序存放在非法路径则一直提示用户路径不合法，在开始提取字幕前调用
+    """
+    while not IS_LEGAL_PATH:
+        print(_get('interface_config')['Main']['IllegalPathWarning'])
+        time.sleep(3)
 # ×××××××××××××××××××× [不要改]判断程序运行路径是否合法 end ××××××××××××××××××××
 
 
 # ×××××××××××××××××××× [不要改]判断是否使用GPU start ××××××××××××××××××××
-# 是否使用GPU(Nvidia)
-USE_GPU = False
-# 如果paddlepaddle编译了gpu的版本
-if paddle.is_compiled_with_cuda():
-    # 查看是否有可用的gpu
-    if len(paddle.static.cuda_places()) > 0:
-        # 如果有GPU则使用GPU
-        USE_GPU = True
-
-# 是否使用ONNX(DirectML/AMD/Intel)
-ONNX_PROVIDERS = []
-if USE_GPU == False:
-    try:
-        import onnxruntime as ort
-        available_providers = ort.get_available_providers()
-        for provider in available_providers:
-            if provider in [
-                "CPUExecutionProvider"
-            ]:
-                continue
-            if provider not in [
-                "DmlExecutionProvider",         # DirectML，适用于 Windows GPU
-                "ROCMExecutionProvider",        # AMD ROCm
-                "MIGraphXExecutionProvider",    # AMD MIGraphX
-                # "VitisAIExecutionProvider",   # AMD VitisAI，适用于 RyzenAI & Windows
-                "OpenVINOExecutionProvider",    # Intel GPU
-                "MetalExecutionProvider",       # Apple macOS
-                "CoreMLExecutionProvider",      # Apple macOS
-                "CUDAExecutionProvider",        # Nvidia GPU
-            ]:
-                print(interface_config['Main']['OnnxExectionProviderNotSupportedSkipped'].format(provider))
-                continue
-            print(interface_config['Main']['OnnxExecutionProviderDetected'].format(provider))
-            ONNX_PROVIDERS.append(provider)
-    except ModuleNotFoundError as e:
-        print(interface_config['Main']['OnnxRuntimeNotInstall'])
-if len(ONNX_PROVIDERS) > 0:
-    USE_GPU = True
+# 硬件探测得到的配置项
+HARDWARE_NAMES = ('USE_GPU', 'ONNX_PROVIDERS')
+# 硬件探测结果会写入该环境变量，以spawn方式启动的OCR子进程继承环境变量后直接读取，不再重复探测
+HARDWARE_PROBE_ENV = 'VSE_HARDWARE_PROBE'
+
+
+def probe_hardware():
+    """
+    探测是否可以使用GPU(Nvidia)以及ONNX(DirectML/AMD/Intel)
+    """
+    if os.environ.get(HARDWARE_PROBE_ENV):
+        probe = json.loads(os.environ[HARDWARE_PROBE_ENV])
+        return {'USE_GPU': probe['USE_GPU'], 'ONNX_PROVIDERS': probe['ONNX_PROVIDERS']}
+    import paddle
+    interface_config = _get('interface_config')
+    # 是否使用GPU(Nvidia)
+    use_gpu = False
+    # 如果paddlepaddle编译了gpu的版本
+    if paddle.is_compiled_with_cuda():
+        # 查看是否有可用的gpu
+        if len(paddle.static.cuda_places()) > 0:
+            # 如果有GPU则使用GPU
+            use_gpu = True
+
+    # 是否使用ONNX(DirectML/AMD/Intel)
+    onnx_providers = []
+    if use_gpu == False:
+        try:
+            import onnxruntime as ort
+            available_providers = ort.get_available_providers()
+            for provider in available_providers:
+                if provider in [
+                    "CPUExecutionProvider"
+                ]:
+                    continue
+                if provider not in [
+                    "DmlExecutionProvider",         # DirectML，适用于 Windows GPU
+                    "ROCMExecutionProvider",        # AMD ROCm
+                    "MIGraphXExecutionProvider",    # AMD MIGraphX
+                    # "VitisAIExecutionProvider",   # AMD VitisAI，适用于 RyzenAI & Windows
+                    "OpenVINOExecutionProvider",    # Intel GPU
+                    "MetalExecutionProvider",       # Apple macOS
+                    "CoreMLExecutionProvider",      # Apple macOS
+                    "CUDAExecutionProvider",        # Nvidia GPU
+                ]:
+                    print(interface_config['Main']['OnnxExectionProviderNotSupportedSkipped'].format(provider))
+                    continue
+                print(interface_config['Main']['OnnxExecutionProviderDetected'].format(provider))
+                onnx_providers.append(provider)
+        except ModuleNotFoundError as e:
+            print(interface_config['Main']['OnnxRuntimeNotInstall'])
+    if len(onnx_providers) > 0:
+        use_gpu = True
+    os.environ[HARDWARE_PROBE_ENV] = json.dumps({'USE_GPU': use_gpu, 'ONNX_PROVIDERS': onnx_providers})
+    return {'USE_GPU': use_gpu, 'ONNX_PROVIDERS': onnx_providers}
 # ×××××××××××××××××××× [不要改]判断是否使用GPU end ××××××××××××××××××××
 
 
 # ×××××××××××××××××××× [不要改]读取语言、模型路径、字典路径 start ××××××××××××××××××××
-# 设置识别语言
-REC_CHAR_TYPE = settings_config['DEFAULT']['Language']
-
-# 设置识别模式
-MODE_TYPE = settings_config['DEFAULT']['Mode']
-ACCURATE_MODE_ON = False
-if MODE_TYPE == 'accurate':
-    ACCURATE_MODE_ON = True
-if MODE_TYPE == 'fast':
-    ACCURATE_MODE_ON = False
-if MODE_TYPE == 'auto':
-    if USE_GPU:
-        ACCURATE_MODE_ON = True
-    else:
-        ACCURATE_MODE_ON = False
 # 模型文件目录
-# 默认模型版本 V4
-MODEL_VERSION = 'V4'
 # 文本检测模型
 DET_MODEL_BASE = os.path.join(BASE_DIR, 'models')
 # 设置文本识别模型 + 字典
 REC_MODEL_BASE = os.path.join(BASE_DIR, 'models')
-# V3, V4模型默认图形识别的shape为3, 48, 320
-REC_IMAGE_SHAPE = '3,48,320'
-REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_det')
 
 LATIN_LANG = [
     'af', 'az', 'bs', 'cs', 'cy', 'da', 'de', 'es', 'et', 'fr', 'ga', 'hr',
@@ -161,85 +177,221 @@ OTHER_LANG = [
 MULTI_LANG = LATIN_LANG + ARABIC_LANG + CYRILLIC_LANG + DEVANAGARI_LANG + \
              OTHER_LANG
 
-DET_MODEL_FAST_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-
-
-# 如果设置了识别文本语言类型，则设置为对应的语言
-if REC_CHAR_TYPE in MULTI_LANG:
-    # 定义文本检测与识别模型
-    # 使用快速模式时，调用轻量级模型
-    if MODE_TYPE == 'fast':
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # 使用自动模式时，检测有没有使用GPU，根据GPU判断模型
-    elif MODE_TYPE == 'auto':
-        # 如果使用GPU，则使用大模型
-        if USE_GPU:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-            # 英文模式的ch模型识别效果好于fast
-            if REC_CHAR_TYPE == 'en':
-                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'ch_rec')
+# 由识别语言与识别模式决定的模型配置项
+MODEL_NAMES = ('ACCURATE_MODE_ON', 'MODEL_VERSION', 'REC_IMAGE_SHAPE', 'REC_MODEL_PATH', 'DET_MODEL_PATH',
+               'DET_MODEL_FAST_PATH')
+
+
+def resolve_model_paths():
+    """
+    根据识别语言与识别模式确定模型路径，模型文件被切分为小文件时合并生成完整文件
+    只有auto模式需要知道是否使用GPU，其余模式不进行硬件探测
+    """
+    rec_char_type = _get('REC_CHAR_TYPE')
+    mode_type = _get('MODE_TYPE')
+    accurate_mode_on = False
+    if mode_type == 'accurate':
+        accurate_mode_on = True
+    if mode_type == 'fast':
+        accurate_mode_on = False
+    if mode_type == 'auto':
+        if _get('USE_GPU'):
+            accurate_mode_on = True
+        else:
+            accurate_mode_on = False
+    # 默认模型版本 V4
+    model_version = 'V4'
+    # V3, V4模型默认图形识别的shape为3, 48, 320
+    rec_image_shape = '3,48,320'
+    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec')
+    det_model_path = os.path.join(DET_MODEL_BASE, model_version, f'{rec_char_type}_det')
+    det_model_fast_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det_fast')
+
+    # 如果设置了识别文本语言类型，则设置为对应的语言
+    if rec_char_type in MULTI_LANG:
+        # 定义文本检测与识别模型
+        # 使用快速模式时，调用轻量级模型
+        if mode_type == 'fast':
+            det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det_fast')
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec_fast')
+        # 使用自动模式时，检测有没有使用GPU，根据GPU判断模型
+        elif mode_type == 'auto':
+            # 如果使用GPU，则使用大模型
+            if _get('USE_GPU'):
+                det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det')
+                # 英文模式的ch模型识别效果好于fast
+                if rec_char_type == 'en':
+                    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'ch_rec')
+                else:
+                    rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec')
             else:
-                REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
+                det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det_fast')
+                rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec_fast')
+        else:
+            det_model_path = os.path.join(DET_MODEL_BASE, model_version, 'ch_det')
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec')
+        # 如果默认版本(V4)没有大模型，则切换为默认版本(V4)的fast模型
+        if not os.path.exists(rec_model_path):
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec_fast')
+        # 如果默认版本(V4)既没有大模型，又没有fast模型，则使用V3版本的大模型
+        if not os.path.exists(rec_model_path):
+            model_version = 'V3'
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec')
+        # 如果V3版本没有大模型，则使用V3版本的fast模型
+        if not os.path.exists(rec_model_path):
+            model_version = 'V3'
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'{rec_char_type}_rec_fast')
+
+        if rec_char_type in LATIN_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'latin_rec_fast')
+        elif rec_char_type in ARABIC_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'arabic_rec_fast')
+        elif rec_char_type in CYRILLIC_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'cyrillic_rec_fast')
+        elif rec_char_type in DEVANAGARI_LANG:
+            rec_model_path = os.path.join(REC_MODEL_BASE, model_version, f'devanagari_rec_fast')
+
+        # 定义图像识别shape
+        if model_version == 'V2':
+            rec_image_shape = '3,32,320'
         else:
-            DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det_fast')
-            REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    else:
-        DET_MODEL_PATH = os.path.join(DET_MODEL_BASE, MODEL_VERSION, 'ch_det')
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # 如果默认版本(V4)没有大模型，则切换为默认版本(V4)的fast模型
-    if not os.path.exists(REC_MODEL_PATH):
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-    # 如果默认版本(V4)既没有大模型，又没有fast模型，则使用V3版本的大模型
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec')
-    # 如果V3版本没有大模型，则使用V3版本的fast模型
-    if not os.path.exists(REC_MODEL_PATH):
-        MODEL_VERSION = 'V3'
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'{REC_CHAR_TYPE}_rec_fast')
-
-    if REC_CHAR_TYPE in LATIN_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'latin_rec_fast')
-    elif REC_CHAR_TYPE in ARABIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'arabic_rec_fast')
-    elif REC_CHAR_TYPE in CYRILLIC_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'cyrillic_rec_fast')
-    elif REC_CHAR_TYPE in DEVANAGARI_LANG:
-        REC_MODEL_PATH = os.path.join(REC_MODEL_BASE, MODEL_VERSION, f'devanagari_rec_fast')
-
-    # 定义图像识别shape
-    if MODEL_VERSION == 'V2':
-        REC_IMAGE_SHAPE = '3,32,320'
-    else:
-        REC_IMAGE_SHAPE = '3,48,320'
-
-    # 查看该路径下是否有文本模型识别完整文件，没有的话合并小文件生成完整文件
-    if 'inference.pdiparams' not in (os.listdir(REC_MODEL_PATH)):
-        fs = Filesplit()
-        fs.merge(input_dir=REC_MODEL_PATH)
-    # 查看该路径下是否有文本模型识别完整文件，没有的话合并小文件生成完整文件
-    if 'inference.pdiparams' not in (os.listdir(DET_MODEL_PATH)):
-        fs = Filesplit()
-        fs.merge(input_dir=DET_MODEL_PATH)
+            rec_image_shape = '3,48,320'
+
+        # 查看该路径下是否有文本模型识别完整文件，没有的话合并小文件生成完整文件
+        for model_path in (rec_model_path, det_model_path):
+            if 'inference.pdiparams' not in (os.listdir(model_path)):
+                from filesplit.split import Split as Filesplit
+                fs = Filesplit()
+                fs.merge(input_dir=model_path)
+    return {'ACCURATE_MODE_ON': accurate_mode_on,
+            'MODEL_VERSION': model_version,
+            'REC_IMAGE_SHAPE': rec_image_shape,
+            'REC_MODEL_PATH': rec_model_path,
+            'DET_MODEL_PATH': det_model_path,
+            'DET_MODEL_FAST_PATH': det_model_fast_path}
 # ×××××××××××××××××××× [不要改]读取语言、模型路径、字典路径 end ××××××××××××××××××××
 
 
+# ×××××××××××××××××××× [不要改]延迟计算配置项 start ××××××××××××××××××××
+# 配置项名称 -> 计算函数，同一个计算函数得到的配置项一起计算并缓存到模块中，之后的访问与普通模块变量相同
+LAZY_LOADERS = {name: loader for loader, names in ((load_settings, SETTINGS_NAMES),
+                                                   (probe_hardware, HARDWARE_NAMES),
+                                                   (resolve_model_paths, MODEL_NAMES)) for name in names}
+_lock = threading.RLock()
+# 已经延迟计算并缓存的配置项，被调用方直接赋值的配置项不在其中
+_resolved = set()
+
+
+def _get(name):
+    module_globals = globals()
+    if name in module_globals:
+        return module_globals[name]
+    loader = LAZY_LOADERS.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lock:
+        if name not in module_globals:
+            for key, value in loader().items():
+                if key not in module_globals:
+                    module_globals[key] = value
+                    _resolved.add(key)
+    return module_globals[name]
+
+
+def _forget(names):
+    """
+    丢弃缓存的配置项，下次访问时重新计算
+    """
+    module_globals = globals()
+    for name in names:
+        if name in _resolved:
+            _resolved.discard(name)
+            module_globals.pop(name, None)
+
+
+def reload_settings():
+    """
+    重新读取settings.ini，下次访问时重新确定识别语言、识别模式与模型路径
+    硬件不会在运行中变化，硬件探测结果保持不变；调用方直接赋值的配置项也保持不变
+    """
+    with _lock:
+        _forget(SETTINGS_NAMES + MODEL_NAMES)
+
+
+class _LazyConfigModule(types.ModuleType):
+    def __getattr__(self, name):
+        return _get(name)
+
+    def __setattr__(self, name, value):
+        with _lock:
+            _resolved.discard(name)
+            # 修改识别语言或识别模式后需要重新确定模型路径
+            if name in ('REC_CHAR_TYPE', 'MODE_TYPE', 'USE_GPU'):
+                _forget(MODEL_NAMES)
+            super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _LazyConfigModule
+# ×××××××××××××××××××× [不要改]延迟计算配置项 end ××××××××××××××××××××
+
+
 # --------------------- 请根据自己的实际情况改 start-----------------
 # 是否生成TXT文本字幕
 GENERATE_TXT = True
 
+# 指定了字幕区域时，是否边识别边将已确定的字幕追加写入srt文件，下游任务无需等待整个视频识别完成
+INCREMENTAL_SRT = False
+
 # 每张图中同时识别6个文本框中的文本，GPU显存越大，该数值可以设置越大
 REC_BATCH_NUM = 6
 # DB算法每个batch识别多少张，默认为10
 MAX_BATCH_SIZE = 10
 
+# 并行进行OCR识别的进程数，每个进程加载一份模型并平分CPU核心，识别结果会按帧号顺序重新排列
+# 多核CPU上可以调大以提高识别速度，使用GPU时建议为1
+OCR_WORKER_NUM = 1
+
+# OCR推理使用的CPU线程数，0为使用PaddleOCR的默认值，OCR_WORKER_NUM大于1时由各OCR进程平分
+# 批量处理时按分配给每个视频的核心数自动设置
+OCR_CPU_THREADS = 0
+
+# 批量处理(--batch)时同时处理的视频数，0为根据CPU核心数自动计算: CPU核心数 // BATCH_CORES_PER_VIDEO
+# 每个视频在各自的进程中提取，进程依次领取下一个视频，模型在进程内保持加载；使用GPU时建议设为1
+BATCH_VIDEO_WORKER_NUM = 0
+
+# 自动计算同时处理的视频数时每个视频占用的CPU核心数，其中一个核心用于解码视频帧，其余用于OCR推理
+BATCH_CORES_PER_VIDEO = 4
+
+# 是否使用常驻OCR服务进程：第一次提取字幕时启动服务进程并预热模型，同一程序中之后提取的视频(GUI、批量处理)复用已加载的模型
+# 服务进程在同一进程内识别，OCR_WORKER_NUM大于1时不使用服务
+OCR_SERVICE = True
+
+# 跨帧批量识别时每批最多包含的视频帧数，多帧的文本行合并后整批送入识别模型，以填满REC_BATCH_NUM，1为逐帧识别
+# 不宜超过共享内存槽位数SHARED_FRAME_SLOT_NUM的一半
+OCR_BATCH_FRAME_NUM = 4
+
 # 默认字幕出现区域为下方
 DEFAULT_SUBTITLE_AREA = SubtitleArea.UNKNOWN
 
 # 每一秒抓取多少帧进行OCR识别
 EXTRACT_FREQUENCY = 3
 
+# 是否使用二分查找细化字幕起止帧：先每隔BISECT_SAMPLE_INTERVAL秒稀疏采样一帧，相邻采样帧字幕不同时，
+# 在两帧之间二分查找字幕变化的准确帧，以少量额外的OCR换取逐帧精度的时间轴
+BISECT_REFINE = False
+
+# 二分查找模式下稀疏采样的间隔秒数
+BISECT_SAMPLE_INTERVAL = 1
+
+# 采样帧之间的跳帧方式: 'grab'只取出视频帧不做颜色转换与拷贝, 'read'完整读取每一帧(旧方式)
+FRAME_SKIP_MODE = 'grab'
+
+# 两个采样帧之间需要跳过的帧数不小于该值时，直接定位(seek)到下一采样帧，适合关键帧间隔较小、采样间隔较大的视频，0为不定位
+FRAME_SKIP_SEEK_THRESHOLD = 0
+
+# 主进程与OCR进程间共享内存视频帧缓冲区的槽位数，视频帧只需解码一次，设置为0则由OCR进程重新解码
+SHARED_FRAME_SLOT_NUM = 16
+
 # 容忍的像素点偏差
 PIXEL_TOLERANCE_Y = 50  # 允许检测框纵向偏差50个像素点
 PIXEL_TOLERANCE_X = 100  # 允许检测框横向偏差100个像素点
@@ -259,12 +411,52 @@ THRESHOLD_TEXT_SIMILARITY = 0.8
 # 字幕提取中置信度低于0.75的不要
 DROP_SCORE = 0.75
 
+# 字幕区域变化检测阈值，与上一次OCR识别的帧相比，字幕区域中发生变化的边缘像素占字幕区域面积的比例不超过该值时直接沿用上一次的识别结果
+# 只在指定了字幕区域时生效，字幕区域应只框住字幕所在的行，建议值0.005，0为不启用
+FRAME_DIFF_THRESHOLD = 0
+
+# 指定字幕区域时是否开启免检测识别：先用完整的检测+识别学习字幕所在的行条带，之后只对行条带做文本识别，跳过耗时的文本检测
+LINE_BAND_MODE = False
+
+# 免检测识别的预热帧数，检测到这么多帧字幕后开始只识别行条带
+LINE_BAND_WARMUP_NUM = 10
+
+# 免检测识别时行条带识别结果的最低置信度，低于该值时该帧回退到完整的文本检测
+LINE_BAND_MIN_SCORE = 0.9
+
+# 免检测识别时每隔这么多帧做一次完整的文本检测，发现行条带之外新出现的字幕行，0为只在置信度下降或行条带中没有文字时检测
+LINE_BAND_DETECT_INTERVAL = 25
+
+# OCR识别结果缓存的条目数，以字幕区域的感知哈希查找，逐像素比较确认是同一张图片后复用，重复出现的字幕不再重复识别
+# 只在指定了字幕区域时生效，0为不缓存
+OCR_CACHE_SIZE = 0
+
+# 本地OCR结果缓存文件，以送入OCR的图片内容与模型标识的摘要为键，修改参数后重新提取同一视频时不再重复识别
+OCR_DISK_CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'ocr_cache.db')
+
+# 本地OCR结果缓存的容量(MB)，超过后删除最久未使用的条目，0为不使用本地缓存
+OCR_DISK_CACHE_SIZE_MB = 0
+
 # 字幕区域允许偏差, 0为不允许越界, 0.03表示可以越界3%
 SUB_AREA_DEVIATION_RATE = 0
 
+# 指定字幕区域时，送入OCR的视频帧只保留字幕区域及允许越界的范围，并在四周额外保留的像素数，给文本检测留出上下文
+SUB_AREA_CROP_PADDING = 16
+
 # 输出丢失的字幕帧, 仅简体中文,繁体中文,日文,韩语有效, 默认将调试信息输出到: 视频路径/loss
 DEBUG_OCR_LOSS = False
 
+# 按帧率提取视频帧时每隔多少秒保存一次断点(已识别的最后一帧、已写入的识别结果与提取状态)，进程意外退出后可以用--resume从断点继续，0为不保存断点
+CHECKPOINT_INTERVAL = 60
+
+# 是否在视频旁边保存OCR结果文件(视频名.ocr.npz)，包含所有文本框的帧号、时间戳、坐标、置信度与文本(包括被筛选掉的文本框)
+# 之后调整DROP_SCORE、SUB_AREA_DEVIATION_RATE、THRESHOLD_TEXT_SIMILARITY等参数时，可以用--from-ocr-cache直接重新生成字幕，无需重新识别
+# 会在视频所在目录写入文件，默认不保存
+OCR_SIDECAR = False
+
+# 是否输出原始字幕文本raw.txt以方便调试，识别结果本身保存在raw.npz中
+DEBUG_DUMP_RAW_TXT = False
+
 # 是否不删除缓存数据，以方便调试
 DEBUG_NO_DELETE_CACHE = False
 
@@ -274,6 +466,13 @@ DELETE_EMPTY_TIMESTAMP = True
 # 是否重新分词, 用于解决没有语句没有空格
 WORD_SEGMENTATION = True
 
+# 重新分词时并行处理的进程数，每个进程预先加载一份分词词表，字幕按顺序分块处理后再按原顺序合并，输出与单进程完全一致
+# 字幕行数较少时(少于REFORMAT_MIN_LINES_PER_WORKER的2倍)仍在当前进程中处理，1为不开启
+REFORMAT_WORKER_NUM = 1
+
+# 并行重新分词时每个进程至少分到的字幕行数，行数太少时启动进程和加载词表的开销大于并行带来的收益
+REFORMAT_MIN_LINES_PER_WORKER = 200
+
 # --------------------- 请根据自己的实际情况改 end-----------------------------
 
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
@@ -5,27 +5,38 @@
 @FileName: main.py
 @desc: 主程序入口文件
 """
+import bisect
+import functools
 import os
+import queue
 import random
 import shutil
-from collections import Counter, namedtuple
 import unicodedata
 from threading import Thread
 from pathlib import Path
 import cv2
 from Levenshtein import ratio
 from PIL import Image
+import numpy as np
 from numpy import average, dot, linalg
 from tqdm import tqdm
 import sys
 
 sys.path.insert(0, os.path.dirname(__file__))
-import importlib
 import config
 from tools import reformat
 
 from backend.tools.ocr import OcrRecogniser, get_coordinates
+from backend.tools.ocr_cache import CachedRecogniser
 from backend.tools import subtitle_ocr
+from backend.tools import ocr_service
+from backend.tools import batch_scheduler
+from backend.tools.frame_buffer import SharedFrameRing
+from backend.tools.result_store import OcrResultStore, get_store_path, get_box_store_path
+from backend.tools import ocr_sidecar
+from backend.tools import checkpoint
+from backend.tools.coordinates import unite_coordinates
+from backend.tools.subtitle_dedup import SubtitleDeduplicator
 import threading
 import platform
 import multiprocessing
@@ -37,11 +48,21 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description="Video subtitle extractor"
     )
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "-v", "--video-path",
-        required=True,
         help="Full path to the input video file"
     )
+    source.add_argument(
+        "-b", "--batch",
+        help="Directory of videos, or a manifest file with one 'VIDEO [YMIN YMAX XMIN XMAX]' per line"
+    )
+    source.add_argument(
+        "--from-ocr-cache",
+        metavar="OCR_FILE",
+        help="Regenerate the SRT from a VIDEO.ocr.npz file saved by an earlier run with OCR_SIDECAR enabled, "
+             "without running OCR again"
+    )
     parser.add_argument(
         "-a", "--subtitle-area",
         required=False,
@@ -51,7 +72,7 @@ def parse_args():
     )
     parser.add_argument(
         "-l", "--lang",
-        default=config.interface_config['Main']['RecSubLang'],
+        default=config.REC_CHAR_TYPE,
         help="Subtitle language code"
     )
     parser.add_argument(
@@ -60,10 +81,35 @@ def parse_args():
         default=config.MODE_TYPE,
         help="OCR mode"
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted extraction from its last checkpoint instead of starting from frame 1"
+    )
+    parser.add_argument(
+        "--batch-workers",
+        type=int,
+        default=config.BATCH_VIDEO_WORKER_NUM,
+        help="Videos extracted at the same time in batch mode, 0 sizes it by CPU core count"
+    )
     return parser.parse_args()
 
 
 
+# 当前进程中已加载的模型 {(模型类名, 识别语言, 识别模式): 模型}，连续提取多个视频时复用
+MODEL_CACHE = {}
+
+
+def get_cached_model(model_class):
+    """
+    获取已加载的模型，识别语言与识别模式不变时不重新加载
+    """
+    key = (model_class.__name__, config.REC_CHAR_TYPE, config.MODE_TYPE)
+    if key not in MODEL_CACHE:
+        MODEL_CACHE[key] = model_class()
+    return MODEL_CACHE[key]
+
+
 class SubtitleDetect:
     """
     文本框检测类，用于检测视频帧中是否存在文本框
@@ -73,7 +119,6 @@ class SubtitleDetect:
         from paddleocr.tools.infer import utility
         from paddleocr.tools.infer.predict_det import TextDetector
         # 获取参数对象
-        importlib.reload(config)
         args = utility.parse_args()
         args.det_algorithm = 'DB'
         args.det_model_dir = config.DET_MODEL_PATH
@@ -89,14 +134,19 @@ class SubtitleExtractor:
     视频字幕提取类
     """
 
-    def __init__(self, vd_path, sub_area=None):
-        importlib.reload(config)
+    def __init__(self, vd_path, sub_area=None, resume=False):
+        """
+        :param resume 是否从上一次中断的断点继续提取
+        """
+        # 重新读取settings.ini，硬件探测结果沿用第一次探测的缓存
+        config.reload_settings()
+        config.check_legal_path()
         # 线程锁
         self.lock = threading.RLock()
         # 用户指定的字幕区域位置
         self.sub_area = sub_area
         # 创建字幕检测对象
-        self.sub_detector = SubtitleDetect()
+        self.sub_detector = get_cached_model(SubtitleDetect)
         # 视频路径
         self.video_path = vd_path
         self.video_cap = cv2.VideoCapture(vd_path)
@@ -128,6 +178,23 @@ class SubtitleExtractor:
         self.vsf_subtitle = os.path.join(self.subtitle_output_dir, 'raw_vsf.srt')
         # 提取的原始字幕文本存储路径
         self.raw_subtitle_path = os.path.join(self.subtitle_output_dir, 'raw.txt')
+        # OCR识别结果，OCR进程结束后从raw.npz中读取
+        self.result_store = None
+        # OCR进程边识别边去重得到的字幕段[(start_frame, end_frame, content), ...]，为None时识别结束后再去重
+        self.subtitle_spans = None
+        # 接收字幕段的队列与线程
+        self.subtitle_span_queue = None
+        self.subtitle_span_thread = None
+        # OCR进程或常驻OCR服务中的任务
+        self.subtitle_ocr_process = None
+        # 是否使用常驻OCR服务
+        self.use_ocr_service = False
+        # 收到新的字幕段时的回调函数，参数为(start_frame, end_frame, content)
+        self.subtitle_span_listeners = []
+        # 没有字幕区域时用户确认删除的水印区域[(xmin, xmax, ymin, ymax), ...]，没有进行水印过滤时为None
+        self.watermark_areas = None
+        # 没有字幕区域时用户确认保留的字幕条带(ymin, ymax)，没有过滤场景文本时为None
+        self.subtitle_band = None
         # 自定义ocr对象
         self.ocr = None
         # 打印识别语言与识别模式
@@ -148,8 +215,28 @@ class SubtitleExtractor:
         self.subtitle_ocr_task_queue = None
         # 字幕OCR进度队列
         self.subtitle_ocr_progress_queue = None
+        # 与OCR进程共享的视频帧缓冲区
+        self.frame_ring = None
+        # 送入OCR的视频帧裁剪范围(ymin, ymax, xmin, xmax)
+        self.ocr_crop_box = None
+        # 提取视频帧时记录的每一帧的显示时间戳 {从0开始的帧序号: 毫秒}，可变帧率视频也能得到准确的时间轴
+        self.frame_pts = {}
+        # frame_pts中已排序的帧序号，用于查找最近的已记录帧
+        self.frame_pts_index = []
+        # 上次保存断点之后记录的时间戳 [(从0开始的帧序号, 毫秒), ...]，保存断点时追加到时间戳断点文件
+        self.unsaved_pts = []
+        # 时间戳断点文件中已保存的记录数
+        self.saved_pts_count = 0
         # vsf运行状态
         self.vsf_running = False
+        # vsf时间轴填入识别结果后的字幕[(start_ms, end_ms, text), ...]，vsf的缓存文件删除后iter_subtitles仍可返回
+        self.vsf_subtitle_items = None
+        # 是否从断点继续提取
+        self.resume = resume
+        # 是否保存断点，只有按帧率提取视频帧时可以从断点继续
+        self.checkpoint_enabled = False
+        # 从断点继续时的提取状态，为None时从头开始提取
+        self.resume_state = None
 
     def run(self):
         """
@@ -168,25 +255,42 @@ class SubtitleExtractor:
         print(f'{os.path.basename(os.path.dirname(config.REC_MODEL_PATH))}-{os.path.basename(config.REC_MODEL_PATH)}')
         # 打印视频帧提取开始提示
         print(config.interface_config['Main']['StartProcessFrame'])
+        extract_frame = self.__select_frame_extractor()
+        self.use_vsf = extract_frame == self.extract_frame_by_vsf
+        self.checkpoint_enabled = extract_frame == self.extract_frame_by_fps and config.CHECKPOINT_INTERVAL > 0
+        self.resume_state = None
+        if self.resume:
+            self.resume_state = self.__load_resume_state()
+        if self.resume_state is None:
+            checkpoint.remove_checkpoints(self.raw_subtitle_path)
+        # 边识别边将字幕写入srt文件
+        incremental_srt_file = None
+        if config.INCREMENTAL_SRT and self.sub_area is not None and not self.use_vsf and self.resume_state is None:
+            incremental_srt_file = open(self.__get_srt_path(), mode='w', encoding='utf-8')
+
+            def write_incremental_srt(span):
+                incremental_srt_file.write(self.__format_srt_line(len(self.subtitle_spans), span)[0])
+                incremental_srt_file.flush()
+            self.subtitle_span_listeners.append(write_incremental_srt)
         # 创建一个字幕OCR识别进程
         subtitle_ocr_process = self.start_subtitle_ocr_async()
-        if self.sub_area is not None:
-            if platform.system() in ['Windows', 'Linux']:
-                # 使用GPU且使用accurate模式时才开放此方法：
-                if config.USE_GPU and config.MODE_TYPE == 'accurate':
-                    self.extract_frame_by_det()
-                else:
-                    self.extract_frame_by_vsf()
-            else:
-                self.extract_frame_by_fps()
-        else:
-            self.extract_frame_by_fps()
-
-        # 往字幕OCR任务队列中，添加OCR识别任务结束标志
-        # 任务格式为：(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域)
-        self.subtitle_ocr_task_queue.put((self.frame_count, -1, None, None, None, None))
-        # 等待子线程完成
-        subtitle_ocr_process.join()
+        try:
+            try:
+                extract_frame()
+            finally:
+                # 提取视频帧出错时同样结束OCR任务，否则OCR进程一直等待结束标志，常驻OCR服务也无法执行下一个视频的任务
+                self.__finish_subtitle_ocr(subtitle_ocr_process)
+        except Exception:
+            if incremental_srt_file is not None:
+                incremental_srt_file.close()
+            self.lock.release()
+            raise
+        self.result_store = OcrResultStore.load(get_store_path(self.raw_subtitle_path))
+        if incremental_srt_file is not None:
+            self.subtitle_span_listeners.remove(write_incremental_srt)
+            incremental_srt_file.close()
+        # 识别已经完成，不再需要断点
+        checkpoint.remove_checkpoints(self.raw_subtitle_path)
         # 打印完成提示
         print(config.interface_config['Main']['FinishProcessFrame'])
         print(config.interface_config['Main']['FinishFindSub'])
@@ -205,6 +309,9 @@ class SubtitleExtractor:
             print(config.interface_config['Main']['StartDeleteNonSub'])
             self.filter_scene_text()
             print(config.interface_config['Main']['FinishDeleteNonSub'])
+        # 水印区域与字幕条带的选择一并保存，从OCR结果文件重新生成字幕时无需再次询问
+        if config.OCR_SIDECAR:
+            self.save_ocr_sidecar()
 
         # 打印开始字幕生成提示
         print(config.interface_config['Main']['StartGenerateSub'])
@@ -216,7 +323,8 @@ class SubtitleExtractor:
             # 如果未使用vsf提取字幕，则使用常规字幕生成方法
             self.generate_subtitle_file()
         if config.WORD_SEGMENTATION:
-            reformat.execute(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'), config.REC_CHAR_TYPE)
+            reformat.execute(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'), config.REC_CHAR_TYPE,
+                             config.REFORMAT_WORKER_NUM, config.REFORMAT_MIN_LINES_PER_WORKER)
         print(config.interface_config['Main']['FinishGenerateSub'], f"{round(time.time() - start_time, 2)}s")
         self.update_progress(ocr=100, frame_extract=100)
         self.isFinished = True
@@ -226,6 +334,212 @@ class SubtitleExtractor:
         if config.GENERATE_TXT:
             self.srt2txt(os.path.join(os.path.splitext(self.video_path)[0] + '.srt'))
 
+    def __finish_subtitle_ocr(self, subtitle_ocr_process):
+        """
+        放入OCR识别任务结束标志，等待OCR进程(或常驻OCR服务中的任务)结束并释放共享内存，OCR进程异常退出时抛出RuntimeError
+        """
+        # 往字幕OCR任务队列中，添加OCR识别任务结束标志
+        # 任务格式为：(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域, frame_slot共享内存槽位)
+        self.subtitle_ocr_task_queue.put((self.frame_count, -1, None, None, None, None, None))
+        # 等待子线程完成，常驻OCR服务的任务完成后释放服务的锁
+        subtitle_ocr_process.join()
+        if self.subtitle_span_thread is not None:
+            # OCR进程已退出，其发出的字幕段都已在队列中，放入结束标志；常驻OCR服务在任务结束时自行放入结束标志
+            if not self.use_ocr_service:
+                self.subtitle_span_queue.put(None)
+            self.subtitle_span_thread.join()
+        # 释放共享内存
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
+        if subtitle_ocr_process.exitcode != 0:
+            raise RuntimeError(config.interface_config['Main']['OcrProcessExited'])
+
+    def save_ocr_sidecar(self):
+        """
+        将所有文本框及其时间戳、视频信息与识别参数保存到视频旁边的OCR结果文件，清理缓存时不会删除
+        """
+        boxes = OcrResultStore.load(get_box_store_path(self.raw_subtitle_path))
+        # 只使用提取过程中记录的时间戳，使用vsf提取时没有记录，字幕时间轴来自vsf的字幕文件，不再为此重新解码整个视频
+        box_pts = [float('nan')] * len(boxes)
+        if len(self.frame_pts) > 0:
+            box_pts = [self.__frame_to_pts(frame_no) for frame_no in boxes.frame_no.tolist()]
+        vsf_srt = None
+        if self.use_vsf and os.path.exists(self.vsf_subtitle):
+            with open(self.vsf_subtitle, mode='r', encoding='utf-8-sig') as f:
+                vsf_srt = f.read()
+        meta = {'video_path': os.path.abspath(self.video_path),
+                'fps': self.fps,
+                'frame_count': self.frame_count,
+                'frame_width': self.frame_width,
+                'frame_height': self.frame_height,
+                'sub_area': list(self.sub_area) if self.sub_area is not None else None,
+                'rec_char_type': config.REC_CHAR_TYPE,
+                'mode_type': config.MODE_TYPE,
+                'drop_score': config.DROP_SCORE,
+                'sub_area_deviation_rate': config.SUB_AREA_DEVIATION_RATE,
+                'use_vsf': self.use_vsf,
+                'vsf_srt': vsf_srt,
+                'watermark_areas': [[int(v) for v in area] for area in self.watermark_areas]
+                if self.watermark_areas is not None else None,
+                'subtitle_band': [int(v) for v in self.subtitle_band] if self.subtitle_band is not None else None,
+                }
+        sidecar_path = ocr_sidecar.get_sidecar_path(self.video_path)
+        ocr_sidecar.save_sidecar(sidecar_path, boxes, [pts if pts is not None else float('nan') for pts in box_pts],
+                                 self.frame_pts, meta)
+        print(f"{config.interface_config['Main']['OcrSidecarLocation']} {sidecar_path}")
+
+    @classmethod
+    def from_ocr_sidecar(cls, sidecar_path, sub_area=None):
+        """
+        从OCR结果文件恢复生成字幕所需的状态，不打开视频、不加载模型
+        :param sidecar_path save_ocr_sidecar保存的OCR结果文件
+        :param sub_area 重新筛选文本框使用的字幕区域，为None时使用识别时的字幕区域；
+            送入OCR的视频帧已按识别时的字幕区域裁剪，只能在其范围内调整
+        """
+        config.reload_settings()
+        sidecar = ocr_sidecar.load_sidecar(sidecar_path)
+        meta = sidecar.meta
+        extractor = cls.__new__(cls)
+        extractor.lock = threading.RLock()
+        # OCR结果文件保存在视频旁边，字幕文件同样输出到视频旁边
+        extractor.video_path = os.path.join(os.path.dirname(os.path.abspath(sidecar_path)),
+                                            os.path.basename(meta['video_path']))
+        extractor.vd_name = Path(extractor.video_path).stem
+        extractor.raw_subtitle_path = os.path.splitext(extractor.video_path)[0] + '.raw.txt'
+        extractor.vsf_subtitle = None
+        extractor.fps = meta['fps']
+        extractor.frame_count = meta['frame_count']
+        extractor.frame_width = meta['frame_width']
+        extractor.frame_height = meta['frame_height']
+        if sub_area is None and meta['sub_area'] is not None:
+            sub_area = tuple(meta['sub_area'])
+        extractor.sub_area = sub_area
+        extractor.use_vsf = meta['use_vsf']
+        extractor.frame_pts = sidecar.frame_pts
+        extractor.frame_pts_index = []
+        extractor.subtitle_spans = None
+        extractor.result_store = None
+        extractor.ocr_sidecar = sidecar
+        extractor.isFinished = False
+        return extractor
+
+    def select_ocr_sidecar_boxes(self):
+        """
+        按当前的DROP_SCORE与SUB_AREA_DEVIATION_RATE重新筛选OCR结果文件中的文本框，作为识别结果
+        没有字幕区域时按识别时用户的选择去除水印区域，并由识别结果重新检测字幕条带、去除场景文本
+        """
+        boxes = self.ocr_sidecar.boxes
+        self.result_store = boxes.copy(ocr_sidecar.select_boxes(boxes, self.sub_area, config.DROP_SCORE,
+                                                                config.SUB_AREA_DEVIATION_RATE))
+        self.subtitle_spans = None
+        if self.sub_area is not None or len(self.result_store) == 0:
+            return
+        meta = self.ocr_sidecar.meta
+        if meta.get('watermark_areas') is not None:
+            # 识别时检测水印区域前统一了相似的坐标，保存的水印区域是统一后的坐标
+            self._unite_result_coordinates()
+            for area in meta['watermark_areas']:
+                self.result_store.keep(~self.result_store.coordinate_mask(tuple(area)))
+        # 没有记录选择的OCR结果文件同样只保留字幕条带
+        if 'subtitle_band' not in meta or meta['subtitle_band'] is not None:
+            ymin, ymax = self._detect_subtitle_band()
+            self.result_store.keep((ymin <= self.result_store.ymin) & (self.result_store.ymax <= ymax))
+
+    def generate_subtitle_items(self):
+        """
+        由识别结果生成字幕列表，不写入文件，时间轴与字幕文件一致
+        :return [(start_ms开始毫秒, end_ms结束毫秒, text文本), ...]
+        """
+        if self.use_vsf:
+            return [(sub.start.ordinal, sub.end.ordinal, sub.text) for sub in self.__merge_vsf_subtitles()]
+        return [self.__span_to_milliseconds(span) for span in self.__get_unique_subtitles()]
+
+    def regenerate_subtitle_file(self):
+        """
+        按当前配置重新筛选OCR结果文件中的文本框并生成字幕文件
+        未指定字幕区域时不再询问水印区域与字幕区域，按识别时的选择重新筛选
+        """
+        start_time = time.time()
+        self.lock.acquire()
+        try:
+            self.select_ocr_sidecar_boxes()
+            if self.use_vsf:
+                self.generate_subtitle_file_vsf()
+            else:
+                self.generate_subtitle_file()
+            if config.WORD_SEGMENTATION:
+                reformat.execute(self.__get_srt_path(), self.ocr_sidecar.meta['rec_char_type'],
+                                 config.REFORMAT_WORKER_NUM, config.REFORMAT_MIN_LINES_PER_WORKER)
+            print(config.interface_config['Main']['FinishGenerateSub'], f"{round(time.time() - start_time, 2)}s")
+            self.isFinished = True
+        finally:
+            self.lock.release()
+        if config.GENERATE_TXT:
+            self.srt2txt(self.__get_srt_path())
+
+    def iter_subtitles(self):
+        """
+        在后台线程中运行字幕提取，并逐条返回已完成的字幕
+        指定了字幕区域时，OCR识别过程中每确定一条字幕就立即返回；否则在提取结束后依次返回
+        使用vsf提取时字幕段的帧号由vsf的时间换算而来，时间轴要等vsf结束后才能确定，在提取结束后按字幕文件的时间轴返回
+        :return 生成器，每条字幕为(start_ms开始毫秒, end_ms结束毫秒, text文本)
+        """
+        events = queue.Queue()
+        # 已返回的字幕条数
+        yielded = 0
+        error = []
+        self.subtitle_span_listeners.append(events.put)
+
+        def task():
+            try:
+                self.run()
+            except Exception as e:
+                error.append(e)
+            finally:
+                events.put(None)
+
+        Thread(target=task, daemon=True).start()
+        try:
+            while True:
+                span = events.get(block=True)
+                if span is None:
+                    break
+                if self.use_vsf:
+                    continue
+                yielded += 1
+                # 提取过程中记录的时间戳不足时按帧率推算，不在此解码整个视频建立时间戳索引
+                yield self.__span_to_milliseconds(span, build_pts_index=False)
+        finally:
+            self.subtitle_span_listeners.remove(events.put)
+        if error:
+            raise error[0]
+        if self.use_vsf:
+            for item in self.vsf_subtitle_items or []:
+                yield item
+            return
+        # 识别结束后才去重的字幕
+        for span in (self.subtitle_spans or [])[yielded:]:
+            yield self.__span_to_milliseconds(span)
+
+    def __select_frame_extractor(self):
+        """
+        选择提取字幕帧的方法
+        """
+        if config.BISECT_REFINE:
+            return self.extract_frame_by_bisect
+        elif self.sub_area is not None:
+            if platform.system() in ['Windows', 'Linux']:
+                # 使用GPU且使用accurate模式时才开放此方法：
+                if config.USE_GPU and config.MODE_TYPE == 'accurate':
+                    return self.extract_frame_by_det
+                else:
+                    return self.extract_frame_by_vsf
+            else:
+                return self.extract_frame_by_fps
+        else:
+            return self.extract_frame_by_fps
+
     def extract_frame_by_fps(self):
         """
         根据帧率，定时提取视频帧，容易丢字幕，但速度快，将提取到的视频帧加入ocr识别任务队列
@@ -234,6 +548,18 @@ class SubtitleExtractor:
         self.__delete_frame_cache()
         # 当前视频帧的帧号
         current_frame_no = 0
+        # OCR进程已经识别过的最后一帧，从断点继续时之前的视频帧只记录时间戳，不再加入识别任务
+        recognised_frame_no = 0
+        self.unsaved_pts = []
+        self.saved_pts_count = 0
+        if self.resume_state is not None:
+            current_frame_no = self.resume_state['frame_no']
+            recognised_frame_no = self.resume_state['ocr_frame_no']
+            self.frame_pts = self.resume_state['frame_pts']
+            self.saved_pts_count = len(self.frame_pts)
+            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_no)
+            print(config.interface_config['Main']['ResumeFrom'].format(recognised_frame_no + 1))
+        last_checkpoint_time = time.time()
         while self.video_cap.isOpened():
             ret, frame = self.video_cap.read()
             # 如果读取视频帧失败（视频读到最后一帧）
@@ -242,19 +568,112 @@ class SubtitleExtractor:
             # 读取视频帧成功
             else:
                 current_frame_no += 1
-                # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间，subtitle_area字幕区域)
-                task = (self.frame_count, current_frame_no, None, None, None, self.default_subtitle_area)
-                self.subtitle_ocr_task_queue.put(task)
+                self.__record_pts(self.video_cap, current_frame_no)
+                if current_frame_no > recognised_frame_no:
+                    # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间，subtitle_area字幕区域, frame_slot共享内存槽位)
+                    task = (self.frame_count, current_frame_no, None, None, None, self.default_subtitle_area,
+                            self.__share_frame(frame))
+                    self.subtitle_ocr_task_queue.put(task)
                 # 跳过剩下的帧
-                for i in range(int(self.fps // config.EXTRACT_FREQUENCY) - 1):
-                    ret, _ = self.video_cap.read()
-                    if ret:
-                        current_frame_no += 1
-                        # 更新进度条
-                        self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
+                current_frame_no = self.__skip_frames(current_frame_no, int(self.fps // config.EXTRACT_FREQUENCY) - 1)
+                # 下一次读取的是下一个采样帧，在此保存断点
+                if self.checkpoint_enabled and time.time() - last_checkpoint_time >= config.CHECKPOINT_INTERVAL:
+                    self.__save_extract_checkpoint(current_frame_no)
+                    last_checkpoint_time = time.time()
+        # 视频帧已全部提取，OCR进程还在识别时退出也可以从断点继续
+        if self.checkpoint_enabled:
+            self.__save_extract_checkpoint(current_frame_no)
 
         self.video_cap.release()
 
+    def __get_checkpoint_params(self):
+        """
+        决定提取结果的参数，与断点中保存的参数一致时才能从断点继续
+        """
+        return {'video_path': os.path.abspath(self.video_path),
+                'frame_count': self.frame_count,
+                'sub_area': list(self.sub_area) if self.sub_area is not None else None,
+                'extract_frequency': config.EXTRACT_FREQUENCY,
+                'frame_skip_mode': config.FRAME_SKIP_MODE,
+                'frame_skip_seek_threshold': config.FRAME_SKIP_SEEK_THRESHOLD,
+                'rec_char_type': config.REC_CHAR_TYPE,
+                'mode_type': config.MODE_TYPE,
+                'ocr_sidecar': config.OCR_SIDECAR,
+                }
+
+    def __save_extract_checkpoint(self, current_frame_no):
+        """
+        保存视频帧提取的断点
+        :param current_frame_no 已读取的最后一帧，下一次读取的是下一个采样帧
+        """
+        # 只追加新记录的时间戳，时间戳写入完成后才更新断点中的记录数
+        self.saved_pts_count += checkpoint.append_pts_checkpoint(
+            checkpoint.get_pts_checkpoint_path(self.raw_subtitle_path), self.unsaved_pts)
+        self.unsaved_pts = []
+        checkpoint.save_extract_checkpoint(checkpoint.get_extract_checkpoint_path(self.raw_subtitle_path),
+                                           {'params': self.__get_checkpoint_params(),
+                                            'frame_no': current_frame_no,
+                                            'pts_count': self.saved_pts_count})
+
+    def __load_resume_state(self):
+        """
+        读取视频帧提取与OCR进程的断点，确定继续提取的位置
+        :return {'frame_no': 从该帧之后开始读取, 'ocr_frame_no': OCR进程已识别的最后一帧, 'frame_pts': 已记录的时间戳}，
+            不能从断点继续时返回None
+        """
+        if not self.checkpoint_enabled:
+            print(config.interface_config['Main']['ResumeFpsOnly'])
+            return None
+        extract_state = checkpoint.load_extract_checkpoint(checkpoint.get_extract_checkpoint_path(self.raw_subtitle_path))
+        ocr_state = checkpoint.load_ocr_checkpoint(checkpoint.get_ocr_checkpoint_path(self.raw_subtitle_path))
+        pts_path = checkpoint.get_pts_checkpoint_path(self.raw_subtitle_path)
+        pts_records = None
+        if extract_state is not None and 'pts_count' in extract_state:
+            pts_records = checkpoint.load_pts_checkpoint(pts_path, extract_state['pts_count'])
+        if extract_state is None or ocr_state is None or pts_records is None \
+                or extract_state['params'] != self.__get_checkpoint_params():
+            print(config.interface_config['Main']['NoCheckpoint'])
+            return None
+        ocr_frame_no = ocr_state[0]
+        frame_no = extract_state['frame_no']
+        if frame_no > ocr_frame_no:
+            # 视频帧提取领先于OCR进程，回到OCR进程已识别的最后一帧之后的第一个采样帧；采样帧为1, 1 + step, 1 + 2 * step...
+            step = max(int(self.fps // config.EXTRACT_FREQUENCY), 1)
+            frame_no = min(((ocr_frame_no - 1) // step + 1) * step, frame_no)
+        # 时间戳按帧号顺序记录，继续提取的位置之后的时间戳会重新记录，从文件中截去
+        pts_records = pts_records[pts_records['frame_no'] < frame_no]
+        checkpoint.truncate_pts_checkpoint(pts_path, len(pts_records))
+        return {'frame_no': frame_no, 'ocr_frame_no': ocr_frame_no,
+                'frame_pts': dict(zip(pts_records['frame_no'].tolist(), pts_records['ms'].tolist()))}
+
+    def __skip_frames(self, current_frame_no, skip_num):
+        """
+        跳过两个采样帧之间的视频帧
+        :param current_frame_no 当前已读取的帧号
+        :param skip_num 需要跳过的帧数
+        :return 跳过后的帧号
+        """
+        if skip_num <= 0:
+            return current_frame_no
+        # 间隔足够大时直接定位到下一采样帧，由解码器从最近的关键帧开始解码
+        if 0 < config.FRAME_SKIP_SEEK_THRESHOLD <= skip_num:
+            target_frame_no = min(current_frame_no + skip_num, int(self.frame_count))
+            self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame_no)
+            self.update_progress(frame_extract=(target_frame_no / self.frame_count) * 100)
+            return target_frame_no
+        for i in range(skip_num):
+            # grab只取出视频帧而不做颜色转换与拷贝，read则完整取出视频帧
+            if config.FRAME_SKIP_MODE == 'grab':
+                ret = self.video_cap.grab()
+            else:
+                ret, _ = self.video_cap.read()
+            if ret:
+                current_frame_no += 1
+                self.__record_pts(self.video_cap, current_frame_no)
+                # 更新进度条
+                self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
+        return current_frame_no
+
     def extract_frame_by_det(self):
         """
         通过检测字幕区域位置提取字幕帧
@@ -275,15 +694,20 @@ class SubtitleExtractor:
         start_frame_no = 0
         start_end_frame_no = []
         start_frame = None
+        # 上一帧，字幕尾为前一帧时需要将其交给OCR进程
+        frame, last_frame = None, None
         if self.ocr is None:
-            self.ocr = OcrRecogniser()
+            self.ocr = CachedRecogniser(get_cached_model(OcrRecogniser), config.OCR_CACHE_SIZE, self.sub_area)
         while self.video_cap.isOpened():
+            if frame is not None:
+                last_frame = frame
             ret, frame = self.video_cap.read()
             # 如果读取视频帧失败（视频读到最后一帧）
             if not ret:
                 break
             # 读取视频帧成功
             current_frame_no += 1
+            self.__record_pts(self.video_cap, current_frame_no)
             tbar.update(1)
             dt_boxes, elapse = self.sub_detector.detect_subtitle(frame)
             has_subtitle = False
@@ -314,7 +738,7 @@ class SubtitleExtractor:
                     if start_frame_no not in compare_ocr_result_cache.keys():
                         compare_ocr_result_cache[current_frame_no] = {'text': area_text1, 'dt_box': dt_box, 'rec_res': rec_res}
                         frame_lru_list.append((frame, current_frame_no))
-                        ocr_args_list.append((self.frame_count, current_frame_no))
+                        ocr_args_list.append((self.frame_count, current_frame_no, frame))
                         # 缓存头帧
                         start_frame = frame
                     # 开始找尾
@@ -326,7 +750,7 @@ class SubtitleExtractor:
                     is_finding_start_frame_no = False
                     end_frame_no = current_frame_no
                     frame_lru_list.append((frame, current_frame_no))
-                    ocr_args_list.append((self.frame_count, current_frame_no))
+                    ocr_args_list.append((self.frame_count, current_frame_no, frame))
                     start_end_frame_no.append((start_frame_no, end_frame_no))
                 # 如果在找结束帧的时候
                 if is_finding_end_frame_no:
@@ -336,7 +760,7 @@ class SubtitleExtractor:
                         is_finding_start_frame_no = True
                         end_frame_no = current_frame_no - 1
                         frame_lru_list.append((start_frame, end_frame_no))
-                        ocr_args_list.append((self.frame_count, end_frame_no))
+                        ocr_args_list.append((self.frame_count, end_frame_no, last_frame))
                         start_end_frame_no.append((start_frame_no, end_frame_no))
 
             else:
@@ -346,7 +770,7 @@ class SubtitleExtractor:
                     is_finding_end_frame_no = False
                     is_finding_start_frame_no = True
                     frame_lru_list.append((start_frame, end_frame_no))
-                    ocr_args_list.append((self.frame_count, end_frame_no))
+                    ocr_args_list.append((self.frame_count, end_frame_no, last_frame))
                     start_end_frame_no.append((start_frame_no, end_frame_no))
 
             while len(frame_lru_list) > frame_lru_list_max_size:
@@ -356,30 +780,138 @@ class SubtitleExtractor:
                 # print(start_end_frame_no)
 
             while len(ocr_args_list) > 1:
-                total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
+                total_frame_count, ocr_info_frame_no, ocr_info_frame = ocr_args_list.pop(0)
                 if current_frame_no in compare_ocr_result_cache:
                     predict_result = compare_ocr_result_cache[current_frame_no]
                     dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
                 else:
                     dt_box, rec_res = None, None
-                # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域)
-                task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
+                # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域, frame_slot共享内存槽位)
+                task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area,
+                        self.__share_frame(ocr_info_frame))
                 # 添加任务
                 self.subtitle_ocr_task_queue.put(task)
                 self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
 
         while len(ocr_args_list) > 0:
-            total_frame_count, ocr_info_frame_no = ocr_args_list.pop(0)
+            total_frame_count, ocr_info_frame_no, ocr_info_frame = ocr_args_list.pop(0)
             if current_frame_no in compare_ocr_result_cache:
                 predict_result = compare_ocr_result_cache[current_frame_no]
                 dt_box, rec_res = predict_result['dt_box'], predict_result['rec_res']
             else:
                 dt_box, rec_res = None, None
-            task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area)
+            task = (total_frame_count, ocr_info_frame_no, dt_box, rec_res, None, self.default_subtitle_area,
+                    self.__share_frame(ocr_info_frame))
             # 添加任务
             self.subtitle_ocr_task_queue.put(task)
         self.video_cap.release()
 
+    def extract_frame_by_bisect(self):
+        """
+        先稀疏采样，再二分查找细化字幕起止帧
+        每隔BISECT_SAMPLE_INTERVAL秒采样一帧进行OCR，相邻两个采样帧的字幕不同时，
+        在两者之间二分查找字幕发生变化的准确帧，每个字幕边界只需额外进行O(log 间隔帧数)次OCR
+        """
+        # 删除缓存
+        self.__delete_frame_cache()
+        if self.ocr is None:
+            self.ocr = CachedRecogniser(get_cached_model(OcrRecogniser), config.OCR_CACHE_SIZE, self.sub_area)
+        # 用于二分查找时随机读取视频帧
+        seek_cap = cv2.VideoCapture(self.video_path)
+        sample_step = max(int(round(self.fps * config.BISECT_SAMPLE_INTERVAL)), 1)
+
+        def put_task(frame_no, result):
+            frame, text, dt_box, rec_res = result
+            # subtitle_ocr_task_queue: (total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间， subtitle_area字幕区域, frame_slot共享内存槽位)
+            task = (self.frame_count, frame_no, dt_box, rec_res, None, self.default_subtitle_area,
+                    self.__share_frame(frame))
+            self.subtitle_ocr_task_queue.put(task)
+
+        def read_result(frame_no):
+            seek_cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no - 1)
+            ret, frame = seek_cap.read()
+            if not ret:
+                return None
+            self.__record_pts(seek_cap, frame_no)
+            return (frame,) + self.__predict_area_text(frame)
+
+        def refine(lo_no, lo_result, hi_no, hi_result):
+            """
+            在两个采样帧之间二分查找所有字幕变化的位置，按帧号顺序添加变化前后两帧的OCR任务
+            """
+            while hi_no - lo_no > 1 and not self.__is_text_similar(lo_result[1], hi_result[1]):
+                left_no, right_no, right_result = lo_no, hi_no, hi_result
+                left_result = lo_result
+                while right_no - left_no > 1:
+                    mid_no = (left_no + right_no) // 2
+                    mid_result = read_result(mid_no)
+                    if mid_result is None:
+                        break
+                    if self.__is_text_similar(lo_result[1], mid_result[1]):
+                        left_no, left_result = mid_no, mid_result
+                    else:
+                        right_no, right_result = mid_no, mid_result
+                # left_no为变化前的最后一帧，right_no为变化后的第一帧
+                if left_no != lo_no:
+                    put_task(left_no, left_result)
+                if right_no == hi_no or right_no - left_no > 1:
+                    break
+                put_task(right_no, right_result)
+                lo_no, lo_result = right_no, right_result
+
+        current_frame_no = 0
+        last_sample_no, last_sample_result = None, None
+        while self.video_cap.isOpened():
+            ret, frame = self.video_cap.read()
+            # 如果读取视频帧失败（视频读到最后一帧）
+            if not ret:
+                break
+            current_frame_no += 1
+            self.__record_pts(self.video_cap, current_frame_no)
+            result = (frame,) + self.__predict_area_text(frame)
+            if last_sample_no is not None:
+                refine(last_sample_no, last_sample_result, current_frame_no, result)
+            put_task(current_frame_no, result)
+            last_sample_no, last_sample_result = current_frame_no, result
+            self.update_progress(frame_extract=(current_frame_no / self.frame_count) * 100)
+            # 跳到下一个采样帧
+            current_frame_no = self.__skip_frames(current_frame_no, sample_step - 1)
+        # 视频结尾不是采样帧时，细化最后一个采样帧到最后一帧之间的字幕
+        if last_sample_no is not None and current_frame_no > last_sample_no:
+            last_result = read_result(current_frame_no)
+            if last_result is not None:
+                refine(last_sample_no, last_sample_result, current_frame_no, last_result)
+                put_task(current_frame_no, last_result)
+        seek_cap.release()
+        self.video_cap.release()
+
+    def __predict_area_text(self, frame):
+        """
+        对字幕区域进行OCR识别，返回字幕区域内置信度足够的文本以及原视频帧坐标系中的识别结果
+        :return (area_text, dt_box, rec_res)
+        """
+        crop_box = self.ocr_crop_box
+        if crop_box is None:
+            crop_box = (0, frame.shape[0], 0, frame.shape[1])
+        crop = subtitle_ocr.crop_frame(frame, crop_box)
+        dt_box, rec_res = self.ocr.predict(crop, roi=crop)
+        dt_box = subtitle_ocr.shift_dt_box(dt_box, (crop_box[2], crop_box[0]))
+        area_text = []
+        for content, coordinate in zip(rec_res, get_coordinates(dt_box)):
+            if content[1] <= config.DROP_SCORE:
+                continue
+            if self.sub_area is not None:
+                s_ymin, s_ymax, s_xmin, s_xmax = self.sub_area
+                xmin, xmax, ymin, ymax = coordinate
+                if not (s_xmin <= xmin and xmax <= s_xmax and s_ymin <= ymin and ymax <= s_ymax):
+                    continue
+            area_text.append(content[0])
+        return "".join(area_text).replace(' ', ''), dt_box, rec_res
+
+    @staticmethod
+    def __is_text_similar(text1, text2):
+        return ratio(text1, text2) > config.THRESHOLD_TEXT_SIMILARITY or text1 == text2
+
     def extract_frame_by_vsf(self):
         """
        通过调用videoSubFinder获取字幕帧
@@ -409,7 +941,7 @@ class SubtitleExtractor:
                         total_ms = int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
                         if total_ms > last_total_ms:
                             frame_no = int(total_ms / self.fps)
-                            task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area)
+                            task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area, None)
                             self.subtitle_ocr_task_queue.put(task)
                         last_total_ms = total_ms
                         if total_ms / duration_ms >= 1:
@@ -434,7 +966,7 @@ class SubtitleExtractor:
                     total_ms = int(ms) + int(s) * 1000 + int(m) * 60 * 1000 + int(h) * 60 * 60 * 1000
                     if total_ms > last_total_ms:
                         frame_no = int(total_ms / self.fps)
-                        task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area)
+                        task = (self.frame_count, frame_no, None, None, total_ms, self.default_subtitle_area, None)
                         self.subtitle_ocr_task_queue.put(task)
                     last_total_ms = total_ms
                     if total_ms / duration_ms >= 1:
@@ -498,6 +1030,7 @@ class SubtitleExtractor:
         """
         # 获取潜在水印区域
         watermark_areas = self._detect_watermark_area()
+        self.watermark_areas = []
 
         # 随机选择一帧, 将所水印区域标记出来，用户看图判断是否是水印区域
         cap = cv2.VideoCapture(self.video_path)
@@ -540,13 +1073,8 @@ class SubtitleExtractor:
             user_input = input(f"{area_num.pop()}{str(watermark_area)} "
                                f"{config.interface_config['Main']['QuestionDelete']}").strip()
             if user_input == 'y' or user_input == '\n':
-                with open(self.raw_subtitle_path, mode='r+', encoding='utf-8') as f:
-                    content = f.readlines()
-                    f.seek(0)
-                    for i in content:
-                        if i.find(str(watermark_area[0])) == -1:
-                            f.write(i)
-                    f.truncate()
+                self.result_store.keep(~self.result_store.coordinate_mask(watermark_area[0]))
+                self.watermark_areas.append(tuple(watermark_area[0]))
                 print(config.interface_config['Main']['FinishDelete'])
         print(config.interface_config['Main']['FinishWaterMarkFilter'])
         # 删除缓存
@@ -557,8 +1085,8 @@ class SubtitleExtractor:
         """
         将场景里提取的文字过滤，仅保留字幕区域
         """
-        # 获取潜在字幕区域
-        subtitle_area = self._detect_subtitle_area()[0][0]
+        # 获取潜在字幕区域，为了防止有双行字幕，根据容忍度加高
+        ymin, ymax = self._detect_subtitle_band()
 
         # 随机选择一帧，将所水印区域标记出来，用户看图判断是否是水印区域
         cap = cv2.VideoCapture(self.video_path)
@@ -575,9 +1103,6 @@ class SubtitleExtractor:
             print("Error in filter_scene_text: reading frame from video")
             return
 
-        # 为了防止有双行字幕，根据容忍度，将字幕区域y范围加高
-        ymin = abs(subtitle_area[0] - config.SUBTITLE_AREA_DEVIATION_PIXEL)
-        ymax = subtitle_area[1] + config.SUBTITLE_AREA_DEVIATION_PIXEL
         # 画出字幕框的区域
         cv2.rectangle(sample_frame, pt1=(0, ymin), pt2=(sample_frame.shape[1], ymax), color=(0, 0, 255), thickness=3)
         sample_frame_file_path = os.path.join(os.path.dirname(self.frame_output_dir), 'subtitle_area.jpg')
@@ -586,15 +1111,8 @@ class SubtitleExtractor:
 
         user_input = input(f"{(ymin, ymax)} {config.interface_config['Main']['DeleteNoSubArea']}").strip()
         if user_input == 'y' or user_input == '\n':
-            with open(self.raw_subtitle_path, mode='r+', encoding='utf-8') as f:
-                content = f.readlines()
-                f.seek(0)
-                for i in content:
-                    i_ymin = int(i.split('\t')[1].split('(')[1].split(')')[0].split(', ')[2])
-                    i_ymax = int(i.split('\t')[1].split('(')[1].split(')')[0].split(', ')[3])
-                    if ymin <= i_ymin and i_ymax <= ymax:
-                        f.write(i)
-                f.truncate()
+            self.result_store.keep((ymin <= self.result_store.ymin) & (self.result_store.ymax <= ymax))
+            self.subtitle_band = (ymin, ymax)
             print(config.interface_config['Main']['FinishDeleteNoSubArea'])
         # 删除缓存
         if os.path.exists(sample_frame_file_path):
@@ -605,37 +1123,83 @@ class SubtitleExtractor:
         生成srt格式的字幕文件
         """
         if not self.use_vsf:
-            subtitle_content = self._remove_duplicate_subtitle()
-            srt_filename = os.path.join(os.path.splitext(self.video_path)[0] + '.srt')
+            subtitle_content = self.__get_unique_subtitles()
+            srt_filename = self.__get_srt_path()
             # 保存持续时间不足1秒的字幕行，用于后续处理
             post_process_subtitle = []
             with open(srt_filename, mode='w', encoding='utf-8') as f:
                 for index, content in enumerate(subtitle_content):
                     line_code = index + 1
-                    frame_start = self._frame_to_timecode(int(content[0]))
-                    # 比较起始帧号与结束帧号， 如果字幕持续时间不足1秒，则将显示时间设为1s
-                    if abs(int(content[1]) - int(content[0])) < self.fps:
-                        frame_end = self._frame_to_timecode(int(int(content[0]) + self.fps))
+                    subtitle_line, is_short = self.__format_srt_line(line_code, content)
+                    if is_short:
                         post_process_subtitle.append(line_code)
-                    else:
-                        frame_end = self._frame_to_timecode(int(content[1]))
-                    frame_content = content[2]
-                    subtitle_line = f'{line_code}\n{frame_start} --> {frame_end}\n{frame_content}\n'
                     f.write(subtitle_line)
             print(f"[NO-VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
             # 返回持续时间低于1s的字幕行
             return post_process_subtitle
 
+    def __get_srt_path(self):
+        return os.path.join(os.path.splitext(self.video_path)[0] + '.srt')
+
+    def __format_srt_line(self, line_code, content):
+        """
+        将一条字幕(start_frame, end_frame, content)格式化为srt字幕行
+        :return (subtitle_line, is_short)，is_short表示字幕持续时间不足1秒
+        """
+        frame_start = self._frame_to_timecode(int(content[0]))
+        # 比较起始帧号与结束帧号， 如果字幕持续时间不足1秒，则将显示时间设为1s
+        is_short = abs(int(content[1]) - int(content[0])) < self.fps
+        if is_short:
+            frame_end = self._frame_to_timecode(int(int(content[0]) + self.fps))
+        else:
+            frame_end = self._frame_to_timecode(int(content[1]))
+        frame_content = content[2]
+        return f'{line_code}\n{frame_start} --> {frame_end}\n{frame_content}\n', is_short
+
+    def __span_to_milliseconds(self, content, build_pts_index=True):
+        """
+        将一条字幕(start_frame, end_frame, content)转换为(start_ms, end_ms, text)，时间轴与srt文件一致
+        :param build_pts_index 没有记录时间戳时是否遍历视频建立时间戳索引，为False时按帧率推算
+        """
+        start_no = int(content[0])
+        end_no = int(int(content[0]) + self.fps) if abs(int(content[1]) - start_no) < self.fps else int(content[1])
+        start_ms = self.__frame_to_pts(start_no, build_pts_index)
+        end_ms = self.__frame_to_pts(end_no, build_pts_index)
+        if start_ms is None or start_ms <= 0:
+            start_ms = self._frameno_to_milliseconds(start_no)
+        if end_ms is None or end_ms <= 0:
+            end_ms = self._frameno_to_milliseconds(end_no)
+        return int(start_ms), int(end_ms), content[2].rstrip('\n')
+
     def generate_subtitle_file_vsf(self):
         if not self.use_vsf:
             return
-        subs = pysrt.open(self.vsf_subtitle)
+        final_subtitles = self.__merge_vsf_subtitles()
+        self.vsf_subtitle_items = [(sub.start.ordinal, sub.end.ordinal, sub.text) for sub in final_subtitles]
+        srt_filename = self.__get_srt_path()
+        pysrt.SubRipFile(final_subtitles).save(srt_filename, encoding='utf-8')
+        print(f"[VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
+
+    def __open_vsf_subtitles(self):
+        """
+        读取vsf得到的时间轴，从OCR结果文件恢复时使用其中保存的时间轴
+        """
+        if self.vsf_subtitle is None:
+            return pysrt.from_string(self.ocr_sidecar.meta['vsf_srt'] or '')
+        return pysrt.open(self.vsf_subtitle)
+
+    def __merge_vsf_subtitles(self):
+        """
+        将去重后的识别结果填入vsf得到的时间轴
+        :return [pysrt.SubRipItem, ...]
+        """
+        subs = self.__open_vsf_subtitles()
         sub_no_map = {}
         for sub in subs:
             sub.start.no = self._timestamp_to_frameno(sub.start.ordinal)
             sub_no_map[sub.start.no] = sub
 
-        subtitle_content = self._remove_duplicate_subtitle()
+        subtitle_content = self.__get_unique_subtitles()
         subtitle_content_start_map = {int(a[0]): a for a in subtitle_content}
         final_subtitles = []
         for sub in subs:
@@ -654,10 +1218,7 @@ class SubtitleExtractor:
                 sub.index = len(final_subtitles) + 1
                 final_subtitles.append(sub)
                 continue
-
-        srt_filename = os.path.join(os.path.splitext(self.video_path)[0] + '.srt')
-        pysrt.SubRipFile(final_subtitles).save(srt_filename, encoding='utf-8')
-        print(f"[VSF]{config.interface_config['Main']['SubLocation']} {srt_filename}")
+        return final_subtitles
 
     def _detect_watermark_area(self):
         """
@@ -666,40 +1227,18 @@ class SubtitleExtractor:
         根据坐标点信息，进行统计，将一直具有固定坐标的文本区域选出
         :return 返回最有可能的水印区域
         """
-        f = open(self.raw_subtitle_path, mode='r', encoding='utf-8')  # 打开txt文件，以‘utf-8’编码读取
-        line = f.readline()  # 以行的形式进行读取文件
-        # 坐标点列表
-        coordinates_list = []
-        # 帧列表
-        frame_no_list = []
-        # 内容列表
-        content_list = []
-        while line:
-            frame_no = line.split('\t')[0]
-            text_position = line.split('\t')[1].split('(')[1].split(')')[0].split(', ')
-            content = line.split('\t')[2]
-            frame_no_list.append(frame_no)
-            coordinates_list.append((int(text_position[0]),
-                                     int(text_position[1]),
-                                     int(text_position[2]),
-                                     int(text_position[3])))
-            content_list.append(content)
-            line = f.readline()
-        f.close()
-        # 将坐标列表的相似值统一
-        coordinates_list = self._unite_coordinates(coordinates_list)
+        self._unite_result_coordinates()
+        # 读取配置文件，返回可能为水印区域的坐标列表，不够则有几个返回几个
+        return OcrResultStore.most_common(self.result_store.coordinates, config.WATERMARK_AREA_NUM)
 
-        # 将原txt文件的坐标更新为归一后的坐标
-        with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as f:
-            for frame_no, coordinate, content in zip(frame_no_list, coordinates_list, content_list):
-                f.write(f'{frame_no}\t{coordinate}\t{content}')
-
-        if len(Counter(coordinates_list).most_common()) > config.WATERMARK_AREA_NUM:
-            # 读取配置文件，返回可能为水印区域的坐标列表
-            return Counter(coordinates_list).most_common(config.WATERMARK_AREA_NUM)
-        else:
-            # 不够则有几个返回几个
-            return Counter(coordinates_list).most_common()
+    def _unite_result_coordinates(self):
+        """
+        将识别结果中相似的坐标统一为一个值
+        """
+        # 将坐标列表的相似值统一
+        coordinates_list = self._unite_coordinates([tuple(c) for c in self.result_store.coordinates.tolist()])
+        # 将识别结果的坐标更新为归一后的坐标
+        self.result_store.set_coordinates(coordinates_list)
 
     def _detect_subtitle_area(self):
         """
@@ -707,17 +1246,18 @@ class SubtitleExtractor:
         假定：字幕区域在y轴上有一个相对固定的坐标范围，相对于场景文本，这个范围出现频率更高
         :return 返回字幕的区域位置
         """
-        # 打开去水印区域处理过的raw txt
-        f = open(self.raw_subtitle_path, mode='r', encoding='utf-8')  # 打开txt文件，以‘utf-8’编码读取
-        line = f.readline()  # 以行的形式进行读取文件
-        # y坐标点列表
-        y_coordinates_list = []
-        while line:
-            text_position = line.split('\t')[1].split('(')[1].split(')')[0].split(', ')
-            y_coordinates_list.append((int(text_position[2]), int(text_position[3])))
-            line = f.readline()
-        f.close()
-        return Counter(y_coordinates_list).most_common(1)
+        y_coordinates = np.stack([self.result_store.ymin, self.result_store.ymax], axis=1)
+        return OcrResultStore.most_common(y_coordinates, 1)
+
+    def _detect_subtitle_band(self):
+        """
+        查找字幕区域，为了防止有双行字幕，根据容忍度，将字幕区域y范围加高
+        :return (ymin, ymax)
+        """
+        subtitle_area = self._detect_subtitle_area()[0][0]
+        ymin = abs(subtitle_area[0] - config.SUBTITLE_AREA_DEVIATION_PIXEL)
+        ymax = subtitle_area[1] + config.SUBTITLE_AREA_DEVIATION_PIXEL
+        return ymin, ymax
 
     def _frame_to_timecode(self, frame_no):
         """
@@ -725,36 +1265,71 @@ class SubtitleExtractor:
         :param frame_no: 视频的帧号，i.e. 第几帧视频帧
         :returns: SMPTE格式时间戳 as string, 如'01:02:12:032' 或者 '01:02:12;032'
         """
-        # 设置当前帧号
-        cap = cv2.VideoCapture(self.video_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_no)
-        ret, _ = cap.read()
         # 获取当前帧号对应的时间戳
-        if ret:
-            milliseconds = cap.get(cv2.CAP_PROP_POS_MSEC)
-            if milliseconds <= 0:
-                return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
-                                                                int(frame_no / (60 * self.fps) % 60),
-                                                                int(frame_no / self.fps % 60),
-                                                                int(frame_no % self.fps))
-            seconds = milliseconds // 1000
-            milliseconds = int(milliseconds % 1000)
-            minutes = 0
-            hours = 0
-            if seconds >= 60:
-                minutes = int(seconds // 60)
-                seconds = int(seconds % 60)
-            if minutes >= 60:
-                hours = int(minutes // 60)
-                minutes = int(minutes % 60)
-            smpte_token = ','
-            cap.release()
-            return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, smpte_token, milliseconds)
-        else:
+        milliseconds = self.__frame_to_pts(frame_no)
+        if milliseconds is None or milliseconds <= 0:
             return '{0:02d}:{1:02d}:{2:02d},{3:03d}'.format(int(frame_no / (3600 * self.fps)),
                                                             int(frame_no / (60 * self.fps) % 60),
                                                             int(frame_no / self.fps % 60),
                                                             int(frame_no % self.fps))
+        seconds = milliseconds // 1000
+        milliseconds = int(milliseconds % 1000)
+        minutes = 0
+        hours = 0
+        if seconds >= 60:
+            minutes = int(seconds // 60)
+            seconds = int(seconds % 60)
+        if minutes >= 60:
+            hours = int(minutes // 60)
+            minutes = int(minutes % 60)
+        smpte_token = ','
+        return "%02d:%02d:%02d%s%03d" % (hours, minutes, seconds, smpte_token, milliseconds)
+
+    def __record_pts(self, cap, frame_no):
+        """
+        记录刚读取的视频帧的显示时间戳
+        :param cap 刚读取了该帧的VideoCapture
+        :param frame_no 从1开始的帧号
+        """
+        milliseconds = cap.get(cv2.CAP_PROP_POS_MSEC)
+        if milliseconds >= 0:
+            self.frame_pts[frame_no - 1] = milliseconds
+            if self.checkpoint_enabled:
+                self.unsaved_pts.append((frame_no - 1, milliseconds))
+
+    def __build_pts_index(self):
+        """
+        提取过程没有记录时间戳时(如使用vsf提取)，遍历一次视频建立时间戳索引
+        """
+        cap = cv2.VideoCapture(self.video_path)
+        frame_no = 0
+        while cap.grab():
+            frame_no += 1
+            self.__record_pts(cap, frame_no)
+        cap.release()
+
+    def __frame_to_pts(self, frame_no, build_pts_index=True):
+        """
+        查找视频帧的显示时间戳，与使用CAP_PROP_POS_FRAMES定位到frame_no后读取一帧得到的时间戳一致
+        没有记录的帧(如定位跳过的帧)由最近的已记录帧按帧率推算
+        :param build_pts_index 没有记录任何时间戳时是否遍历视频建立时间戳索引
+        :return 毫秒，无法获取时返回None
+        """
+        if frame_no in self.frame_pts:
+            return self.frame_pts[frame_no]
+        if len(self.frame_pts) == 0:
+            if not build_pts_index:
+                return None
+            self.__build_pts_index()
+            if len(self.frame_pts) == 0:
+                return None
+            if frame_no in self.frame_pts:
+                return self.frame_pts[frame_no]
+        if len(self.frame_pts_index) != len(self.frame_pts):
+            self.frame_pts_index = sorted(self.frame_pts)
+        i = bisect.bisect_right(self.frame_pts_index, frame_no)
+        nearest_no = self.frame_pts_index[i - 1] if i > 0 else self.frame_pts_index[0]
+        return self.frame_pts[nearest_no] + (frame_no - nearest_no) * 1000 / self.fps
 
     def _timestamp_to_frameno(self, time_ms):
         return int(time_ms / self.fps)
@@ -762,97 +1337,38 @@ class SubtitleExtractor:
     def _frameno_to_milliseconds(self, frame_no):
         return float(int(frame_no / self.fps * 1000))
 
+    def __get_unique_subtitles(self):
+        """
+        获取去重后的字幕列表，OCR进程已经边识别边去重时直接使用其结果
+        """
+        if self.subtitle_spans is None:
+            self.subtitle_spans = self._remove_duplicate_subtitle()
+        return self.subtitle_spans
+
     def _remove_duplicate_subtitle(self):
         """
         读取原始的raw txt，去除重复行，返回去除了重复后的字幕列表
         """
         self._concat_content_with_same_frameno()
-        with open(self.raw_subtitle_path, mode='r', encoding='utf-8') as r:
-            lines = r.readlines()
-        RawInfo = namedtuple('RawInfo', 'no content')
-        content_list = []
-        for line in lines:
-            frame_no = line.split('\t')[0]
-            content = line.split('\t')[2]
-            content_list.append(RawInfo(frame_no, content))
+        deduplicator = SubtitleDeduplicator(config.THRESHOLD_TEXT_SIMILARITY, extend_single_frame=not self.use_vsf)
         # 去重后的字幕列表
         unique_subtitle_list = []
-        idx_i = 0
-        content_list_len = len(content_list)
-        # 循环遍历每行字幕，记录开始时间与结束时间
-        while idx_i < content_list_len:
-            i = content_list[idx_i]
-            start_frame = i.no
-            idx_j = idx_i
-            while idx_j < content_list_len:
-                # 计算当前行与下一行的Levenshtein距离
-                # 判决idx_j的下一帧是否与idx_i不同，若不同（或者是最后一帧）则找到结束帧
-                if idx_j + 1 == content_list_len or ratio(i.content.replace(' ', ''), content_list[idx_j + 1].content.replace(' ', '')) < config.THRESHOLD_TEXT_SIMILARITY:
-                    # 若找到终点帧,定义字幕结束帧帧号
-                    end_frame = content_list[idx_j].no
-                    if not self.use_vsf:
-                        if end_frame == start_frame and idx_j + 1 < content_list_len:
-                            # 针对只有一帧的情况，以下一帧的开始时间为准(除非是最后一帧)
-                            end_frame = content_list[idx_j + 1][0]
-                    # 寻找最长字幕
-                    similar_list = content_list[idx_i:idx_j + 1]
-                    similar_content_strip_list = [item.content.replace(' ', '') for item in similar_list]
-                    index, _ = max(enumerate(similar_content_strip_list), key=lambda x: len(x[1]))
-
-                    # 添加进列表
-                    unique_subtitle_list.append((start_frame, end_frame, similar_list[index].content))
-                    idx_i = idx_j + 1
-                    break
-                else:
-                    idx_j += 1
-                    continue
+        for frame_no, content in zip(self.result_store.frame_no.tolist(), self.result_store.text.tolist()):
+            span = deduplicator.push(frame_no, f'{content}\n')
+            if span is not None:
+                unique_subtitle_list.append(span)
+        span = deduplicator.flush()
+        if span is not None:
+            unique_subtitle_list.append(span)
         return unique_subtitle_list
 
     def _concat_content_with_same_frameno(self):
         """
-        将raw txt文本中具有相同帧号的字幕行合并
-        """
-        with open(self.raw_subtitle_path, mode='r', encoding='utf-8') as r:
-            lines = r.readlines()
-        content_list = []
-        frame_no_list = []
-        for line in lines:
-            frame_no = line.split('\t')[0]
-            frame_no_list.append(frame_no)
-            coordinate = line.split('\t')[1]
-            content = line.split('\t')[2]
-            content_list.append([frame_no, coordinate, content])
-
-        # 找出那些不止一行的帧号
-        frame_no_list = [i[0] for i in Counter(frame_no_list).most_common() if i[1] > 1]
-
-        # 找出这些帧号出现的位置
-        concatenation_list = []
-        for frame_no in frame_no_list:
-            position = [i for i, x in enumerate(content_list) if x[0] == frame_no]
-            concatenation_list.append((frame_no, position))
-
-        for i in concatenation_list:
-            content = []
-            for j in i[1]:
-                content.append(content_list[j][2])
-            content = ' '.join(content).replace('\n', ' ') + '\n'
-            for k in i[1]:
-                content_list[k][2] = content
-
-        # 将多余的字幕行删除
-        to_delete = []
-        for i in concatenation_list:
-            for j in i[1][1:]:
-                to_delete.append(content_list[j])
-        for i in to_delete:
-            if i in content_list:
-                content_list.remove(i)
-
-        with open(self.raw_subtitle_path, mode='w', encoding='utf-8') as f:
-            for frame_no, coordinate, content in content_list:
-                content = unicodedata.normalize('NFKC', content)
-                f.write(f'{frame_no}\t{coordinate}\t{content}')
+        将识别结果中具有相同帧号的字幕行合并
+        """
+        self.result_store.concat_same_frame(lambda content: unicodedata.normalize('NFKC', content))
+        if config.DEBUG_DUMP_RAW_TXT:
+            self.result_store.dump_raw_txt(self.raw_subtitle_path)
 
     def _unite_coordinates(self, coordinates_list):
         """
@@ -863,13 +1379,7 @@ class SubtitleExtractor:
         :return: 返回一个统一值后的坐标列表
         """
         # 将相似的坐标统一为一个
-        index = 0
-        for coordinate in coordinates_list:  # TODO：时间复杂度n^2，待优化
-            for i in coordinates_list:
-                if self.__is_coordinate_similar(coordinate, i):
-                    coordinates_list[index] = i
-            index += 1
-        return coordinates_list
+        return unite_coordinates(coordinates_list, config.PIXEL_TOLERANCE_X, config.PIXEL_TOLERANCE_Y)
 
     def _compute_image_similarity(self, image1, image2):
         """
@@ -920,7 +1430,7 @@ class SubtitleExtractor:
         比较两张图片预测出的字幕区域文本是否相同
         """
         if self.ocr is None:
-            self.ocr = OcrRecogniser()
+            self.ocr = CachedRecogniser(get_cached_model(OcrRecogniser), config.OCR_CACHE_SIZE, self.sub_area)
         if img1_no in result_cache:
             area_text1 = result_cache[img1_no]['text']
         else:
@@ -945,17 +1455,6 @@ class SubtitleExtractor:
         else:
             return False
 
-    @staticmethod
-    def __is_coordinate_similar(coordinate1, coordinate2):
-        """
-        计算两个坐标是否相似，如果两个坐标点的xmin,xmax,ymin,ymax的差值都在像素点容忍度内
-        则认为这两个坐标点相似
-        """
-        return abs(coordinate1[0] - coordinate2[0]) < config.PIXEL_TOLERANCE_X and \
-            abs(coordinate1[1] - coordinate2[1]) < config.PIXEL_TOLERANCE_X and \
-            abs(coordinate1[2] - coordinate2[2]) < config.PIXEL_TOLERANCE_Y and \
-            abs(coordinate1[3] - coordinate2[3]) < config.PIXEL_TOLERANCE_Y
-
     @staticmethod
     def __get_thum(image, size=(64, 64), greyscale=False):
         """
@@ -968,6 +1467,20 @@ class SubtitleExtractor:
             image = image.convert('L')
         return image
 
+    def __share_frame(self, frame):
+        """
+        将视频帧裁剪后写入共享内存，返回槽位号
+        未启用共享内存或写入失败时返回None，由OCR进程自行解码该帧
+        """
+        if self.frame_ring is None or frame is None:
+            return None
+        slot = self.frame_ring.write(subtitle_ocr.crop_frame(frame, self.ocr_crop_box),
+                                     is_alive=self.subtitle_ocr_process.is_alive)
+        if slot is None and not self.subtitle_ocr_process.is_alive():
+            # OCR进程已经退出，继续提取视频帧没有意义
+            raise RuntimeError(config.interface_config['Main']['OcrProcessExited'])
+        return slot
+
     def __delete_frame_cache(self):
         if not config.DEBUG_NO_DELETE_CACHE:
             if len(os.listdir(self.frame_output_dir)) > 0:
@@ -994,6 +1507,23 @@ class SubtitleExtractor:
             self.progress_frame_extract = frame_extract
         self.progress_total = (self.progress_frame_extract + self.progress_ocr) / 2
 
+    @staticmethod
+    def __get_model_settings():
+        """
+        决定OCR模型的配置项，常驻OCR服务据此判断是否需要重新加载模型
+        """
+        return {'REC_CHAR_TYPE': config.REC_CHAR_TYPE, 'MODE_TYPE': config.MODE_TYPE,
+                'OCR_CPU_THREADS': config.OCR_CPU_THREADS}
+
+    @staticmethod
+    def __get_ocr_model_id():
+        """
+        检测与识别模型的标识，本地OCR结果缓存只复用同一组模型的识别结果
+        """
+        det_model = os.path.relpath(config.DET_MODEL_PATH, config.DET_MODEL_BASE)
+        rec_model = os.path.relpath(config.REC_MODEL_PATH, config.REC_MODEL_BASE)
+        return f'{det_model}|{rec_model}|{config.REC_IMAGE_SHAPE}|{config.LINE_BAND_MODE}'
+
     def start_subtitle_ocr_async(self):
         def get_ocr_progress():
             """
@@ -1014,15 +1544,93 @@ class SubtitleExtractor:
                 if current_frame_no == -1:
                     return
 
-        process, task_queue, progress_queue = subtitle_ocr.async_start(self.video_path,
-                                                                       self.raw_subtitle_path,
-                                                                       self.sub_area,
-                                                                       options={'REC_CHAR_TYPE': config.REC_CHAR_TYPE,
-                                                                                'DROP_SCORE': config.DROP_SCORE,
-                                                                                'SUB_AREA_DEVIATION_RATE': config.SUB_AREA_DEVIATION_RATE,
-                                                                                'DEBUG_OCR_LOSS': config.DEBUG_OCR_LOSS,
-                                                                                }
-                                                                       )
+        def collect_subtitle_spans():
+            """
+            接收OCR进程去重后的字幕段
+            """
+            while True:
+                try:
+                    span = self.subtitle_span_queue.get(block=True, timeout=1)
+                except queue.Empty:
+                    # 常驻OCR服务进程异常退出时不会再放入结束标志
+                    if self.subtitle_ocr_process is not None and not self.subtitle_ocr_process.is_alive():
+                        return
+                    continue
+                if span is None:
+                    return
+                self.subtitle_spans.append(span)
+                for listener in self.subtitle_span_listeners:
+                    listener(span)
+
+        self.subtitle_ocr_process = None
+        # 送入OCR的视频帧只保留字幕区域(及允许的越界范围)
+        if self.frame_height > 0 and self.frame_width > 0:
+            self.ocr_crop_box = subtitle_ocr.get_crop_box(self.default_subtitle_area, self.sub_area,
+                                                          self.frame_height, self.frame_width,
+                                                          config.SUB_AREA_DEVIATION_RATE, config.SUB_AREA_CROP_PADDING)
+        # 使用常驻OCR服务时，模型在多个视频之间保持加载，队列由服务进程创建时继承
+        service = None
+        if config.OCR_SERVICE and config.OCR_WORKER_NUM <= 1:
+            service = ocr_service.get_service(self.__get_model_settings())
+        self.use_ocr_service = service is not None
+        # 创建共享内存视频帧缓冲区，槽位大小与裁剪后的视频帧一致
+        if config.SHARED_FRAME_SLOT_NUM > 0 and self.ocr_crop_box is not None:
+            ymin, ymax, xmin, xmax = self.ocr_crop_box
+            if service is not None:
+                self.frame_ring = service.create_frame_ring((ymax - ymin, xmax - xmin, 3), config.SHARED_FRAME_SLOT_NUM)
+            else:
+                self.frame_ring = SharedFrameRing((ymax - ymin, xmax - xmin, 3), config.SHARED_FRAME_SLOT_NUM)
+        # 指定了字幕区域时不需要再过滤水印与场景文本，OCR进程可以边识别边去重
+        # 从断点继续时断点之前的字幕段已经丢失，识别结束后再统一去重
+        if self.sub_area is not None and self.resume_state is None:
+            self.subtitle_spans = []
+            self.subtitle_span_queue = service.span_queue if service is not None else multiprocessing.Queue()
+            self.subtitle_span_thread = Thread(target=collect_subtitle_spans, daemon=True)
+            self.subtitle_span_thread.start()
+        else:
+            self.subtitle_spans = None
+        options = {'REC_CHAR_TYPE': config.REC_CHAR_TYPE,
+                   'DROP_SCORE': config.DROP_SCORE,
+                   'SUB_AREA_DEVIATION_RATE': config.SUB_AREA_DEVIATION_RATE,
+                   'DEBUG_OCR_LOSS': config.DEBUG_OCR_LOSS,
+                   'FRAME_DIFF_THRESHOLD': config.FRAME_DIFF_THRESHOLD,
+                   'OCR_WORKER_NUM': config.OCR_WORKER_NUM,
+                   'OCR_CPU_THREADS': config.OCR_CPU_THREADS,
+                   'OCR_BATCH_FRAME_NUM': config.OCR_BATCH_FRAME_NUM,
+                   'LINE_BAND_MODE': config.LINE_BAND_MODE,
+                   'LINE_BAND_WARMUP_NUM': config.LINE_BAND_WARMUP_NUM,
+                   'LINE_BAND_MIN_SCORE': config.LINE_BAND_MIN_SCORE,
+                   'LINE_BAND_DETECT_INTERVAL': config.LINE_BAND_DETECT_INTERVAL,
+                   'OCR_CACHE_SIZE': config.OCR_CACHE_SIZE,
+                   'OCR_DISK_CACHE_PATH': config.OCR_DISK_CACHE_PATH,
+                   'OCR_DISK_CACHE_SIZE_MB': config.OCR_DISK_CACHE_SIZE_MB,
+                   'OCR_MODEL_ID': self.__get_ocr_model_id(),
+                   'OCR_SIDECAR': config.OCR_SIDECAR,
+                   'RESUME': self.resume_state is not None,
+                   'CHECKPOINT_INTERVAL': config.CHECKPOINT_INTERVAL if self.checkpoint_enabled else 0,
+                   'DEBUG_DUMP_RAW_TXT': config.DEBUG_DUMP_RAW_TXT,
+                   'THRESHOLD_TEXT_SIMILARITY': config.THRESHOLD_TEXT_SIMILARITY,
+                   'USE_VSF': self.use_vsf,
+                   }
+        if service is not None:
+            process, task_queue, progress_queue = service.async_start(self.__get_model_settings(),
+                                                                      self.video_path,
+                                                                      self.raw_subtitle_path,
+                                                                      self.sub_area,
+                                                                      options=options,
+                                                                      frame_ring=self.frame_ring,
+                                                                      crop_box=self.ocr_crop_box,
+                                                                      use_span_queue=self.subtitle_span_queue is not None)
+        else:
+            process, task_queue, progress_queue = subtitle_ocr.async_start(self.video_path,
+                                                                           self.raw_subtitle_path,
+                                                                           self.sub_area,
+                                                                           options=options,
+                                                                           frame_ring=self.frame_ring,
+                                                                           crop_box=self.ocr_crop_box,
+                                                                           span_queue=self.subtitle_span_queue
+                                                                           )
+        self.subtitle_ocr_process = process
         self.subtitle_ocr_task_queue = task_queue
         self.subtitle_ocr_progress_queue = progress_queue
         # 开启线程负责更新OCR进度
@@ -1039,6 +1647,42 @@ class SubtitleExtractor:
                 f.write(f'{sub.text}\n')
 
 
+def extract_video(video_path, sub_area=None, resume=False):
+    """
+    提取一个视频的字幕，批量处理时在工作进程中调用
+    """
+    SubtitleExtractor(video_path, sub_area, resume).run()
+
+
+def init_batch_worker(settings):
+    """
+    批量处理工作进程的初始化：应用命令行指定的配置与分配给每个视频的OCR推理线程数
+    """
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+
+def run_batch(path, sub_area, video_worker_num, resume=False):
+    """
+    批量提取目录或清单中的视频字幕，按CPU核心数同时处理多个视频
+    """
+    videos = batch_scheduler.collect_videos(path, sub_area)
+    # 没有字幕区域时需要交互确认水印与字幕区域，批量处理时无法询问
+    missing_area = [video_path for video_path, video_area in videos if video_area is None]
+    if len(missing_area) > 0:
+        raise SystemExit(config.interface_config['Main']['BatchSubAreaRequired'].format(missing_area))
+    video_worker_num, ocr_threads = batch_scheduler.plan_workers(len(videos), video_worker_num,
+                                                                 config.BATCH_CORES_PER_VIDEO)
+    print(config.interface_config['Main']['BatchPlan'].format(len(videos), video_worker_num, ocr_threads))
+    settings = {'REC_CHAR_TYPE': config.REC_CHAR_TYPE, 'MODE_TYPE': config.MODE_TYPE,
+                'OCR_CPU_THREADS': config.OCR_CPU_THREADS or ocr_threads}
+    worker = functools.partial(extract_video, resume=resume) if resume else extract_video
+    results = batch_scheduler.run_batch(videos, worker, video_worker_num, init_batch_worker, (settings,))
+    failed = [video_path for video_path, error in results.items() if error is not None]
+    print(config.interface_config['Main']['BatchSummary'].format(len(results) - len(failed), len(failed)))
+    return failed
+
+
 if __name__ == '__main__':
     multiprocessing.set_start_method("spawn")
     # вместо input() берём значения из CLI
@@ -1054,6 +1698,10 @@ if __name__ == '__main__':
     config.REC_CHAR_TYPE = args.lang
     config.MODE_TYPE     = args.mode
 
-    se = SubtitleExtractor(video_path, subtitle_area)
+    if args.batch:
+        sys.exit(1 if run_batch(args.batch, subtitle_area, args.batch_workers, args.resume) else 0)
+    if args.from_ocr_cache:
+        SubtitleExtractor.from_ocr_sidecar(args.from_ocr_cache, subtitle_area).regenerate_subtitle_file()
+        sys.exit(0)
+    se = SubtitleExtractor(video_path, subtitle_area, args.resume)
     se.run()
-
@@ -0,0 +1,126 @@
+import os
+import queue
+import traceback
+from multiprocessing import Queue, Process, cpu_count
+
+from backend import config
+
+# 批量处理目录时识别为视频的文件扩展名
+VIDEO_EXTENSIONS = ('.mp4', '.flv', '.wmv', '.avi', '.mkv', '.mov', '.ts', '.m4v', '.webm')
+
+
+def read_manifest(path, sub_area=None):
+    """
+    读取视频清单文件，每行一个视频: 视频路径 [ymin ymax xmin xmax]，#开头的行为注释
+    相对路径相对于清单文件所在目录
+    :param sub_area 没有指定字幕区域的视频使用的字幕区域
+    :return [(video_path, sub_area)]
+    """
+    videos = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            fields = line.rsplit(maxsplit=4)
+            video_area = sub_area
+            if len(fields) == 5 and all(field.lstrip('-').isdigit() for field in fields[1:]):
+                line = fields[0]
+                video_area = tuple(int(field) for field in fields[1:])
+            videos.append((os.path.join(base_dir, line), video_area))
+    return videos
+
+
+def collect_videos(path, sub_area=None):
+    """
+    获取批量处理的视频列表
+    :param path 视频目录(不递归)或视频清单文件
+    :param sub_area 没有指定字幕区域的视频使用的字幕区域
+    :return [(video_path, sub_area)]
+    """
+    if os.path.isdir(path):
+        return [(os.path.join(path, name), sub_area) for name in sorted(os.listdir(path))
+                if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS]
+    return read_manifest(path, sub_area)
+
+
+def plan_workers(video_num, video_worker_num=0, cores_per_video=4, total_cores=None):
+    """
+    按CPU核心数确定同时处理的视频数与每个视频的OCR推理线程数
+    :param video_num 视频数量
+    :param video_worker_num 同时处理的视频数，不大于0时按核心数自动计算
+    :param cores_per_video 自动计算时每个视频占用的核心数，其中一个核心用于解码视频帧
+    :param total_cores CPU核心数，为None时使用当前机器的核心数
+    :return (video_worker_num同时处理的视频数, ocr_threads每个视频的OCR推理线程数)
+    """
+    total_cores = total_cores or cpu_count()
+    if video_worker_num <= 0:
+        video_worker_num = total_cores // max(cores_per_video, 1)
+    video_worker_num = max(min(video_worker_num, video_num), 1)
+    # 平分核心后，每个视频留出一个核心解码视频帧
+    ocr_threads = max(total_cores // video_worker_num - 1, 1)
+    return video_worker_num, ocr_threads
+
+
+def batch_worker(video_queue, result_queue, worker, initializer=None, initargs=()):
+    """
+    批量处理工作进程：依次领取视频并处理，模型在进程内保持加载，供之后的视频复用
+    :param video_queue (video_path, sub_area)，None表示结束
+    :param result_queue (video_path, error错误信息)
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        item = video_queue.get(block=True)
+        if item is None:
+            break
+        video_path, sub_area = item
+        error = None
+        try:
+            worker(video_path, sub_area)
+        except Exception:
+            error = traceback.format_exc()
+        result_queue.put((video_path, error))
+
+
+def run_batch(videos, worker, video_worker_num, initializer=None, initargs=()):
+    """
+    用video_worker_num个工作进程处理多个视频，空闲的进程领取下一个视频，每个视频完成后结果立即写出
+    :param videos [(video_path, sub_area)]
+    :param worker 处理一个视频的函数worker(video_path, sub_area)，需要可以被子进程导入
+    :param initializer 工作进程启动时调用的函数
+    :return {video_path: 错误信息，成功为None}
+    """
+    video_queue = Queue()
+    result_queue = Queue()
+    for video in videos:
+        video_queue.put(video)
+    # 工作进程需要再开启OCR进程，不能是守护进程
+    workers = [Process(target=batch_worker, args=(video_queue, result_queue, worker, initializer, initargs))
+               for _ in range(video_worker_num)]
+    for p in workers:
+        video_queue.put(None)
+        p.start()
+    results = {}
+    finished = 0
+    while finished < len(videos):
+        try:
+            video_path, error = result_queue.get(block=True, timeout=1)
+        except queue.Empty:
+            if not any(p.is_alive() for p in workers):
+                break
+            continue
+        finished += 1
+        results[video_path] = error
+        status = config.interface_config['Main']['BatchVideoOk' if error is None else 'BatchVideoFailed']
+        print(f'[{finished}/{len(videos)}] {status} {video_path}')
+        if error is not None:
+            print(error)
+    for p in workers:
+        p.join()
+    # 工作进程异常退出时未完成的视频
+    for video_path, _ in videos:
+        if video_path not in results:
+            results[video_path] = 'worker process exited'
+    return results
@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+
+# 视频帧时间戳断点文件的记录格式: 从0开始的帧序号, 毫秒
+PTS_DTYPE = np.dtype([('frame_no', '<i8'), ('ms', '<f8')])
+
+
+def get_ocr_checkpoint_path(raw_subtitle_path):
+    """
+    根据原始字幕文件路径获取OCR进程断点文件的路径, e.g. subtitle/raw.txt -> subtitle/raw_checkpoint.npz
+    """
+    return os.path.splitext(raw_subtitle_path)[0] + '_checkpoint.npz'
+
+
+def get_extract_checkpoint_path(raw_subtitle_path):
+    """
+    根据原始字幕文件路径获取视频帧提取断点文件的路径, e.g. subtitle/raw.txt -> subtitle/extract_checkpoint.json
+    """
+    return os.path.join(os.path.dirname(raw_subtitle_path), 'extract_checkpoint.json')
+
+
+def get_pts_checkpoint_path(raw_subtitle_path):
+    """
+    根据原始字幕文件路径获取视频帧时间戳断点文件的路径, e.g. subtitle/raw.txt -> subtitle/extract_checkpoint_pts.bin
+    """
+    return os.path.join(os.path.dirname(raw_subtitle_path), 'extract_checkpoint_pts.bin')
+
+
+def replace_file(path, write):
+    """
+    先写入临时文件再替换，进程在写入中途退出时不会留下不完整的断点文件
+    :param write 写入函数write(f)，f为以二进制方式打开的临时文件
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, mode='wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def encode_result(result):
+    """
+    将识别结果(dt_box, rec_res)转换为可以JSON序列化的列表
+    """
+    dt_box, rec_res = result
+    return [[[float(point[0]), float(point[1])] for point in box] for box in dt_box], \
+        [[str(res[0]), float(res[1])] for res in rec_res]
+
+
+def decode_result(value):
+    dt_box, rec_res = value
+    return [[tuple(point) for point in box] for box in dt_box], [tuple(res) for res in rec_res]
+
+
+def save_ocr_checkpoint(path, frame_no, reference, reference_result, cache_items):
+    """
+    保存OCR进程的断点，调用前识别结果存储已写入文件，断点文件最后写入，存在即表示之前的结果完整
+    :param frame_no 已经识别并写入识别结果的最后一帧帧号
+    :param reference 视频帧变化检测的参照帧边缘图，没有时为None
+    :param reference_result 参照帧的识别结果(dt_box, rec_res)，没有时为None
+    :param cache_items 感知哈希缓存中的条目[(key, (thumbnail, (dt_box, rec_res))), ...]，按最近使用的顺序
+    """
+    state = {'frame_no': frame_no,
+             'reference_result': encode_result(reference_result) if reference_result is not None else None,
+             'cache_items': [[rows, cols, bits.hex(), encode_result(value)]
+                             for (rows, cols, bits), (_, value) in cache_items]}
+    arrays = {'state': np.array(json.dumps(state, ensure_ascii=False))}
+    if reference is not None:
+        arrays['reference'] = reference
+    for i, (_, (thumbnail, _)) in enumerate(cache_items):
+        arrays[f'thumbnail_{i}'] = thumbnail
+    replace_file(path, lambda f: np.savez(f, **arrays))
+
+
+def load_ocr_checkpoint(path):
+    """
+    读取OCR进程的断点
+    :return (frame_no, reference, reference_result, cache_items)，没有断点时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        state = json.loads(str(data['state']))
+        reference = data['reference'] if 'reference' in data.files else None
+        thumbnails = [data[f'thumbnail_{i}'] for i in range(len(state['cache_items']))]
+    reference_result = state['reference_result']
+    cache_items = [((rows, cols, bytes.fromhex(bits)), (thumbnail, decode_result(value)))
+                   for (rows, cols, bits, value), thumbnail in zip(state['cache_items'], thumbnails)]
+    return state['frame_no'], reference, decode_result(reference_result) if reference_result is not None else None, \
+        cache_items
+
+
+def save_extract_checkpoint(path, state):
+    """
+    保存视频帧提取的断点
+    :param state 可以JSON序列化的提取状态
+    """
+    replace_file(path, lambda f: f.write(json.dumps(state, ensure_ascii=False).encode('utf-8')))
+
+
+def load_extract_checkpoint(path):
+    """
+    :return 提取状态，没有断点时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, mode='r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def append_pts_checkpoint(path, entries):
+    """
+    将上次保存断点之后记录的时间戳追加到时间戳断点文件，之前的记录不再重新写入
+    :param entries [(从0开始的帧序号, 毫秒), ...]
+    :return 追加的记录数
+    """
+    with open(path, mode='ab') as f:
+        f.write(np.array(entries, dtype=PTS_DTYPE).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    return len(entries)
+
+
+def load_pts_checkpoint(path, count):
+    """
+    读取时间戳断点文件中的前count条记录，之后的记录是断点保存之后写入的，不完整
+    :return PTS_DTYPE数组，记录不足count条时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    records = np.fromfile(path, dtype=PTS_DTYPE, count=count)
+    return records if len(records) == count else None
+
+
+def truncate_pts_checkpoint(path, count):
+    """
+    只保留时间戳断点文件中的前count条记录，从断点继续时之后的时间戳会重新记录并追加
+    """
+    with open(path, mode='r+b') as f:
+        f.truncate(count * PTS_DTYPE.itemsize)
+
+
+def remove_checkpoints(raw_subtitle_path):
+    for path in (get_ocr_checkpoint_path(raw_subtitle_path), get_extract_checkpoint_path(raw_subtitle_path),
+                 get_pts_checkpoint_path(raw_subtitle_path)):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from itertools import product
+
+import numpy as np
+
+
+def is_coordinate_similar(coordinate1, coordinate2, tolerance_x, tolerance_y):
+    """
+    计算两个坐标是否相似，如果两个坐标点的xmin,xmax,ymin,ymax的差值都在像素点容忍度内
+    则认为这两个坐标点相似
+    """
+    return abs(coordinate1[0] - coordinate2[0]) < tolerance_x and \
+        abs(coordinate1[1] - coordinate2[1]) < tolerance_x and \
+        abs(coordinate1[2] - coordinate2[2]) < tolerance_y and \
+        abs(coordinate1[3] - coordinate2[3]) < tolerance_y
+
+
+class CoordinateGrid:
+    """
+    按容忍度划分的坐标网格，网格边长等于容忍度，相似的坐标一定位于相同或相邻的网格中
+    """
+    # 四个维度上的相邻网格偏移
+    NEIGHBOUR_OFFSETS = list(product((-1, 0, 1), repeat=4))
+
+    def __init__(self, tolerance_x, tolerance_y):
+        self.tolerances = (tolerance_x, tolerance_x, tolerance_y, tolerance_y)
+        self.cells = defaultdict(list)
+
+    def cell(self, coordinate):
+        return tuple(int(v // t) for v, t in zip(coordinate, self.tolerances))
+
+    def add(self, coordinate, item):
+        self.cells[self.cell(coordinate)].append(item)
+
+    def neighbours(self, cell):
+        """
+        :return 相同及相邻网格中的所有元素
+        """
+        items = []
+        for offset in self.NEIGHBOUR_OFFSETS:
+            items.extend(self.cells.get(tuple(v + o for v, o in zip(cell, offset)), ()))
+        return items
+
+
+def unite_coordinates(coordinates_list, tolerance_x, tolerance_y, chunk_size=1 << 22):
+    """
+    给定一个坐标列表，将这个列表中相似的坐标统一为一个值，结果与逐个两两比较并原地替换的实现完全相同：
+    列表中之后还有相似坐标时，统一为之后最后一个相似的坐标；否则统一为之前最后一个与其相似的统一后坐标
+    相同的坐标只计算一次，并按容忍度将坐标划分到网格中，只与相邻网格中的坐标批量比较，时间复杂度近似线性
+    :param coordinates_list 包含坐标点(xmin, xmax, ymin, ymax)的列表
+    :param tolerance_x 横向像素点容忍度
+    :param tolerance_y 纵向像素点容忍度
+    :param chunk_size 批量比较时相似度矩阵的最大元素数
+    :return: 返回一个统一值后的坐标列表
+    """
+    coordinates_list = [tuple(coordinate) for coordinate in coordinates_list]
+    if tolerance_x <= 0 or tolerance_y <= 0 or len(coordinates_list) == 0:
+        return coordinates_list
+    # 每个不同的坐标最后出现的位置
+    last_index = {}
+    for index, coordinate in enumerate(coordinates_list):
+        last_index[coordinate] = index
+    values = np.array(list(last_index), dtype=np.int64)
+    lasts = np.array(list(last_index.values()), dtype=np.int64)
+    tolerances = np.array([tolerance_x, tolerance_x, tolerance_y, tolerance_y], dtype=np.int64)
+    grid = CoordinateGrid(tolerance_x, tolerance_y)
+    for value_id, coordinate in enumerate(last_index):
+        grid.add(coordinate, value_id)
+    # 每个不同的坐标的相似坐标中最后出现的一个
+    latest = np.empty(len(values), dtype=np.int64)
+    for cell, members in grid.cells.items():
+        members = np.array(members, dtype=np.int64)
+        # 同一网格中的坐标都相似，只有出现得更晚的相邻网格坐标才需要逐个比较
+        own_latest = members[lasts[members].argmax()]
+        latest[members] = own_latest
+        neighbours = np.array(grid.neighbours(cell), dtype=np.int64)
+        neighbours = neighbours[lasts[neighbours] > lasts[own_latest]]
+        if len(neighbours) == 0:
+            continue
+        step = max(chunk_size // len(neighbours), 1)
+        for start in range(0, len(members), step):
+            chunk = members[start:start + step]
+            similar = (np.abs(values[chunk][:, None, :] - values[neighbours][None, :, :]) < tolerances).all(axis=2)
+            candidate = np.where(similar, lasts[neighbours][None, :], -1).argmax(axis=1)
+            found = similar[np.arange(len(chunk)), candidate]
+            latest[chunk[found]] = neighbours[candidate[found]]
+
+    value_ids = {coordinate: value_id for value_id, coordinate in enumerate(last_index)}
+    united_list = []
+    # 已统一的坐标及其最后出现的位置
+    united_index = {}
+    united_grid = CoordinateGrid(tolerance_x, tolerance_y)
+    for index, coordinate in enumerate(coordinates_list):
+        target = latest[value_ids[coordinate]]
+        if lasts[target] > index:
+            united = coordinates_list[lasts[target]]
+        else:
+            # 之后没有相似的坐标，取之前最后一个与其相似的统一后坐标
+            united, united_no = coordinate, -1
+            for candidate in united_grid.neighbours(united_grid.cell(coordinate)):
+                if united_index[candidate] > united_no \
+                        and is_coordinate_similar(coordinate, candidate, tolerance_x, tolerance_y):
+                    united, united_no = candidate, united_index[candidate]
+        if united not in united_index:
+            united_grid.add(united, united)
+        united_index[united] = index
+        united_list.append(united)
+    return united_list
+
+
+def overflow_area_rates(sub_area, coordinates):
+    """
+    批量计算文本框超出字幕区域的比例，字幕区域与文本框都是与坐标轴平行的矩形，直接按坐标计算交集，无需构造多边形
+    :param sub_area 字幕区域(ymin, ymax, xmin, xmax)
+    :param coordinates 文本框坐标列表[(xmin, xmax, ymin, ymax), ...]
+    :return (intersects, rates)
+        intersects 每个文本框是否与字幕区域有交集，边或顶点相接也算有交集；
+            与shapely一致，宽或高为0的文本框按线段处理，只有与字幕区域重叠的长度大于0才算有交集
+        rates 越界比例: (字幕区域面积 + 文本框面积 - 交集面积) / 字幕区域面积 - 1，没有交集时为0
+    """
+    boxes = np.asarray(coordinates, dtype=np.float64).reshape(-1, 4)
+    s_ymin, s_ymax, s_xmin, s_xmax = (float(v) for v in sub_area)
+    xmin, xmax, ymin, ymax = boxes.T
+    overlap_x = np.minimum(xmax, s_xmax) - np.maximum(xmin, s_xmin)
+    overlap_y = np.minimum(ymax, s_ymax) - np.maximum(ymin, s_ymin)
+    intersects = (overlap_x >= 0) & (overlap_y >= 0) & ((xmax != xmin) | (overlap_y > 0)) & \
+        ((ymax != ymin) | (overlap_x > 0))
+    intersection_area = np.clip(overlap_x, 0, None) * np.clip(overlap_y, 0, None)
+    sub_area_area = abs((s_xmax - s_xmin) * (s_ymax - s_ymin))
+    box_area = np.abs((xmax - xmin) * (ymax - ymin))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = (sub_area_area + box_area - intersection_area) / sub_area_area - 1
+    return intersects, np.where(intersects, rates, 0.0)
@@ -0,0 +1,109 @@
+import queue
+import time
+from multiprocessing import Queue, shared_memory
+import numpy as np
+
+
+class SharedFrameRing:
+    """
+    基于共享内存的视频帧环形缓冲区
+    主进程解码视频帧后写入空闲槽位，OCR进程通过槽位号直接读取共享内存中的视频帧(零拷贝)，
+    避免同一帧在两个进程中被重复解码、定位
+    """
+
+    def __init__(self, shape, slot_num, write_timeout=60, free_slots=None):
+        """
+        :param shape 每个槽位存放的视频帧形状(裁剪后)，e.g. (540, 1920, 3)
+        :param slot_num 槽位数量
+        :param write_timeout 等待空闲槽位的最长秒数，超时则放弃写入，由OCR进程自行解码该帧
+        :param free_slots 空闲槽位队列，为None时新建；常驻OCR服务进程只能通过继承持有队列，多个缓冲区会复用同一个队列
+        """
+        self.shape = tuple(shape)
+        self.slot_num = slot_num
+        self.slot_size = int(np.prod(self.shape))
+        self.write_timeout = write_timeout
+        self.shm = shared_memory.SharedMemory(create=True, size=max(self.slot_size * slot_num, 1))
+        # 空闲槽位队列，写入方取出槽位，读取方用完后归还，槽位以(共享内存名, 槽位号)标记，复用队列时忽略之前的缓冲区遗留的槽位
+        self.free_slots = free_slots if free_slots is not None else Queue()
+        for slot in range(slot_num):
+            self.free_slots.put((self.shm.name, slot))
+        self._owner = True
+
+    def __getstate__(self):
+        # 子进程中只按名字重新挂载共享内存
+        return dict(self.describe(), free_slots=self.free_slots)
+
+    def __setstate__(self, state):
+        self.shape = state['shape']
+        self.slot_num = state['slot_num']
+        self.slot_size = int(np.prod(self.shape))
+        self.write_timeout = state['write_timeout']
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.free_slots = state['free_slots']
+        self._owner = False
+
+    def describe(self):
+        """
+        :return 不含空闲槽位队列的挂载信息，可以通过管道发送给已经持有同一个空闲槽位队列的进程
+        """
+        return {'shape': self.shape, 'slot_num': self.slot_num, 'write_timeout': self.write_timeout,
+                'name': self.shm.name}
+
+    @classmethod
+    def attach(cls, description, free_slots):
+        """
+        根据describe()的挂载信息与已持有的空闲槽位队列挂载共享内存
+        """
+        ring = cls.__new__(cls)
+        ring.__setstate__(dict(description, free_slots=free_slots))
+        return ring
+
+    def write(self, frame, is_alive=None):
+        """
+        将视频帧写入一个空闲槽位
+        :param frame 视频帧
+        :param is_alive 读取方是否还在运行，读取方退出后不会再归还槽位，不再等待
+        :return 槽位号，帧形状不匹配、等待超时或读取方已退出则返回None
+        """
+        if frame is None or frame.shape != self.shape or frame.dtype != np.uint8:
+            return None
+        deadline = time.monotonic() + self.write_timeout
+        while True:
+            try:
+                name, slot = self.free_slots.get(block=True, timeout=min(max(deadline - time.monotonic(), 0), 1))
+            except queue.Empty:
+                if time.monotonic() >= deadline or (is_alive is not None and not is_alive()):
+                    return None
+                continue
+            if name == self.shm.name:
+                break
+        self.read(slot)[...] = frame
+        return slot
+
+    def read(self, slot):
+        """
+        获取槽位中视频帧的视图，不发生拷贝，在release之前有效
+        """
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_size)
+
+    def release(self, slot):
+        """
+        归还槽位
+        """
+        if slot is not None:
+            self.free_slots.put((self.shm.name, slot))
+
+    def close(self):
+        """
+        关闭共享内存，创建者同时负责销毁
+        """
+        try:
+            self.shm.close()
+        except BufferError:
+            # 仍有视图引用该内存，交给进程退出时回收
+            pass
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
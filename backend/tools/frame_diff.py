@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    """
+    字幕区域变化检测器
+    将字幕区域灰度化并等比缩小后提取边缘，与上一次OCR识别时字幕区域的边缘做比较，
+    发生变化的边缘像素占字幕区域面积的比例不超过阈值则认为字幕没有变化，可以直接沿用上一次的识别结果
+    按面积而不是按边缘像素总数计算占比，字幕区域中静止背景的边缘不会稀释文字的变化，
+    字幕区域应当只包含字幕所在的行，整帧比较时一行字幕只占很小的面积，无法可靠地检测变化
+    """
+
+    def __init__(self, threshold, scale_width=640):
+        """
+        :param threshold 变化边缘像素占字幕区域面积的比例阈值，e.g. 0.005表示超过0.5%的像素边缘发生变化就认为字幕变化
+        :param scale_width 比较前将字幕区域等比缩放到的宽度
+        """
+        self.threshold = threshold
+        self.scale_width = scale_width
+        self.reference = None
+
+    def _edges(self, image):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = image.shape[:2]
+        if width > self.scale_width:
+            scale_height = max(int(height * self.scale_width / width), 1)
+            image = cv2.resize(image, (self.scale_width, scale_height), interpolation=cv2.INTER_AREA)
+        return cv2.Canny(image, 100, 200)
+
+    def is_changed(self, image):
+        """
+        判断字幕区域相对参考帧是否发生变化，没有参考帧时视为变化
+        """
+        if self.reference is None or image is None or image.size == 0:
+            return True
+        edges = self._edges(image)
+        if edges.shape != self.reference.shape:
+            return True
+        changed = np.count_nonzero(edges != self.reference)
+        return changed > self.threshold * edges.size
+
+    def update(self, image):
+        """
+        将进行了OCR识别的字幕区域设为参考帧
+        """
+        if image is None or image.size == 0:
+            self.reference = None
+        else:
+            self.reference = self._edges(image)
+
+
+def crop_sub_area(frame, sub_area):
+    """
+    裁剪出视频帧中的字幕区域，字幕区域为空或与视频帧没有交集时返回整帧
+    :param sub_area (ymin, ymax, xmin, xmax)
+    """
+    if sub_area is None:
+        return frame
+    ymin, ymax, xmin, xmax = sub_area
+    height, width = frame.shape[:2]
+    ymin, ymax = max(int(ymin), 0), min(int(ymax), height)
+    xmin, xmax = max(int(xmin), 0), min(int(xmax), width)
+    if ymin >= ymax or xmin >= xmax:
+        return frame
+    return frame[ymin:ymax, xmin:xmax]
@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+from backend.tools.ocr import get_coordinates
+
+
+class LineBandRecogniser:
+    """
+    免检测识别：字幕通常固定在一到两行水平条带上，
+    预热阶段使用完整的检测+识别学习字幕所在的行条带，之后只将各行条带裁剪后送入识别模型，跳过文本检测，
+    识别置信度下降、所有行条带都没有文字或每隔detect_interval帧时回退到完整检测，并用检测结果修正行条带，
+    行条带之外新出现的字幕行(如第二行字幕、高度变化的字幕)最多在detect_interval帧后被检测到
+    """
+
+    def __init__(self, recogniser, warmup_num=10, min_score=0.9, drop_score=0.75, detect_interval=25):
+        """
+        :param recogniser OcrRecogniser对象
+        :param warmup_num 预热阶段需要检测到字幕的帧数
+        :param min_score 行条带识别结果的最低置信度，低于该值时回退到完整检测
+        :param drop_score 参与学习行条带的文本框的最低置信度
+        :param detect_interval 每隔这么多帧免检测识别后做一次完整检测，0为不定期检测
+        """
+        self.recogniser = recogniser
+        self.warmup_num = warmup_num
+        self.min_score = min_score
+        self.drop_score = drop_score
+        self.detect_interval = detect_interval
+        # 上一次完整检测之后免检测识别的帧数
+        self.band_streak = 0
+        # 行条带[[ymin, ymax, xmin, xmax], ...]，按ymin排列
+        self.bands = []
+        # 预热阶段已检测到字幕的帧数
+        self.learned_num = 0
+        # 连续回退到完整检测的帧数
+        self.fallback_streak = 0
+        # 统计：完整检测次数与免检测识别次数
+        self.detect_count = 0
+        self.band_count = 0
+
+    @property
+    def ready(self):
+        return self.learned_num >= self.warmup_num and len(self.bands) > 0
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
+    def predict_batch(self, images):
+        """
+        批量识别，与OcrRecogniser.predict_batch的返回格式一致
+        """
+        results = [None] * len(images)
+        fallback = []
+        # 识别置信度低于min_score的帧，只有这些帧计入连续回退的帧数
+        low_score = []
+        if self.ready:
+            crops = []
+            for index, image in enumerate(images):
+                # 定期完整检测，发现行条带之外的字幕
+                if 0 < self.detect_interval <= self.band_streak:
+                    self.band_streak = 0
+                    fallback.append(index)
+                    continue
+                self.band_streak += 1
+                for band in self.bands:
+                    crop = self.__crop_band(image, band)
+                    if crop is None:
+                        break
+                    crops.append((index, band, crop))
+                else:
+                    continue
+                fallback.append(index)
+            crops = [crop for crop in crops if crop[0] not in fallback]
+            rec_res = []
+            if len(crops) > 0:
+                rec_res, _ = self.recogniser.recogniser.text_recognizer([crop[2][1] for crop in crops])
+            frame_results = {}
+            for (index, band, (top, crop)), (text, score) in zip(crops, rec_res):
+                dt_box, res = frame_results.setdefault(index, ([], []))
+                if len(text.strip()) == 0:
+                    continue
+                if score < self.min_score:
+                    low_score.append(index)
+                    continue
+                xmin, xmax, ymin, ymax = self.__text_extent(crop, top, band)
+                dt_box.append([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)])
+                res.append((text, score))
+            for index, (dt_box, _) in frame_results.items():
+                # 所有行条带都没有文字时，字幕可能出现在行条带之外，回退到完整检测
+                if len(dt_box) == 0:
+                    fallback.append(index)
+            fallback.extend(low_score)
+            for index, result in frame_results.items():
+                if index not in fallback:
+                    results[index] = result
+                    self.band_count += 1
+            for index in range(len(images)):
+                self.fallback_streak = self.fallback_streak + 1 if index in low_score else 0
+            # 连续回退过多说明字幕位置发生了变化，丢弃行条带重新预热
+            if self.fallback_streak >= self.warmup_num:
+                self.bands = []
+                self.learned_num = 0
+                self.fallback_streak = 0
+        else:
+            fallback = list(range(len(images)))
+        fallback = sorted(set(fallback))
+        if len(fallback) > 0:
+            detected = self.recogniser.predict_batch([images[index] for index in fallback])
+            for index, (dt_box, rec_res) in zip(fallback, detected):
+                results[index] = (dt_box, rec_res)
+                self.detect_count += 1
+                self.learn(dt_box, rec_res)
+            self.band_streak = 0
+        for index in range(len(images)):
+            if results[index] is None:
+                results[index] = ([], [])
+        return results
+
+    def learn(self, dt_box, rec_res):
+        """
+        用完整检测的结果学习行条带，纵向重叠超过一半的文本框归为同一行
+        """
+        coordinates = [c for c, (_, score) in zip(get_coordinates(dt_box), rec_res) if score > self.drop_score]
+        if len(coordinates) == 0:
+            return
+        for xmin, xmax, ymin, ymax in coordinates:
+            for band in self.bands:
+                overlap = min(band[1], ymax) - max(band[0], ymin)
+                if overlap > 0.5 * min(band[1] - band[0], ymax - ymin):
+                    band[0], band[1] = min(band[0], ymin), max(band[1], ymax)
+                    band[2], band[3] = min(band[2], xmin), max(band[3], xmax)
+                    break
+            else:
+                self.bands.append([ymin, ymax, xmin, xmax])
+        self.bands.sort(key=lambda b: b[0])
+        self.learned_num += 1
+
+    @staticmethod
+    def __crop_band(image, band):
+        """
+        裁剪行条带，纵向上下各留出10%的行高，横向使用整个宽度以容纳更长的字幕
+        :return (裁剪范围的ymin, 裁剪后的图片)，行条带过窄时返回None
+        """
+        height = band[1] - band[0]
+        padding = max(int(height * 0.1), 1)
+        ymin = max(band[0] - padding, 0)
+        ymax = min(band[1] + padding, image.shape[0])
+        if ymax - ymin < 2:
+            return None
+        return ymin, np.ascontiguousarray(image[ymin:ymax, :])
+
+    @staticmethod
+    def __text_extent(crop, top, band):
+        """
+        由行条带中的边缘估计文字的实际范围，横向上间隔不超过一个行高的边缘列视为同一行文字，
+        取与学习到的行条带横向重叠的部分，比学习时更宽或更窄的字幕都能得到实际的范围
+        :param top 裁剪范围的ymin
+        :return (xmin, xmax, ymin, ymax)，没有边缘时返回行条带的范围
+        """
+        ymin, ymax, xmin, xmax = band
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        edges = cv2.Canny(gray, 100, 200)
+        columns = np.flatnonzero(edges.any(axis=0))
+        if len(columns) == 0:
+            return xmin, xmax, ymin, ymax
+        breaks = np.flatnonzero(np.diff(columns) > max(ymax - ymin, 1))
+        starts = columns[np.r_[0, breaks + 1]]
+        ends = columns[np.r_[breaks, len(columns) - 1]]
+        selected = (starts <= xmax) & (ends >= xmin)
+        if not selected.any():
+            return xmin, xmax, ymin, ymax
+        text_xmin, text_xmax = int(starts[selected].min()), int(ends[selected].max())
+        rows = np.flatnonzero(edges[:, text_xmin:text_xmax + 1].any(axis=1))
+        return text_xmin, text_xmax, top + int(rows[0]), top + int(rows[-1])
@@ -1,13 +1,14 @@
+import copy
 import os
 from backend import config
-import importlib
-from paddleocr import PaddleOCR
 
 # 加载文本检测+识别模型
 class OcrRecogniser:
-    def __init__(self):
-        # 获取参数对象
-        importlib.reload(config)
+    def __init__(self, cpu_threads=None):
+        # CPU推理线程数，None为使用OCR_CPU_THREADS
+        if cpu_threads is None and config.OCR_CPU_THREADS > 0:
+            cpu_threads = config.OCR_CPU_THREADS
+        self.cpu_threads = cpu_threads
         self.recogniser = self.init_model()
 
     @staticmethod
@@ -21,6 +22,44 @@ class OcrRecogniser:
 
     def predict(self, image):
         detection_box, recognise_result, _ = self.recogniser(image, cls=False)
+        return self.rank_result(detection_box, recognise_result)
+
+    def predict_batch(self, images):
+        """
+        跨帧批量识别：逐帧检测文本框后，将所有帧中的文本行合并，按REC_BATCH_NUM整批送入识别模型
+        :param images 视频帧列表
+        :return [(dt_box, rec_res), ...] 与predict的返回格式一致
+        """
+        if len(images) == 1:
+            return [self.predict(images[0])]
+        from paddleocr.tools.infer.predict_system import sorted_boxes
+        from paddleocr.tools.infer.utility import get_rotate_crop_image
+        frame_boxes = []
+        img_crop_list = []
+        for image in images:
+            dt_boxes, _ = self.recogniser.text_detector(image)
+            if dt_boxes is None or len(dt_boxes) == 0:
+                frame_boxes.append([])
+                continue
+            dt_boxes = sorted_boxes(dt_boxes)
+            frame_boxes.append(dt_boxes)
+            for box in dt_boxes:
+                img_crop_list.append(get_rotate_crop_image(image, copy.deepcopy(box)))
+        rec_res = []
+        if len(img_crop_list) > 0:
+            rec_res, _ = self.recogniser.text_recognizer(img_crop_list)
+        results = []
+        start = 0
+        for dt_boxes in frame_boxes:
+            end = start + len(dt_boxes)
+            results.append(self.rank_result(dt_boxes, rec_res[start:end]))
+            start = end
+        return results
+
+    def rank_result(self, detection_box, recognise_result):
+        """
+        将检测框归一为水平矩形，并按行、从左到右排列识别结果
+        """
         if len(detection_box) > 0:
             coordinate_list = list()
             if isinstance(detection_box, list):
@@ -82,6 +121,11 @@ class OcrRecogniser:
             return detection_box, recognise_result
 
     def init_model(self):
+        # paddleocr会导入paddle，只在真正创建模型时导入
+        from paddleocr import PaddleOCR
+        extra_args = {}
+        if self.cpu_threads is not None:
+            extra_args['cpu_threads'] = self.cpu_threads
         return PaddleOCR(use_gpu=config.USE_GPU,
                          gpu_mem=500,
                          det_algorithm='DB',
@@ -101,7 +145,7 @@ class OcrRecogniser:
                          rec_image_shape=config.REC_IMAGE_SHAPE,
                          use_onnx=len(config.ONNX_PROVIDERS) > 0,
                          onnx_providers=config.ONNX_PROVIDERS,
-                         debug=False, show_log=False)
+                         debug=False, show_log=False, **extra_args)
     
 
     def convertToOnnxModelIfNeeded(self, model_dir, model_filename="inference.pdmodel", params_filename="inference.pdiparams", opset_version=14):
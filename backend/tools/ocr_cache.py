@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from backend.tools.frame_diff import crop_sub_area
+
+
+def dhash(image, hash_height=16, margin=4):
+    """
+    计算图片的差异哈希(dHash)
+    宽度按图片宽高比缩放，以保留横向排列的文字细节；相邻像素亮度差超过margin才记为1，避免平坦背景中的压缩噪声改变哈希
+    :param image 图片
+    :param hash_height 哈希的行数
+    :param margin 亮度差阈值
+    :return (行数, 列数, 哈希位)，相同尺寸的图片哈希值长度相同
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = image.shape[:2]
+    hash_width = min(max(int(hash_height * width / max(height, 1)), hash_height), 256)
+    image = cv2.resize(image, (hash_width + 1, hash_height), interpolation=cv2.INTER_AREA).astype(np.int16)
+    diff = image[:, 1:] - image[:, :-1] > margin
+    return image.shape[:2] + (np.packbits(diff).tobytes(),)
+
+
+class PerceptualHashCache:
+    """
+    以感知哈希为键的LRU缓存，同一行字幕在视频中会反复出现，命中时可以直接复用OCR识别结果
+    感知哈希只用于查找，不同的字幕可能有相同的哈希，命中后还要逐像素比较缩略图，确认是同一张图片才复用识别结果
+    """
+
+    def __init__(self, capacity=256, scale_width=640, pixel_tolerance=48):
+        """
+        :param capacity 最多缓存的条目数
+        :param scale_width 缩略图的宽度
+        :param pixel_tolerance 缩略图中允许的最大灰度差，超过的像素只要有一个就不是同一张图片
+        """
+        self.capacity = capacity
+        self.scale_width = scale_width
+        self.pixel_tolerance = pixel_tolerance
+        # {哈希: (缩略图, 缓存值)}
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image):
+        return dhash(image)
+
+    def thumbnail(self, image):
+        """
+        :return 用于逐像素比较的灰度缩略图
+        """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = image.shape[:2]
+        if width > self.scale_width:
+            scale_height = max(int(height * self.scale_width / width), 1)
+            return cv2.resize(image, (self.scale_width, scale_height), interpolation=cv2.INTER_AREA)
+        return image.copy()
+
+    def is_same(self, thumbnail, other):
+        if thumbnail.shape != other.shape:
+            return False
+        diff = cv2.absdiff(thumbnail, other)
+        return np.count_nonzero(diff > self.pixel_tolerance) == 0
+
+    def get(self, key, thumbnail):
+        """
+        查找缓存，命中时将条目移到最近使用的位置
+        :param thumbnail 待识别图片的缩略图，与缓存的缩略图不一致时视为没有命中
+        :return 缓存值，没有命中返回None
+        """
+        item = self.items.get(key)
+        if item is None or not self.is_same(item[0], thumbnail):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item[1]
+
+    def put(self, key, thumbnail, value):
+        self.items[key] = (thumbnail, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+
+class CachedRecogniser:
+    """
+    在OcrRecogniser.predict之前增加一层感知哈希缓存，字幕区域与缓存的图片一致时直接返回缓存的(dt_box, rec_res)
+    """
+
+    def __init__(self, recogniser, capacity=256, sub_area=None):
+        """
+        :param recogniser OcrRecogniser对象
+        :param capacity 缓存条目数，不大于0时不缓存
+        :param sub_area 计算哈希的字幕区域(ymin, ymax, xmin, xmax)，为None时不缓存，
+        整帧中一行字幕只占很小的面积，不同字幕的哈希几乎相同
+        """
+        self.recogniser = recogniser
+        self.sub_area = sub_area
+        self.cache = PerceptualHashCache(capacity) if capacity > 0 and sub_area is not None else None
+
+    def predict(self, image, roi=None):
+        """
+        :param image 送入OCR的图片
+        :param roi 用于计算哈希的区域图片，为None时从image中裁剪出sub_area
+        """
+        if self.cache is None:
+            return self.recogniser.predict(image)
+        if roi is None:
+            roi = crop_sub_area(image, self.sub_area)
+        key = self.cache.key(roi)
+        thumbnail = self.cache.thumbnail(roi)
+        result = self.cache.get(key, thumbnail)
+        if result is None:
+            result = self.recogniser.predict(image)
+            self.cache.put(key, thumbnail, result)
+        return result
+
+
+class PersistentOcrCache:
+    """
+    基于SQLite的本地OCR结果缓存，跨运行、跨视频共享，修改参数后重新提取同一视频时无需重新识别
+    键为送入OCR的图片(包括裁剪时四周的余量)逐像素内容与模型标识的SHA-1摘要，只有完全相同的图片才会命中，
+    值为(dt_box, rec_res)，dt_box坐标相对于该图片左上角
+    缓存文件超过容量时删除最久未使用的条目
+    """
+
+    def __init__(self, path, model_id, max_bytes, commit_interval=64):
+        """
+        :param path 缓存文件路径
+        :param model_id 检测与识别模型的标识，模型不同的识别结果互不复用
+        :param max_bytes 缓存内容的最大字节数
+        :param commit_interval 每写入多少条提交一次
+        """
+        self.model_id = model_id
+        self.max_bytes = max_bytes
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self.uncommitted = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 批量处理时多个进程同时读写同一个缓存文件
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS ocr_cache '
+                        '(key BLOB PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)')
+        self.db.commit()
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM ocr_cache').fetchone()[0]
+
+    def key(self, image):
+        """
+        :param image 送入OCR的图片
+        """
+        image = np.ascontiguousarray(image)
+        digest = hashlib.sha1(f'{self.model_id}|{image.shape}|{image.dtype}|'.encode('utf-8'))
+        digest.update(image.data)
+        return digest.digest()
+
+    def get(self, key):
+        """
+        :return (dt_box, rec_res)，没有命中返回None
+        """
+        row = self.db.execute('SELECT value FROM ocr_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute('UPDATE ocr_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.__written()
+        value = json.loads(row[0])
+        dt_box = [[tuple(point) for point in box] for box in value['dt_box']]
+        rec_res = [tuple(res) for res in value['rec_res']]
+        return dt_box, rec_res
+
+    def put(self, key, value):
+        dt_box, rec_res = value
+        value = json.dumps({'dt_box': [[[float(point[0]), float(point[1])] for point in box] for box in dt_box],
+                            'rec_res': [[str(res[0]), float(res[1])] for res in rec_res]}, ensure_ascii=False)
+        size = len(key) + len(value.encode('utf-8'))
+        old = self.db.execute('SELECT size FROM ocr_cache WHERE key = ?', (key,)).fetchone()
+        self.db.execute('INSERT OR REPLACE INTO ocr_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                        (key, value, size, time.time()))
+        self.total_bytes += size - (old[0] if old is not None else 0)
+        if self.total_bytes > self.max_bytes:
+            self.__evict()
+        self.__written()
+
+    def __evict(self):
+        """
+        删除最久未使用的条目，直到缓存内容不超过容量的90%
+        """
+        # 其他进程可能也写入了同一个缓存文件，以文件中的实际大小为准
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM ocr_cache').fetchone()[0]
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            rows = self.db.execute('SELECT key, size FROM ocr_cache ORDER BY last_used LIMIT 256').fetchall()
+            if len(rows) == 0:
+                break
+            evicted = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                evicted.append((key,))
+                self.total_bytes -= size
+            self.db.executemany('DELETE FROM ocr_cache WHERE key = ?', evicted)
+
+    def __written(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_interval:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
@@ -0,0 +1,166 @@
+import os
+import queue
+from collections import deque
+from multiprocessing import Queue, Process, cpu_count
+from backend.tools.ocr import OcrRecogniser
+from backend.tools.line_band import LineBandRecogniser
+
+
+def create_recogniser(cpu_threads=None, line_band=None, text_recogniser=None):
+    """
+    创建文本识别对象
+    :param line_band 免检测识别的参数，e.g. {'warmup_num': 10, 'min_score': 0.9, 'drop_score': 0.75}，为None时不开启
+    :param text_recogniser 已加载的OcrRecogniser，为None时新建
+    """
+    if text_recogniser is None:
+        text_recogniser = OcrRecogniser(cpu_threads=cpu_threads)
+    if line_band is not None:
+        text_recogniser = LineBandRecogniser(text_recogniser, **line_band)
+    return text_recogniser
+
+
+def ocr_worker(task_queue, result_queue, frame_ring, cpu_threads, batch_num=1, line_band=None):
+    """
+    OCR工作进程：每个进程持有一个独立的OcrRecogniser
+    队列中积压了多个任务时，一次最多取出batch_num帧进行跨帧批量识别
+    :param task_queue (key任务编号, frame视频帧, frame_slot共享内存槽位)，key为None表示结束
+    :param result_queue (key任务编号, dt_box检测框, rec_res识别结果)
+    """
+    text_recogniser = create_recogniser(cpu_threads, line_band)
+    running = True
+    while running:
+        tasks = [task_queue.get(block=True)]
+        while len(tasks) < batch_num and tasks[-1][0] is not None:
+            try:
+                tasks.append(task_queue.get_nowait())
+            except queue.Empty:
+                break
+        if tasks[-1][0] is None:
+            running = False
+            tasks.pop()
+        if len(tasks) == 0:
+            continue
+        for key, dt_box, rec_res in predict_tasks(text_recogniser, tasks, frame_ring):
+            result_queue.put((key, dt_box, rec_res))
+    if frame_ring is not None:
+        frame_ring.close()
+
+
+def predict_tasks(text_recogniser, tasks, frame_ring=None):
+    """
+    批量识别一组任务
+    :param tasks [(key任务编号, frame视频帧, frame_slot共享内存槽位)]
+    :return [(key任务编号, dt_box检测框, rec_res识别结果)]
+    """
+    keys = [task[0] for task in tasks]
+    try:
+        frames = [frame if frame is not None else frame_ring.read(frame_slot) for _, frame, frame_slot in tasks]
+        return [(key,) + tuple(result) for key, result in zip(keys, text_recogniser.predict_batch(frames))]
+    except Exception as e:
+        print(e)
+        return [(key, [], []) for key in keys]
+
+
+class OcrWorkerPool:
+    """
+    OCR识别进程池
+    worker_num不大于1时直接在当前进程中识别，否则开启worker_num个OCR进程并行识别，
+    调用方按编号提交任务，再按编号取回结果自行排序
+    batch_num大于1时最多将batch_num帧合并为一批进行跨帧批量识别
+    line_band不为None时每个识别对象独立学习字幕行条带，进行免检测识别
+    recogniser不为None时直接使用这个已加载的OcrRecogniser在当前进程中识别，不再开启OCR进程
+    cpu_threads为所有OCR进程共用的推理线程数，为None时使用全部CPU核心
+    """
+
+    def __init__(self, worker_num=1, frame_ring=None, batch_num=1, line_band=None, recogniser=None,
+                 cpu_threads=None):
+        self.worker_num = max(worker_num, 1) if recogniser is None else 1
+        self.batch_num = max(batch_num, 1)
+        self.frame_ring = frame_ring
+        # 已提交但还未取回结果的任务数
+        self.inflight = 0
+        self.workers = []
+        if self.worker_num == 1:
+            self.recogniser = create_recogniser(cpu_threads, line_band, recogniser)
+            # 当前进程中积攒的待识别任务
+            self.batch = []
+            self.results = deque()
+            return
+        self.recogniser = None
+        self.task_queue = Queue()
+        self.result_queue = Queue()
+        # 平分CPU核心，避免多个进程的推理线程互相抢占
+        cpu_threads = max((cpu_threads or cpu_count()) // self.worker_num, 1)
+        thread_env = {name: os.environ.get(name) for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS')}
+        for name in thread_env:
+            os.environ[name] = str(cpu_threads)
+        try:
+            for _ in range(self.worker_num):
+                p = Process(target=ocr_worker,
+                            args=(self.task_queue, self.result_queue, frame_ring, cpu_threads, self.batch_num,
+                                  line_band),
+                            daemon=True)
+                p.start()
+                self.workers.append(p)
+        finally:
+            for name, value in thread_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def submit(self, key, frame, frame_slot=None):
+        """
+        提交一个识别任务，视频帧位于共享内存中时只传递槽位号
+        """
+        self.inflight += 1
+        if self.recogniser is not None:
+            self.batch.append((key, frame, frame_slot))
+            if len(self.batch) >= self.batch_num:
+                self.__predict_batch()
+        elif frame_slot is not None and self.frame_ring is not None:
+            self.task_queue.put((key, None, frame_slot))
+        else:
+            self.task_queue.put((key, frame, None))
+
+    def fetch(self, block=False):
+        """
+        取回已完成的识别结果
+        :param block 是否等待至少一个结果，当前进程中识别时会立即识别积攒的任务
+        :return [(key任务编号, dt_box检测框, rec_res识别结果)]
+        """
+        results = []
+        if self.recogniser is not None:
+            if block and self.batch:
+                self.__predict_batch()
+            while self.results:
+                results.append(self.results.popleft())
+        else:
+            while block and self.inflight > 0 and not results:
+                try:
+                    results.append(self.result_queue.get(block=True, timeout=1))
+                except queue.Empty:
+                    # OCR进程全部异常退出时不再等待
+                    if not any(p.is_alive() for p in self.workers):
+                        raise RuntimeError('all OCR worker processes have exited')
+            try:
+                while True:
+                    results.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                pass
+        self.inflight -= len(results)
+        return results
+
+    def __predict_batch(self):
+        self.results.extend(predict_tasks(self.recogniser, self.batch, self.frame_ring))
+        self.batch = []
+
+    def close(self):
+        """
+        结束所有OCR进程
+        """
+        for _ in self.workers:
+            self.task_queue.put((None, None, None))
+        for p in self.workers:
+            p.join()
+        self.workers = []
@@ -0,0 +1,196 @@
+import atexit
+import queue
+import threading
+import traceback
+from multiprocessing import Queue, Process
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from backend import config
+from backend.tools.frame_buffer import SharedFrameRing
+
+
+def create_warmup_image(width=640, height=96):
+    """
+    生成一张带文字的预热图片，使检测与识别模型都完成一次推理
+    """
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(image, 'Subtitle 0123', (20, height * 2 // 3), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    return image
+
+
+def load_recogniser(settings):
+    """
+    按主进程的识别语言与识别模式加载OcrRecogniser并预热
+    :param settings 主进程中决定模型的配置项，e.g. {'REC_CHAR_TYPE': 'ch', 'MODE_TYPE': 'fast'}
+    """
+    from backend.tools.ocr import OcrRecogniser
+    config.reload_settings()
+    for name, value in settings.items():
+        setattr(config, name, value)
+    recogniser = OcrRecogniser()
+    # 第一次推理时推理引擎才会分配内存、选择算子，提前完成以免计入第一个视频
+    recogniser.predict(create_warmup_image())
+    return recogniser
+
+
+def ocr_service_worker(job_queue, done_queue, task_queue, progress_queue, span_queue, free_slots, settings):
+    """
+    常驻OCR服务进程：启动时加载模型并预热，之后依次执行提交的字幕识别任务，模型在任务之间保持加载
+    识别语言或识别模式变化时才重新加载模型
+    :param job_queue 任务描述队列，None表示结束
+    :param done_queue 任务完成队列，(job_id任务编号, error错误信息)
+    """
+    from backend.tools import subtitle_ocr
+    recogniser = load_recogniser(settings)
+    while True:
+        job = job_queue.get(block=True)
+        if job is None:
+            break
+        error = None
+        try:
+            if job['settings'] != settings:
+                settings = job['settings']
+                recogniser = load_recogniser(settings)
+            frame_ring = None
+            if job['frame_ring'] is not None:
+                frame_ring = SharedFrameRing.attach(job['frame_ring'], free_slots)
+            subtitle_ocr.subtitle_extract_handler(task_queue, progress_queue, job['video_path'],
+                                                  job['raw_subtitle_path'], job['sub_area'],
+                                                  SimpleNamespace(**job['options']), frame_ring, job['crop_box'],
+                                                  span_queue if job['use_span_queue'] else None, recogniser)
+        except Exception:
+            error = traceback.format_exc()
+        if job['use_span_queue']:
+            # 字幕段的结束标志由服务进程放入，保证在本任务的所有字幕段之后
+            span_queue.put(None)
+        done_queue.put((job['job_id'], error))
+        if error is not None:
+            # 出错的任务可能在共用的队列中留下未处理的数据，退出服务，下一个任务重新启动服务
+            break
+
+
+class OcrServiceJob:
+    """
+    提交到OCR服务的一个任务，join()等待任务完成，与OCR进程的用法一致
+    """
+
+    def __init__(self, service, job_id):
+        self.service = service
+        self.job_id = job_id
+        # 与Process.exitcode一致：任务完成为0，出错为1，服务进程退出时为-1，未完成为None
+        self.exitcode = None
+
+    def is_alive(self):
+        """
+        执行任务的服务进程是否还在运行
+        """
+        return self.service.is_alive()
+
+    def join(self):
+        try:
+            while True:
+                try:
+                    job_id, error = self.service.done_queue.get(block=True, timeout=1)
+                except queue.Empty:
+                    if not self.service.is_alive():
+                        self.exitcode = -1
+                        return
+                    continue
+                if job_id != self.job_id:
+                    continue
+                if error is not None:
+                    print(error)
+                self.exitcode = 0 if error is None else 1
+                return
+        finally:
+            self.service.lock.release()
+
+
+class OcrService:
+    """
+    常驻OCR服务：一个长期运行的OCR进程，通过管道队列接收字幕识别任务，在多个视频之间保持模型加载
+    任务、进度、字幕段队列以及共享内存的空闲槽位队列在启动服务时创建，由服务进程继承，所有任务共用，
+    因此同一时间只执行一个任务；服务进程中在同一进程内识别，不再开启多个OCR进程
+    """
+
+    def __init__(self, settings):
+        """
+        :param settings 决定模型的配置项，e.g. {'REC_CHAR_TYPE': 'ch', 'MODE_TYPE': 'fast'}
+        """
+        self.job_queue = Queue()
+        self.done_queue = Queue()
+        self.task_queue = Queue()
+        self.progress_queue = Queue()
+        self.span_queue = Queue()
+        self.free_slots = Queue()
+        self.lock = threading.Lock()
+        self.job_id = 0
+        self.process = Process(target=ocr_service_worker,
+                               args=(self.job_queue, self.done_queue, self.task_queue, self.progress_queue,
+                                     self.span_queue, self.free_slots, settings),
+                               daemon=True)
+        self.process.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def create_frame_ring(self, shape, slot_num):
+        """
+        创建使用服务空闲槽位队列的共享内存视频帧缓冲区
+        """
+        return SharedFrameRing(shape, slot_num, free_slots=self.free_slots)
+
+    def async_start(self, settings, video_path, raw_subtitle_path, sub_area, options, frame_ring=None, crop_box=None,
+                    use_span_queue=False):
+        """
+        提交一个字幕识别任务，参数与subtitle_ocr.async_start一致
+        :param settings 决定模型的配置项，与当前已加载的模型不同时服务进程会重新加载模型
+        :param frame_ring 由create_frame_ring创建的共享内存视频帧缓冲区
+        :param use_span_queue 是否边识别边去重，字幕段放入span_queue，任务结束时放入结束标志None
+        :return (job任务, task_queue任务队列, progress_queue进度队列)
+        """
+        from backend.tools import subtitle_ocr
+        subtitle_ocr.check_options(options)
+        # 等待上一个任务完成
+        self.lock.acquire()
+        self.job_id += 1
+        self.job_queue.put({'job_id': self.job_id, 'settings': settings, 'video_path': video_path,
+                            'raw_subtitle_path': raw_subtitle_path, 'sub_area': sub_area, 'options': dict(options),
+                            'frame_ring': frame_ring.describe() if frame_ring is not None else None,
+                            'crop_box': crop_box, 'use_span_queue': use_span_queue})
+        return OcrServiceJob(self, self.job_id), self.task_queue, self.progress_queue
+
+    def close(self):
+        """
+        结束服务进程
+        """
+        if self.process.is_alive():
+            self.job_queue.put(None)
+            self.process.join()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service(settings):
+    """
+    获取当前进程的OCR服务，第一次调用或服务进程已退出时启动
+    """
+    global _service
+    with _service_lock:
+        if _service is None or not _service.is_alive():
+            if _service is None:
+                atexit.register(shutdown_service)
+            _service = OcrService(settings)
+        return _service
+
+
+def shutdown_service():
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.close()
+            _service = None
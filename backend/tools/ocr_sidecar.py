@@ -0,0 +1,72 @@
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+from backend.tools.coordinates import overflow_area_rates
+from backend.tools.result_store import OcrResultStore
+
+# OCR结果文件的格式版本，格式不兼容的修改需要递增，读取时版本不一致直接报错
+SIDECAR_VERSION = 1
+# OCR结果文件与视频同名，保存在视频旁边，不会被清理缓存时删除
+SIDECAR_SUFFIX = '.ocr.npz'
+
+# boxes所有文本框OcrResultStore, box_pts每个文本框所在帧的显示时间戳(毫秒，无法获取时为nan),
+# frame_pts提取视频帧时记录的时间戳{从0开始的帧序号: 毫秒}, meta视频信息与识别参数
+OcrSidecar = namedtuple('OcrSidecar', 'boxes box_pts frame_pts meta')
+
+
+def get_sidecar_path(video_path):
+    """
+    根据视频路径获取OCR结果文件的路径, e.g. video/test.mp4 -> video/test.ocr.npz
+    """
+    return os.path.splitext(video_path)[0] + SIDECAR_SUFFIX
+
+
+def save_sidecar(path, boxes, box_pts, frame_pts, meta):
+    """
+    保存OCR结果文件，先写入临时文件再替换，中途失败不会留下不完整的文件
+    :param boxes 所有文本框，包括按DROP_SCORE与字幕区域筛选掉的文本框
+    :param box_pts 每个文本框所在帧的显示时间戳(毫秒)
+    :param frame_pts {从0开始的帧序号: 毫秒}
+    :param meta 可以JSON序列化的视频信息与识别参数
+    """
+    pts_index = sorted(frame_pts)
+    temp_path = path + '.tmp'
+    with open(temp_path, mode='wb') as f:
+        np.savez_compressed(f, version=np.int64(SIDECAR_VERSION),
+                            meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                            frame_no=boxes.frame_no, xmin=boxes.xmin, xmax=boxes.xmax, ymin=boxes.ymin,
+                            ymax=boxes.ymax, score=boxes.score, text=boxes.text,
+                            pts=np.asarray(box_pts, dtype=np.float64),
+                            pts_index=np.asarray(pts_index, dtype=np.int64),
+                            pts_ms=np.asarray([frame_pts[i] for i in pts_index], dtype=np.float64))
+    os.replace(temp_path, path)
+
+
+def load_sidecar(path):
+    """
+    读取OCR结果文件
+    :return OcrSidecar
+    """
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data['version'])
+        if version != SIDECAR_VERSION:
+            raise ValueError(f'unsupported OCR sidecar version {version} in {path}, expected {SIDECAR_VERSION}')
+        boxes = OcrResultStore(frame_no=data['frame_no'], xmin=data['xmin'], xmax=data['xmax'], ymin=data['ymin'],
+                               ymax=data['ymax'], score=data['score'], text=data['text'])
+        frame_pts = dict(zip(data['pts_index'].tolist(), data['pts_ms'].tolist()))
+        return OcrSidecar(boxes, data['pts'], frame_pts, json.loads(str(data['meta'])))
+
+
+def select_boxes(boxes, sub_area, drop_score, deviation_rate):
+    """
+    按字幕区域与置信度筛选文本框，条件与subtitle_ocr.extract_subtitles一致
+    :param boxes OcrResultStore
+    :param sub_area 字幕区域(ymin, ymax, xmin, xmax)，为None时保留所有文本框
+    :return 保留的文本框的掩码
+    """
+    if sub_area is None:
+        return np.ones(len(boxes), dtype=bool)
+    intersects, rates = overflow_area_rates(sub_area, boxes.coordinates)
+    return intersects & (rates <= deviation_rate) & (boxes.score > drop_score)
@@ -6,147 +6,274 @@
 @desc  : 将连起来的英文单词切分
 """
 import json
+import multiprocessing
 import os
 import sys
+import threading
+from functools import lru_cache
 
 import pysrt
 import wordsegment as ws
 import re
 
+VERB_FORMS = ["I'm", "you're", "he's", "she's", "we're", "it's", "isn't", "aren't", "they're", "there's", "wasn't",
+              "weren't", "I've", "you've", "we've", "they've", "hasn't", "haven't", "I'd", "you'd", "he'd", "she'd",
+              "it'd", "we'd", "they'd", "doesn't", "don't", "didn't", "I'll", "you'll", "he'll", "she'll", "we'll",
+              "they'll", "there'll", "there'd", "can't", "couldn't", "daren't", "hadn't", "mightn't", "mustn't",
+              "needn't", "oughtn't", "shan't", "shouldn't", "usedn't", "won't", "wouldn't", "that's", "what's", "it'll"]
+VERB_FORM_MAP = {verb.replace("'", "").lower(): verb for verb in VERB_FORMS}
+TYPO_MAP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'configs', 'typoMap.json')
 
-def execute(path, lang='en'):
-    # fix "RecursionError: maximum recursion depth exceeded in comparison" in wordsegment.segment call
-    if sys.getrecursionlimit() < 100000:
-        sys.setrecursionlimit(100000)
+# 预编译的清理规则
+RE_LINE_BREAK_I = re.compile("(\ni)([^\\s])", re.I)
+RE_SPACES_BEFORE_CHINESE = re.compile(' +([\\u4e00-\\u9fa5])')
+RE_SPACE_BEFORE_CAPITAL = re.compile("([^\\sA-Z\\-])([A-Z])")
+RE_SPACES_BEFORE_PUNCTUATION = re.compile(" *([\\.\\?\\!\\,])")
+RE_SPACES_AROUND_QUOTE = re.compile(" *([\\']) *")
+RE_SPACES_AFTER_LINE_BREAK = re.compile('\n\\s*')
+RE_LEADING_SPACES = re.compile('^\\s*')
+RE_SPACE_BEFORE_HYPHEN = re.compile("([A-Za-z0-9]) (\\-[A-Za-z0-9])")
+RE_SPACE_BEFORE_PERCENT = re.compile("([A-Za-z0-9]) %")
+RE_TRAILING_MIDDLE_DOT = re.compile('·$')
+RE_DOCTOR = re.compile(r'\bDr\. *\b')
+RE_CHINESE_QUOTES = re.compile(r'[“”]')
+RE_CHINESE_COMMA = re.compile(r'，')
+RE_SPACE_AFTER_PUNCTUATION = re.compile('([\\.,\\!\\?])([A-Za-z0-9\\u4e00-\\u9fa5])')
+# 错别字规则中的正则语法字符，不含这些字符的规则按纯文本匹配
+RE_REGEX_SYNTAX = re.compile(r'[\\.^$*+?{}\[\]|()]')
 
-    wordsegment = ws.Segmenter()
-    wordsegment.load()
-    subs = pysrt.open(path)
-    verb_forms = ["I'm", "you're", "he's", "she's", "we're", "it's", "isn't", "aren't", "they're", "there's", "wasn't",
-                  "weren't", "I've", "you've", "we've", "they've", "hasn't", "haven't", "I'd", "you'd", "he'd", "she'd",
-                  "it'd", "we'd", "they'd", "doesn't", "don't", "didn't", "I'll", "you'll", "he'll", "she'll", "we'll",
-                  "they'll", "there'll", "there'd", "can't", "couldn't", "daren't", "hadn't", "mightn't", "mustn't",
-                  "needn't", "oughtn't", "shan't", "shouldn't", "usedn't", "won't", "wouldn't", "that's", "what's", "it'll"]
-    verb_form_map = {}
-
-    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'configs', 'typoMap.json'), 'r', encoding='utf-8') as load_f:
-        typo_map = json.load(load_f)
-
-    for verb in verb_forms:
-        verb_form_map[verb.replace("'", "").lower()] = verb
-
-    def format_seg_list(seg_list):
-        new_seg = []
-        for seg in seg_list:
-            if seg in verb_form_map:
-                new_seg.append([seg, verb_form_map[seg]])
-            else:
-                new_seg.append([seg])
-        return new_seg
-
-    def typo_fix(text):
+_lock = threading.Lock()
+_segmenter = None
+_typo_fixer = None
+
+
+class TypoFixer:
+    """
+    按typoMap.json中的顺序执行错别字规则，含正则语法的规则与原先一样逐条在整段文本上re.sub(忽略大小写)
+    连续的纯文本规则编译为一个忽略大小写的多选正则，一次扫描完成替换：同一位置有多条规则匹配时以靠前的规则为准，
+    同一组中的规则只作用于原文本，一次替换的结果不会再被组内的其他规则替换(不会连锁替换)
+    """
+
+    def __init__(self, typo_map):
+        # 依次执行的替换步骤[(正则, 替换文本或替换函数)]
+        self.steps = []
+        literals = []
         for k, v in typo_map.items():
-            text = re.sub(re.compile(k, re.I), v, text)
+            if RE_REGEX_SYNTAX.search(k) is None:
+                literals.append((k, v))
+                continue
+            self._add_literals(literals)
+            literals = []
+            self.steps.append((re.compile(k, re.I), v))
+        self._add_literals(literals)
+
+    def _add_literals(self, literals):
+        """
+        将连续的纯文本规则合并为一个替换步骤
+        """
+        if len(literals) == 1:
+            self.steps.append((re.compile(literals[0][0], re.I), literals[0][1]))
+        elif len(literals) > 1:
+            replacements = [v for _, v in literals]
+            regex = re.compile('|'.join(f'(?P<t{i}>{k})' for i, (k, _) in enumerate(literals)), re.I)
+            # 替换文本中的转义字符与\g<0>按原先re.sub的方式展开
+            self.steps.append((regex, lambda match: match.expand(replacements[int(match.lastgroup[1:])])))
+
+    def fix(self, text):
+        for regex, replacement in self.steps:
+            text = regex.sub(replacement, text)
         return text
 
-    # 逆向过滤seg
-    def remove_invalid_segment(seg, text):
-        seg_len = len(seg)
-        span = None
-        new_seg = []
-        for i in range(seg_len - 1, -1, -1):
-            s = seg[i]
-            if len(s) > 1:
-                regex = re.compile(f"({s[0]}|{s[1]})", re.I)
-            else:
-                regex = re.compile(f"({s[0]})", re.I)
-            try:
-                ss = [(i) for i in re.finditer(regex, text)][-1]
-            except IndexError:
-                ss = None
-            if ss is None:
-                continue
-            text = text[:ss.span()[0]]
-            if span is None:
-                span = ss.span()
-                new_seg.append(s)
-                continue
-            if span > ss.span():
-                new_seg.append(s)
-                span = ss.span()
-        return list(reversed(new_seg))
-
-    for sub in subs:
-        sub.text = typo_fix(sub.text)
-        seg = wordsegment.segment(sub.text)
-        if len(seg) == 1:
-            seg = wordsegment.segment(re.sub(re.compile(f"(\ni)([^\\s])", re.I), "\\1 \\2", sub.text))
-        seg = format_seg_list(seg)
-
-        # 替换中文前的多个空格成单个空格, 避免中英文分行出错
-        sub.text = re.sub(' +([\\u4e00-\\u9fa5])', ' \\1', sub.text)
-        # 中英文分行
-        if lang in ["ch", "ch_tra"]:
-            sub.text = sub.text.replace("  ", "\n")
-        lines = []
-        remain = sub.text
-        seg = remove_invalid_segment(seg, sub.text)
-        seg_len = len(seg)
-        for i in range(0, seg_len):
-            s = seg[i]
-            global regex
-            if len(s) > 1:
-                regex = re.compile(f"(.*?)({s[0]}|{s[1]})", re.I)
-            else:
-                regex = re.compile(f"(.*?)({s[0]})", re.I)
-            ss = re.search(regex, remain)
-            if ss is None:
-                if i == seg_len - 1:
-                    lines.append(remain.strip())
-                continue
 
-            lines.append(remain[:ss.span()[1]].strip())
-            remain = remain[ss.span()[1]:].strip()
-            if i == seg_len - 1:
-                lines.append(remain)
-        if seg_len > 0:
-            ss = " ".join(lines)
+def get_typo_fixer():
+    """
+    进程内只加载一次typoMap.json
+    """
+    global _typo_fixer
+    with _lock:
+        if _typo_fixer is None:
+            with open(TYPO_MAP_PATH, 'r', encoding='utf-8') as load_f:
+                _typo_fixer = TypoFixer(json.load(load_f))
+    return _typo_fixer
+
+
+def get_segmenter():
+    """
+    进程内只加载一次分词器的unigram/bigram词表
+    """
+    global _segmenter
+    with _lock:
+        if _segmenter is None:
+            segmenter = ws.Segmenter()
+            segmenter.load()
+            _segmenter = segmenter
+    return _segmenter
+
+
+@lru_cache(maxsize=65536)
+def segment(text):
+    """
+    分词，相同的文本只分词一次
+    """
+    return tuple(get_segmenter().segment(text))
+
+
+@lru_cache(maxsize=65536)
+def _word_regex(words, prefix=''):
+    """
+    匹配分词结果中某个单词(及其缩写形式)的正则
+    """
+    return re.compile(f"{prefix}({'|'.join(words)})", re.I)
+
+
+def format_seg_list(seg_list):
+    new_seg = []
+    for seg in seg_list:
+        if seg in VERB_FORM_MAP:
+            new_seg.append((seg, VERB_FORM_MAP[seg]))
         else:
-            ss = remain
-        # again
-        ss = typo_fix(ss)
-        # 非大写字母的大写字母前加空格
-        ss = re.sub("([^\\sA-Z\\-])([A-Z])", "\\1 \\2", ss)
-        # 删除重复空格
-        ss = ss.replace("  ", " ")
-        ss = ss.replace("。", ".")
-        # 删除,?!,前的多个空格
-        ss = re.sub(" *([\\.\\?\\!\\,])", "\\1", ss)
-        # 删除'的前后多个空格
-        ss = re.sub(" *([\\']) *", "\\1", ss)
-        # 删除换行后的多个空格, 通常时第二行的开始的多个空格
-        ss = re.sub('\n\\s*', '\n', ss)
-        # 删除开始的多个空格
-        ss = re.sub('^\\s*', '', ss)
-        # 删除-左侧空格
-        ss = re.sub("([A-Za-z0-9]) (\\-[A-Za-z0-9])", '\\1\\2', ss)
-        # 删除%左侧空格
-        ss = re.sub("([A-Za-z0-9]) %", '\\1%', ss)
-        # 结尾·改成.
-        ss = re.sub('·$', '.', ss)
-        # 移除Dr.后的空格
-        ss = re.sub(r'\bDr\. *\b', "Dr.", ss)
-        # 中文引号转英文
-        ss = re.sub(r'[“”]', "\"", ss)
-        # 中文逗号转英文
-        ss = re.sub(r'，', ",", ss)
-        # .,?后面加空格
-        ss = re.sub('([\\.,\\!\\?])([A-Za-z0-9\\u4e00-\\u9fa5])', '\\1 \\2', ss)
-        ss = ss.replace("\n\n", "\n")
-        sub.text = ss.strip()
+            new_seg.append((seg,))
+    return new_seg
+
+
+# 逆向过滤seg
+def remove_invalid_segment(seg, text):
+    seg_len = len(seg)
+    span = None
+    new_seg = []
+    for i in range(seg_len - 1, -1, -1):
+        s = seg[i]
+        regex = _word_regex(s)
+        try:
+            ss = [(i) for i in re.finditer(regex, text)][-1]
+        except IndexError:
+            ss = None
+        if ss is None:
+            continue
+        text = text[:ss.span()[0]]
+        if span is None:
+            span = ss.span()
+            new_seg.append(s)
+            continue
+        if span > ss.span():
+            new_seg.append(s)
+            span = ss.span()
+    return list(reversed(new_seg))
+
+
+def execute(path, lang='en', worker_num=1, min_lines_per_worker=200):
+    """
+    对srt文件中的每一条字幕重新分词并写回原文件
+    :param worker_num 并行处理的进程数，每条字幕互相独立，分块并行处理后按原顺序合并，输出与单进程完全一致
+    :param min_lines_per_worker 每个进程至少处理的字幕条数，字幕较少时减少进程数或直接在当前进程中处理
+    """
+    subs = pysrt.open(path)
+    texts = [sub.text for sub in subs]
+    worker_num = min(worker_num, len(texts) // max(min_lines_per_worker, 1))
+    if worker_num > 1:
+        # 按顺序切分为worker_num * 4块，各进程处理速度不一致时可以继续领取剩余的块
+        chunk_size = -(-len(texts) // (worker_num * 4))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        with multiprocessing.Pool(worker_num, initializer=init_worker) as pool:
+            texts = [text for chunk in pool.starmap(reformat_texts, [(chunk, lang) for chunk in chunks])
+                     for text in chunk]
+    else:
+        texts = reformat_texts(texts, lang)
+    for sub, text in zip(subs, texts):
+        sub.text = text
     subs.save(path, encoding='utf-8')
 
 
+def init_worker():
+    """
+    并行分词进程的初始化，预先加载分词词表与错别字表
+    """
+    get_segmenter()
+    get_typo_fixer()
+
+
+def reformat_texts(texts, lang='en'):
+    """
+    依次修正一组字幕文本的错别字并重新分词
+    :return 处理后的字幕文本列表，顺序与texts一致
+    """
+    # fix "RecursionError: maximum recursion depth exceeded in comparison" in wordsegment.segment call
+    if sys.getrecursionlimit() < 100000:
+        sys.setrecursionlimit(100000)
+    typo_fix = get_typo_fixer().fix
+    return [reformat_text(typo_fix(text), lang, typo_fix) for text in texts]
+
+
+def reformat_text(text, lang='en', typo_fix=None):
+    """
+    切分一条已经修正过错别字的字幕文本中连起来的英文单词，并清理空格与标点
+    """
+    if typo_fix is None:
+        typo_fix = get_typo_fixer().fix
+    seg = segment(text)
+    if len(seg) == 1:
+        seg = segment(RE_LINE_BREAK_I.sub("\\1 \\2", text))
+    seg = format_seg_list(seg)
+
+    # 替换中文前的多个空格成单个空格, 避免中英文分行出错
+    text = RE_SPACES_BEFORE_CHINESE.sub(' \\1', text)
+    # 中英文分行
+    if lang in ["ch", "ch_tra"]:
+        text = text.replace("  ", "\n")
+    lines = []
+    remain = text
+    seg = remove_invalid_segment(seg, text)
+    seg_len = len(seg)
+    for i in range(0, seg_len):
+        s = seg[i]
+        regex = _word_regex(s, "(.*?)")
+        ss = re.search(regex, remain)
+        if ss is None:
+            if i == seg_len - 1:
+                lines.append(remain.strip())
+            continue
+
+        lines.append(remain[:ss.span()[1]].strip())
+        remain = remain[ss.span()[1]:].strip()
+        if i == seg_len - 1:
+            lines.append(remain)
+    if seg_len > 0:
+        ss = " ".join(lines)
+    else:
+        ss = remain
+    # again
+    ss = typo_fix(ss)
+    # 非大写字母的大写字母前加空格
+    ss = RE_SPACE_BEFORE_CAPITAL.sub("\\1 \\2", ss)
+    # 删除重复空格
+    ss = ss.replace("  ", " ")
+    ss = ss.replace("。", ".")
+    # 删除,?!,前的多个空格
+    ss = RE_SPACES_BEFORE_PUNCTUATION.sub("\\1", ss)
+    # 删除'的前后多个空格
+    ss = RE_SPACES_AROUND_QUOTE.sub("\\1", ss)
+    # 删除换行后的多个空格, 通常时第二行的开始的多个空格
+    ss = RE_SPACES_AFTER_LINE_BREAK.sub('\n', ss)
+    # 删除开始的多个空格
+    ss = RE_LEADING_SPACES.sub('', ss)
+    # 删除-左侧空格
+    ss = RE_SPACE_BEFORE_HYPHEN.sub('\\1\\2', ss)
+    # 删除%左侧空格
+    ss = RE_SPACE_BEFORE_PERCENT.sub('\\1%', ss)
+    # 结尾·改成.
+    ss = RE_TRAILING_MIDDLE_DOT.sub('.', ss)
+    # 移除Dr.后的空格
+    ss = RE_DOCTOR.sub("Dr.", ss)
+    # 中文引号转英文
+    ss = RE_CHINESE_QUOTES.sub("\"", ss)
+    # 中文逗号转英文
+    ss = RE_CHINESE_COMMA.sub(",", ss)
+    # .,?后面加空格
+    ss = RE_SPACE_AFTER_PUNCTUATION.sub('\\1 \\2', ss)
+    ss = ss.replace("\n\n", "\n")
+    return ss.strip()
+
+
 if __name__ == '__main__':
     path = "/home/yao/Videos/null.srt"
     execute(path)
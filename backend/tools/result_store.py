@@ -0,0 +1,236 @@
+import os
+
+import numpy as np
+
+
+def get_store_path(raw_subtitle_path):
+    """
+    根据原始字幕文件路径获取识别结果存储文件的路径, e.g. subtitle/raw.txt -> subtitle/raw.npz
+    """
+    return os.path.splitext(raw_subtitle_path)[0] + '.npz'
+
+
+def get_box_store_path(raw_subtitle_path):
+    """
+    根据原始字幕文件路径获取所有文本框(包括被筛选掉的文本框)存储文件的路径, e.g. subtitle/raw.txt -> subtitle/raw_boxes.npz
+    """
+    return os.path.splitext(raw_subtitle_path)[0] + '_boxes.npz'
+
+
+class FrameGrouper:
+    """
+    按帧号合并文本行的流式分组器：识别结果按帧号顺序输出，连续的同一帧号的多行文本合并为一行
+    多行文本之间以两个空格分隔(与原先合并raw.txt时一致)，reformat中中英文分行依赖两个空格
+    每行只处理一次，既可以用于已存储的识别结果，也可以直接接在OCR输出之后
+    """
+
+    def __init__(self, normalize=None):
+        """
+        :param normalize 合并后对文本进行的处理，e.g. NFKC规范化
+        """
+        self.normalize = normalize
+        # 当前帧的第一行(frame_no, coordinate, score)与该帧的所有文本
+        self.head = None
+        self.texts = []
+
+    def push(self, frame_no, coordinate, text, score=None):
+        """
+        输入一行识别结果
+        :return 帧号变化时返回上一帧合并后的(frame_no, coordinate, text, score)，否则返回None
+        """
+        grouped = None
+        if self.head is not None and self.head[0] != frame_no:
+            grouped = self.flush()
+        if self.head is None:
+            self.head = (frame_no, coordinate, score)
+        self.texts.append(text)
+        return grouped
+
+    def flush(self):
+        """
+        输出当前帧合并后的结果
+        :return (frame_no, coordinate, text, score)，没有缓存的行时返回None
+        """
+        if self.head is None:
+            return None
+        text = self.texts[0]
+        if len(self.texts) > 1:
+            # 与原先合并raw.txt中的行一致: 每行带换行符以空格连接后将换行符替换为空格，e.g. ['a', 'b'] -> 'a  b '
+            text = ' '.join(t + '\n' for t in self.texts).replace('\n', ' ')
+        if self.normalize is not None:
+            text = self.normalize(text)
+        frame_no, coordinate, score = self.head
+        self.head = None
+        self.texts = []
+        return frame_no, coordinate, text, score
+
+
+def group_by_frame(rows, normalize=None):
+    """
+    按帧号合并连续的文本行
+    :param rows 可迭代的(frame_no, coordinate, text, score)
+    :return 生成器，每帧输出一个合并后的(frame_no, coordinate, text, score)
+    """
+    grouper = FrameGrouper(normalize)
+    for frame_no, coordinate, text, score in rows:
+        grouped = grouper.push(frame_no, coordinate, text, score)
+        if grouped is not None:
+            yield grouped
+    grouped = grouper.flush()
+    if grouped is not None:
+        yield grouped
+
+
+class OcrResultStore:
+    """
+    按列存储的OCR识别结果，每一行为一个文本框: (frame_no帧号, xmin, xmax, ymin, ymax, score置信度, text文本)
+    OCR阶段逐行追加，后处理阶段以布尔掩码整列过滤，不再反复读写并解析raw.txt
+    置信度按float64存储，按DROP_SCORE重新筛选时与识别时的比较结果一致
+    """
+    def __init__(self, frame_no=None, xmin=None, xmax=None, ymin=None, ymax=None, score=None, text=None):
+        self.frame_no = np.asarray(frame_no if frame_no is not None else [], dtype=np.int64)
+        self.xmin = np.asarray(xmin if xmin is not None else [], dtype=np.int32)
+        self.xmax = np.asarray(xmax if xmax is not None else [], dtype=np.int32)
+        self.ymin = np.asarray(ymin if ymin is not None else [], dtype=np.int32)
+        self.ymax = np.asarray(ymax if ymax is not None else [], dtype=np.int32)
+        self.score = np.asarray(score if score is not None else [], dtype=np.float64)
+        self.text = np.asarray(text if text is not None else [], dtype=str)
+        # 追加中还未合并进列的行
+        self.pending_rows = []
+
+    def __len__(self):
+        self.__merge_rows()
+        return len(self.frame_no)
+
+    def append(self, frame_no, coordinate, text, score):
+        """
+        追加一个文本框
+        :param coordinate (xmin, xmax, ymin, ymax)
+        """
+        self.pending_rows.append((frame_no,) + tuple(coordinate) + (score, text))
+
+    def __merge_rows(self):
+        if len(self.pending_rows) == 0:
+            return
+        frame_no, xmin, xmax, ymin, ymax, score, text = zip(*self.pending_rows)
+        self.pending_rows = []
+        self.frame_no = np.concatenate([self.frame_no, np.asarray(frame_no, dtype=np.int64)])
+        self.xmin = np.concatenate([self.xmin, np.asarray(xmin, dtype=np.int32)])
+        self.xmax = np.concatenate([self.xmax, np.asarray(xmax, dtype=np.int32)])
+        self.ymin = np.concatenate([self.ymin, np.asarray(ymin, dtype=np.int32)])
+        self.ymax = np.concatenate([self.ymax, np.asarray(ymax, dtype=np.int32)])
+        self.score = np.concatenate([self.score, np.asarray(score, dtype=np.float64)])
+        self.text = np.concatenate([self.text.astype(object), np.asarray(text, dtype=object)]).astype(str)
+
+    @property
+    def coordinates(self):
+        """
+        :return shape为(n, 4)的坐标数组，每行为(xmin, xmax, ymin, ymax)
+        """
+        self.__merge_rows()
+        return np.stack([self.xmin, self.xmax, self.ymin, self.ymax], axis=1)
+
+    def set_coordinates(self, coordinates):
+        """
+        整列替换坐标
+        :param coordinates shape为(n, 4)的坐标数组或坐标列表
+        """
+        self.__merge_rows()
+        coordinates = np.asarray(coordinates, dtype=np.int32).reshape(-1, 4)
+        self.xmin, self.xmax, self.ymin, self.ymax = [coordinates[:, i].copy() for i in range(4)]
+
+    def coordinate_mask(self, coordinate):
+        """
+        :return 坐标与coordinate完全相同的行的掩码
+        """
+        self.__merge_rows()
+        xmin, xmax, ymin, ymax = coordinate
+        return (self.xmin == xmin) & (self.xmax == xmax) & (self.ymin == ymin) & (self.ymax == ymax)
+
+    def keep(self, mask):
+        """
+        只保留掩码为True的行，mask也可以是行号数组
+        """
+        self.__merge_rows()
+        self.frame_no = self.frame_no[mask]
+        self.xmin = self.xmin[mask]
+        self.xmax = self.xmax[mask]
+        self.ymin = self.ymin[mask]
+        self.ymax = self.ymax[mask]
+        self.score = self.score[mask]
+        self.text = self.text[mask]
+
+    def copy(self, mask=None):
+        """
+        :param mask 只复制掩码为True的行，为None时复制所有行
+        :return 新的OcrResultStore
+        """
+        self.__merge_rows()
+        if mask is None:
+            mask = np.ones(len(self.frame_no), dtype=bool)
+        return OcrResultStore(self.frame_no[mask], self.xmin[mask], self.xmax[mask], self.ymin[mask],
+                              self.ymax[mask], self.score[mask], self.text[mask])
+
+    @staticmethod
+    def most_common(values, n=None):
+        """
+        统计出现次数最多的值，与collections.Counter.most_common的顺序一致：次数相同时先出现的排在前面
+        :param values shape为(n,)或(n, k)的数组
+        :return [(value, count), ...]，value为int或int元组
+        """
+        values = np.asarray(values)
+        if len(values) == 0:
+            return []
+        unique, first, counts = np.unique(values, axis=0, return_index=True, return_counts=True)
+        order = np.lexsort((first, -counts))
+        if n is not None:
+            order = order[:n]
+        if values.ndim == 1:
+            return [(unique[i].item(), int(counts[i])) for i in order]
+        return [(tuple(int(v) for v in unique[i]), int(counts[i])) for i in order]
+
+    def rows(self):
+        """
+        :return 生成器，按顺序输出每一行(frame_no, coordinate, text, score)
+        """
+        self.__merge_rows()
+        for frame_no, xmin, xmax, ymin, ymax, text, score in zip(self.frame_no.tolist(), self.xmin.tolist(),
+                                                                 self.xmax.tolist(), self.ymin.tolist(),
+                                                                 self.ymax.tolist(), self.text.tolist(),
+                                                                 self.score.tolist()):
+            yield frame_no, (xmin, xmax, ymin, ymax), text, score
+
+    def concat_same_frame(self, normalize=None):
+        """
+        将帧号相同的连续多行文本合并到该帧的第一行中，以空格连接，识别结果按帧号顺序存储，只需一次遍历
+        :param normalize 合并后对每行文本进行的处理，e.g. NFKC规范化
+        """
+        grouped = list(group_by_frame(self.rows(), normalize))
+        if len(grouped) == 0:
+            return
+        frame_no, coordinates, text, score = zip(*grouped)
+        self.frame_no = np.asarray(frame_no, dtype=np.int64)
+        self.set_coordinates(coordinates)
+        self.text = np.asarray(text, dtype=str)
+        self.score = np.asarray(score, dtype=np.float64)
+
+    def save(self, path):
+        self.__merge_rows()
+        np.savez(path, frame_no=self.frame_no, xmin=self.xmin, xmax=self.xmax, ymin=self.ymin, ymax=self.ymax,
+                 score=self.score, text=self.text)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def dump_raw_txt(self, path):
+        """
+        以raw.txt的格式输出，用于调试
+        """
+        self.__merge_rows()
+        with open(path, mode='w', encoding='utf-8') as f:
+            for frame_no, xmin, xmax, ymin, ymax, text in zip(self.frame_no.tolist(), self.xmin.tolist(),
+                                                              self.xmax.tolist(), self.ymin.tolist(),
+                                                              self.ymax.tolist(), self.text.tolist()):
+                f.write(f'{str(frame_no).zfill(8)}\t{(xmin, xmax, ymin, ymax)}\t{text}\n')
@@ -0,0 +1,92 @@
+from Levenshtein import ratio
+from backend.tools.result_store import FrameGrouper
+
+
+class SubtitleDeduplicator:
+    """
+    字幕去重状态机：按帧号顺序输入每帧的字幕文本，与当前字幕段第一帧的文本相似的行归为同一段，
+    文本发生变化时立即输出上一段字幕(start_frame, end_frame, content)，内存占用与视频长度无关
+    """
+
+    def __init__(self, threshold, extend_single_frame=True):
+        """
+        :param threshold 文本相似度阈值，Levenshtein ratio低于该值认为字幕发生变化
+        :param extend_single_frame 只有一帧的字幕段是否以下一段的开始帧作为结束帧
+        """
+        self.threshold = threshold
+        self.extend_single_frame = extend_single_frame
+        # 当前字幕段的起始帧号、起始帧去除空格后的文本、最后一帧帧号、最长的文本及其长度
+        self.start_frame = None
+        self.start_key = None
+        self.end_frame = None
+        self.content = None
+        self.content_len = 0
+
+    def push(self, frame_no, content):
+        """
+        输入一帧的字幕文本
+        :return 字幕发生变化时返回上一段字幕(start_frame, end_frame, content)，否则返回None
+        """
+        key = content.replace(' ', '')
+        if self.start_frame is not None and ratio(self.start_key, key) >= self.threshold:
+            self.end_frame = frame_no
+            # 保留最长的字幕
+            if len(key) > self.content_len:
+                self.content, self.content_len = content, len(key)
+            return None
+        span = None
+        if self.start_frame is not None:
+            end_frame = self.end_frame
+            if self.extend_single_frame and end_frame == self.start_frame:
+                # 针对只有一帧的情况，以下一帧的开始时间为准
+                end_frame = frame_no
+            span = (self.start_frame, end_frame, self.content)
+        self.start_frame, self.start_key, self.end_frame = frame_no, key, frame_no
+        self.content, self.content_len = content, len(key)
+        return span
+
+    def flush(self):
+        """
+        输出最后一段字幕
+        :return (start_frame, end_frame, content)，没有字幕时返回None
+        """
+        if self.start_frame is None:
+            return None
+        span = (self.start_frame, self.end_frame, self.content)
+        self.start_frame = None
+        return span
+
+
+class SubtitleSpanStream:
+    """
+    接在OCR输出之后的字幕流：合并同一帧的文本行并去重，将完成的字幕段(start_frame, end_frame, content)放入span_queue
+    """
+
+    def __init__(self, span_queue, threshold, extend_single_frame=True, normalize=None):
+        self.span_queue = span_queue
+        self.grouper = FrameGrouper(normalize)
+        self.deduplicator = SubtitleDeduplicator(threshold, extend_single_frame)
+
+    def append(self, frame_no, coordinate, text, score=None):
+        """
+        输入一行识别结果，识别结果需按帧号顺序输入
+        """
+        self.__push(self.grouper.push(frame_no, coordinate, text, score))
+
+    def close(self):
+        """
+        输出剩余的字幕段
+        """
+        self.__push(self.grouper.flush())
+        span = self.deduplicator.flush()
+        if span is not None:
+            self.span_queue.put(span)
+
+    def __push(self, grouped):
+        if grouped is None:
+            return
+        frame_no, _, text, _ = grouped
+        # 与原始字幕文本一致，每行文本以换行结尾
+        span = self.deduplicator.push(frame_no, f'{text}\n')
+        if span is not None:
+            self.span_queue.put(span)
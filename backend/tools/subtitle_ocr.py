@@ -1,5 +1,8 @@
 import os
+import functools
 import re
+import time
+import unicodedata
 from multiprocessing import Queue, Process
 import cv2
 from PIL import ImageFont, ImageDraw, Image
@@ -7,19 +10,35 @@ from tqdm import tqdm
 from backend.tools.ocr import OcrRecogniser, get_coordinates
 from backend.tools.constant import SubtitleArea
 from backend.tools import constant
+from backend.tools.frame_diff import FrameChangeDetector, crop_sub_area
+from backend.tools.ocr_cache import PerceptualHashCache, PersistentOcrCache
+from backend.tools.result_store import OcrResultStore, get_store_path, get_box_store_path
+from backend.tools.checkpoint import get_ocr_checkpoint_path, save_ocr_checkpoint, load_ocr_checkpoint
+from backend.tools.subtitle_dedup import SubtitleSpanStream
+from backend.tools.coordinates import overflow_area_rates
+from backend.tools.ocr_pool import OcrWorkerPool
 from threading import Thread
 import queue
-from shapely.geometry import Polygon
 from types import SimpleNamespace
 import shutil
 import numpy as np
-from collections import namedtuple
+from collections import namedtuple, deque
+from contextlib import nullcontext
+
+
+# 指定字幕区域时每个文本框的识别结果与筛选情况，用于输出丢失字幕的调试信息
+LossInfo = namedtuple('loss_info', 'text prob overflow_area_rate coordinate selected')
 
 
 def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
-                      sub_area, options, dt_box_arg, rec_res_arg, ocr_loss_debug_path):
+                      sub_area, options, dt_box_arg, rec_res_arg, ocr_loss_debug_path, result_store=None,
+                      subtitle_stream=None, box_store=None):
     """
     提取视频帧中的字幕信息
+    :param raw_subtitle_file 原始字幕文件，为None时不写入
+    :param result_store 识别结果存储对象OcrResultStore，为None时不存储
+    :param subtitle_stream 边识别边去重的字幕流SubtitleSpanStream，为None时不去重
+    :param box_store 存储所有文本框(包括按DROP_SCORE与字幕区域筛选掉的)的OcrResultStore，为None时不存储
     """
     # 从参数中获取检测框与检测结果
     dt_box = dt_box_arg
@@ -38,38 +57,44 @@ def extract_subtitles(data, text_recogniser, img, raw_subtitle_file,
         text_res = [(res[0], res[1]) for res in rec_res]
     line = ''
     loss_list = []
-    for content, coordinate in zip(text_res, coordinates):
+    if sub_area is not None:
+        # 一次计算该帧所有文本框与用户指定的字幕区域是否有交集及越界比例
+        intersects, rates = overflow_area_rates(sub_area, coordinates)
+    for index, (content, coordinate) in enumerate(zip(text_res, coordinates)):
         text = content[0]
         prob = content[1]
+        if box_store is not None:
+            box_store.append(data['i'], coordinate, text, prob)
         if sub_area is not None:
             selected = False
-            # 初始化超界偏差为0
-            overflow_area_rate = 0
-            # 用户指定的字幕区域
-            sub_area_polygon = sub_area_to_polygon(sub_area)
-            # 识别出的字幕区域
-            coordinate_polygon = coordinate_to_polygon(coordinate)
-            # 计算两个区域是否有交集交集
-            intersection = sub_area_polygon.intersection(coordinate_polygon)
-            # 如果有交集
-            if not intersection.is_empty:
-                # 计算越界允许偏差
-                overflow_area_rate = ((sub_area_polygon.area + coordinate_polygon.area - intersection.area) / sub_area_polygon.area) - 1
-                # 如果越界比例低于设定阈值且该行文本识别的置信度高于设定阈值
-                if overflow_area_rate <= options.SUB_AREA_DEVIATION_RATE and prob > options.DROP_SCORE:
-                    # 保留该帧
-                    selected = True
-                    line += f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n'
-                    raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+            # 越界比例，没有交集时为0
+            overflow_area_rate = float(rates[index])
+            # 如果有交集，且越界比例低于设定阈值且该行文本识别的置信度高于设定阈值
+            if intersects[index] and overflow_area_rate <= options.SUB_AREA_DEVIATION_RATE and prob > options.DROP_SCORE:
+                # 保留该帧
+                selected = True
+                line += f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n'
+                write_result(raw_subtitle_file, result_store, data['i'], coordinate, text, prob, subtitle_stream)
             # 保存丢掉的识别结果
-            loss_info = namedtuple('loss_info', 'text prob overflow_area_rate coordinate selected')
-            loss_list.append(loss_info(text, prob, overflow_area_rate, coordinate, selected))
+            loss_list.append(LossInfo(text, prob, overflow_area_rate, coordinate, selected))
         else:
-            raw_subtitle_file.write(f'{str(data["i"]).zfill(8)}\t{coordinate}\t{text}\n')
+            write_result(raw_subtitle_file, result_store, data['i'], coordinate, text, prob, subtitle_stream)
     # 输出调试信息
     dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area, data)
 
 
+def write_result(raw_subtitle_file, result_store, frame_no, coordinate, text, prob, subtitle_stream=None):
+    """
+    将一个文本框的识别结果写入识别结果存储、原始字幕文件与字幕流
+    """
+    if result_store is not None:
+        result_store.append(frame_no, coordinate, text, prob)
+    if subtitle_stream is not None:
+        subtitle_stream.append(frame_no, coordinate, text, prob)
+    if raw_subtitle_file is not None:
+        raw_subtitle_file.write(f'{str(frame_no).zfill(8)}\t{coordinate}\t{text}\n')
+
+
 def dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area, data):
     loss = False
     if options.DEBUG_OCR_LOSS and options.REC_CHAR_TYPE in ('ch', 'japan ', 'korea', 'ch_tra'):
@@ -77,34 +102,29 @@ def dump_debug_info(options, line, img, loss_list, ocr_loss_debug_path, sub_area
     if loss:
         if not os.path.exists(ocr_loss_debug_path):
             os.makedirs(ocr_loss_debug_path, mode=0o777, exist_ok=True)
-        img = cv2.rectangle(img, (sub_area[2], sub_area[0]), (sub_area[3], sub_area[1]), constant.BGR_COLOR_BLUE, 2)
+        # 视频帧可能经过裁剪，坐标需要换算回裁剪后的视频帧
+        offset_x, offset_y = data.get('offset', (0, 0))
+        img = cv2.rectangle(img, (sub_area[2] - offset_x, sub_area[0] - offset_y),
+                            (sub_area[3] - offset_x, sub_area[1] - offset_y), constant.BGR_COLOR_BLUE, 2)
         for loss_info in loss_list:
-            coordinate = loss_info.coordinate
+            xmin, xmax, ymin, ymax = loss_info.coordinate
+            xmin, xmax, ymin, ymax = xmin - offset_x, xmax - offset_x, ymin - offset_y, ymax - offset_y
             color = constant.BGR_COLOR_GREEN if loss_info.selected else constant.BGR_COLOR_RED
             text = f"[{loss_info.text}] prob:{loss_info.prob:.4f} or:{loss_info.overflow_area_rate:.2f}"
-            img = paint_chinese_opencv(img, text, pos=(coordinate[0], coordinate[2] - 30), color=color)
-            img = cv2.rectangle(img, (coordinate[0], coordinate[2]), (coordinate[1], coordinate[3]), color, 2)
+            img = paint_chinese_opencv(img, text, pos=(xmin, ymin - 30), color=color)
+            img = cv2.rectangle(img, (xmin, ymin), (xmax, ymax), color, 2)
         cv2.imwrite(os.path.join(os.path.abspath(ocr_loss_debug_path), f'{str(data["i"]).zfill(8)}.png'), img)
 
 
-def sub_area_to_polygon(sub_area):
-    s_ymin = sub_area[0]
-    s_ymax = sub_area[1]
-    s_xmin = sub_area[2]
-    s_xmax = sub_area[3]
-    return Polygon([[s_xmin, s_ymin], [s_xmax, s_ymin], [s_xmax, s_ymax], [s_xmin, s_ymax]])
-
-
-def coordinate_to_polygon(coordinate):
-    xmin = coordinate[0]
-    xmax = coordinate[1]
-    ymin = coordinate[2]
-    ymax = coordinate[3]
-    return Polygon([[xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax]])
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotoSansCJK-Bold.otf')
 
 
-FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'NotoSansCJK-Bold.otf')
-FONT = ImageFont.truetype(FONT_PATH, 20)
+@functools.lru_cache(maxsize=1)
+def get_font():
+    """
+    只在调试绘制识别结果时加载字体
+    """
+    return ImageFont.truetype(FONT_PATH, 20)
 
 
 def paint_chinese_opencv(im, chinese, pos, color):
@@ -112,69 +132,266 @@ def paint_chinese_opencv(im, chinese, pos, color):
     fill_color = color  # (color[2], color[1], color[0])
     position = pos
     draw = ImageDraw.Draw(img_pil)
-    draw.text(position, chinese, font=FONT, fill=fill_color)
+    draw.text(position, chinese, font=get_font(), fill=fill_color)
     img = np.asarray(img_pil)
     return img
 
 
-def ocr_task_consumer(ocr_queue, raw_subtitle_path, sub_area, video_path, options):
+def ocr_task_consumer(ocr_queue, raw_subtitle_path, sub_area, video_path, options, frame_ring=None, span_queue=None,
+                      recogniser=None):
     """
     消费者： 消费ocr_queue，将ocr队列中的数据取出，进行ocr识别，写入字幕文件中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
-    :param raw_subtitle_path
+    OCR_WORKER_NUM大于1时由多个OCR进程并行识别，识别结果按帧号顺序重新排列后再写入字幕文件
+    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果, frame_slot共享内存槽位, offset裁剪偏移量)
+    :param raw_subtitle_path 原始字幕文件路径，识别结果存储在同目录的raw.npz中，DEBUG_DUMP_RAW_TXT为True时才写入原始字幕文件
     :param sub_area
     :param video_path
     :param options
+    :param frame_ring 共享内存视频帧缓冲区
+    :param span_queue 去重后的字幕段(start_frame, end_frame, content)队列，为None时不边识别边去重
+    :param recogniser 已加载的OcrRecogniser，不为None时直接用于识别，不再重新加载模型
+    RESUME为True且存在断点时，载入断点之前的识别结果，只识别断点之后的视频帧
+    CHECKPOINT_INTERVAL大于0时，每隔这么多秒写入已完成的识别结果并保存断点
     """
     data = {'i': 1}
+    result_store = OcrResultStore()
+    # 所有文本框，用于输出OCR结果文件，之后调整参数时无需重新识别
+    box_store = OcrResultStore() if options.OCR_SIDECAR else None
+    subtitle_stream = None
+    if span_queue is not None:
+        subtitle_stream = SubtitleSpanStream(span_queue, options.THRESHOLD_TEXT_SIMILARITY,
+                                             extend_single_frame=not options.USE_VSF,
+                                             normalize=lambda text: unicodedata.normalize('NFKC', text))
     # 初始化文本识别对象
-    text_recogniser = OcrRecogniser()
+    # 指定了字幕区域时字幕基本固定在一到两行上，可以学习行条带后跳过文本检测
+    line_band = None
+    if sub_area is not None and options.LINE_BAND_MODE:
+        line_band = {'warmup_num': options.LINE_BAND_WARMUP_NUM, 'min_score': options.LINE_BAND_MIN_SCORE,
+                     'drop_score': options.DROP_SCORE, 'detect_interval': options.LINE_BAND_DETECT_INTERVAL}
+    ocr_pool = OcrWorkerPool(options.OCR_WORKER_NUM, frame_ring, options.OCR_BATCH_FRAME_NUM, line_band, recogniser,
+                             options.OCR_CPU_THREADS or None)
+    # 同时在识别中的任务数上限
+    max_inflight = 2 * ocr_pool.worker_num * ocr_pool.batch_num
+    # 字幕区域变化检测，字幕区域没有变化的帧沿用上一次的识别结果，没有指定字幕区域时无法可靠地检测字幕变化，不启用
+    change_detector = None
+    if options.FRAME_DIFF_THRESHOLD > 0 and sub_area is not None:
+        change_detector = FrameChangeDetector(options.FRAME_DIFF_THRESHOLD)
+    # 感知哈希缓存，重复出现的字幕直接复用识别结果，没有指定字幕区域时整帧中一行字幕只占很小的面积，不同字幕的哈希几乎相同，不启用
+    ocr_cache = None
+    if options.OCR_CACHE_SIZE > 0 and sub_area is not None:
+        ocr_cache = PerceptualHashCache(options.OCR_CACHE_SIZE)
+    # 本地OCR结果缓存，跨运行、跨视频复用识别结果
+    disk_cache = None
+    if options.OCR_DISK_CACHE_SIZE_MB > 0:
+        disk_cache = PersistentOcrCache(options.OCR_DISK_CACHE_PATH, options.OCR_MODEL_ID,
+                                        options.OCR_DISK_CACHE_SIZE_MB * 1024 * 1024)
+    # 等待识别结果写入缓存的任务 {key: (送入OCR的视频帧的哈希与缩略图, 本地缓存键, 送入OCR的视频帧左上角在原视频帧中的坐标)}
+    cache_keys = {}
+    # 最近一次提交识别的任务编号
+    reference_key = None
+    key = 0
+    # 按帧号顺序等待写入的任务: [frame_no, frame, frame_slot, offset, key, dt_box, rec_res]
+    pending = deque()
+    # 已取回的识别结果 {key: (dt_box, rec_res)}
+    results = {}
+    # 各任务对应的视频帧变化检测参照帧 {key: 边缘图}，保存断点时取已写入的最后一个任务的参照帧
+    references = {}
+    offsets = {}
     # 丢失字幕的存储路径
     ocr_loss_debug_path = os.path.join(os.path.abspath(os.path.splitext(video_path)[0]), 'loss')
-    # 删除之前的缓存垃圾
-    if os.path.exists(ocr_loss_debug_path):
+    checkpoint_path = get_ocr_checkpoint_path(raw_subtitle_path)
+    # 断点之前已经识别并写入识别结果的最后一帧
+    checkpoint_frame_no = 0
+    checkpoint = load_ocr_checkpoint(checkpoint_path) if options.RESUME else None
+    if checkpoint is not None:
+        checkpoint_frame_no, reference, reference_result, cache_items = checkpoint
+        # 异常退出时识别结果可能比断点新，只保留断点之前的部分
+        result_store = OcrResultStore.load(get_store_path(raw_subtitle_path))
+        result_store.keep(result_store.frame_no <= checkpoint_frame_no)
+        if box_store is not None and os.path.exists(get_box_store_path(raw_subtitle_path)):
+            box_store = OcrResultStore.load(get_box_store_path(raw_subtitle_path))
+            box_store.keep(box_store.frame_no <= checkpoint_frame_no)
+        # 恢复视频帧变化检测的参照帧与感知哈希缓存，断点之后的识别结果与不中断时一致
+        if change_detector is not None and reference is not None and reference_result is not None:
+            change_detector.reference = reference
+            key = reference_key = 1
+            results[key] = reference_result
+            references[key] = reference
+        if ocr_cache is not None:
+            for cache_key, (thumbnail, value) in cache_items:
+                ocr_cache.put(cache_key, thumbnail, value)
+    elif os.path.exists(ocr_loss_debug_path):
+        # 删除之前的缓存垃圾
         shutil.rmtree(ocr_loss_debug_path, True)
+    # 已经识别并写入识别结果的最后一帧及其任务编号
+    data['written'] = checkpoint_frame_no
+    data['written_key'] = reference_key
+    last_checkpoint_time = time.time()
+
+    def save_checkpoint(raw_subtitle_file):
+        """
+        保存已写入的识别结果与断点，不等待识别中的视频帧，断点之后的视频帧从断点继续时重新识别
+        """
+        result_store.save(get_store_path(raw_subtitle_path))
+        if box_store is not None:
+            box_store.save(get_box_store_path(raw_subtitle_path))
+        if raw_subtitle_file is not None:
+            raw_subtitle_file.flush()
+        # 已写入的最后一帧之后的视频帧与该帧所用的参照帧比较
+        reference = references.get(data['written_key'])
+        save_ocr_checkpoint(checkpoint_path, data['written'], reference,
+                            results.get(data['written_key']) if reference is not None else None,
+                            list(ocr_cache.items.items()) if ocr_cache is not None else [])
 
-    with open(raw_subtitle_path, mode='w+', encoding='utf-8') as raw_subtitle_file:
-        while True:
+    def flush(raw_subtitle_file, block):
+        """
+        取回识别结果，并按顺序写入已经有结果的任务
+        """
+        for result_key, result_dt_box, result_rec_res in ocr_pool.fetch(block):
+            # 将裁剪后视频帧中的检测框坐标换算回原视频帧
+            results[result_key] = (shift_dt_box(result_dt_box if result_dt_box is not None else [],
+                                                offsets.pop(result_key)),
+                                   result_rec_res if result_rec_res is not None else [])
+            if result_key in cache_keys:
+                frame_hash, disk_key, crop_origin = cache_keys.pop(result_key)
+                if ocr_cache is not None:
+                    ocr_cache.put(*frame_hash, results[result_key])
+                if disk_cache is not None:
+                    # 本地缓存中的检测框坐标相对于送入OCR的视频帧，裁剪位置不同时也可以复用
+                    disk_cache.put(disk_key, (shift_dt_box(results[result_key][0], (-crop_origin[0], -crop_origin[1])),
+                                              results[result_key][1]))
+        while pending:
+            frame_no, frame, frame_slot, offset, task_key, dt_box, rec_res = pending[0]
+            if dt_box is None:
+                if task_key not in results:
+                    break
+                dt_box, rec_res = results[task_key]
+                # 之后的任务编号都不小于当前编号，更早的结果不再需要
+                for old_key in [k for k in results if k < task_key]:
+                    del results[old_key]
+                for old_key in [k for k in references if k < task_key]:
+                    del references[old_key]
+                data['written_key'] = task_key
+            pending.popleft()
+            data['i'] = frame_no
+            data['offset'] = offset
             try:
-                frame_no, frame, dt_box, rec_res = ocr_queue.get(block=True)
+                extract_subtitles(data, None, frame, raw_subtitle_file, sub_area, options, dt_box,
+                                  rec_res, ocr_loss_debug_path, result_store, subtitle_stream, box_store)
+            finally:
+                # 识别完成后归还共享内存槽位
+                if frame_ring is not None:
+                    frame_ring.release(frame_slot)
+            data['written'] = frame_no
+
+    if checkpoint is not None and options.DEBUG_DUMP_RAW_TXT:
+        result_store.dump_raw_txt(raw_subtitle_path)
+    with open(raw_subtitle_path, mode='a' if checkpoint is not None else 'w+', encoding='utf-8') \
+            if options.DEBUG_DUMP_RAW_TXT else nullcontext() as raw_subtitle_file:
+        try:
+            while True:
+                flush(raw_subtitle_file, block=ocr_pool.inflight >= max_inflight)
+                if 0 < options.CHECKPOINT_INTERVAL <= time.time() - last_checkpoint_time:
+                    save_checkpoint(raw_subtitle_file)
+                    last_checkpoint_time = time.time()
+                try:
+                    # 有任务在等待识别结果时，定时回来写入已完成的结果
+                    item = ocr_queue.get(block=True, timeout=0.05 if pending else None)
+                except queue.Empty:
+                    # 暂时没有新的视频帧，不再等待凑满一批，直接识别
+                    flush(raw_subtitle_file, block=True)
+                    continue
+                frame_no, frame, dt_box, rec_res, frame_slot, offset = item
                 if frame_no == -1:
-                    return
-                data['i'] = frame_no
-                extract_subtitles(data, text_recogniser, frame, raw_subtitle_file, sub_area, options, dt_box,
-                                  rec_res, ocr_loss_debug_path)
-            except Exception as e:
-                print(e)
-                break
+                    while pending:
+                        flush(raw_subtitle_file, block=True)
+                    break
+                if frame_no <= checkpoint_frame_no:
+                    # 断点之前的视频帧已经识别过
+                    if frame_ring is not None:
+                        frame_ring.release(frame_slot)
+                    continue
+                if dt_box is not None and rec_res is not None:
+                    pending.append([frame_no, frame, frame_slot, offset, None, dt_box, rec_res])
+                    continue
+                roi = crop_sub_area(frame, shift_sub_area(sub_area, offset))
+                if change_detector is None or reference_key is None or change_detector.is_changed(roi):
+                    key += 1
+                    # 送入OCR的视频帧只包含字幕区域及四周的余量，对其计算哈希并逐像素确认
+                    frame_hash = (ocr_cache.key(frame), ocr_cache.thumbnail(frame)) if ocr_cache is not None else None
+                    cached = ocr_cache.get(*frame_hash) if ocr_cache is not None else None
+                    disk_key = None
+                    # 送入OCR的视频帧左上角在原视频帧中的坐标
+                    crop_origin = offset or (0, 0)
+                    if cached is None and disk_cache is not None:
+                        disk_key = disk_cache.key(frame)
+                        cached = disk_cache.get(disk_key)
+                        if cached is not None:
+                            cached = (shift_dt_box(cached[0], crop_origin), cached[1])
+                            if ocr_cache is not None:
+                                ocr_cache.put(*frame_hash, cached)
+                    if cached is not None:
+                        results[key] = cached
+                    else:
+                        offsets[key] = offset
+                        if ocr_cache is not None or disk_cache is not None:
+                            cache_keys[key] = (frame_hash, disk_key, crop_origin)
+                        ocr_pool.submit(key, frame, frame_slot)
+                    if change_detector is not None:
+                        change_detector.update(roi)
+                        references[key] = change_detector.reference
+                    reference_key = key
+                pending.append([frame_no, frame, frame_slot, offset, reference_key, None, None])
+        except Exception as e:
+            print(e)
+        finally:
+            ocr_pool.close()
+            if disk_cache is not None:
+                disk_cache.close()
+            result_store.save(get_store_path(raw_subtitle_path))
+            if box_store is not None:
+                box_store.save(get_box_store_path(raw_subtitle_path))
+            if subtitle_stream is not None:
+                subtitle_stream.close()
 
 
-def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path):
+def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path, frame_ring=None,
+                      crop_box=None):
     """
     生产者：负责生产用于OCR识别的数据，将需要进行ocr识别的数据加入ocr_queue中
-    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果)
-    :param task_queue (total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
+    :param ocr_queue (current_frame_no当前帧帧号, frame 视频帧, dt_box检测框, rec_res识别结果, frame_slot共享内存槽位, offset裁剪偏移量)
+    :param task_queue (total_frame_count总帧数, current_frame_no当前帧帧号, dt_box检测框, rec_res识别结果, 当前帧时间, subtitle_area字幕区域, frame_slot共享内存槽位)
     :param progress_queue
     :param video_path
     :param raw_subtitle_path
+    :param frame_ring 共享内存视频帧缓冲区
+    :param crop_box 视频帧的裁剪范围(ymin, ymax, xmin, xmax)，共享内存中的视频帧已按此范围裁剪
     """
-    cap = cv2.VideoCapture(video_path)
+    # 只有任务没有携带共享内存中的视频帧时才需要自行解码
+    cap = None
     tbar = None
     while True:
         try:
             # 从任务队列中提取任务信息
-            total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area = task_queue.get(block=True)
+            total_frame_count, current_frame_no, dt_box, rec_res, total_ms, default_subtitle_area, frame_slot = task_queue.get(block=True)
             progress_queue.put(current_frame_no)
             if tbar is None:
                 tbar = tqdm(total=round(total_frame_count), position=1)
             # current_frame 等于-1说明所有视频帧已经读完
             if current_frame_no == -1:
                 # ocr识别队列加入结束标志
-                ocr_queue.put((-1, None, None, None))
+                ocr_queue.put((-1, None, None, None, None, None))
                 # 更新进度条
                 tbar.update(tbar.total - tbar.n)
                 break
             tbar.update(round(current_frame_no - tbar.n))
+            # 主进程已将(裁剪后的)视频帧写入共享内存，直接读取，无需再次解码
+            if frame_slot is not None and frame_ring is not None:
+                ocr_queue.put((current_frame_no, frame_ring.read(frame_slot), dt_box, rec_res, frame_slot,
+                               (crop_box[2], crop_box[0])))
+                continue
+            if cap is None:
+                cap = cv2.VideoCapture(video_path)
             # 设置当前视频帧
             # 如果total_ms不为空，则使用了VSF提取字幕
             if total_ms is not None:
@@ -185,38 +402,51 @@ def ocr_task_producer(ocr_queue, task_queue, progress_queue, video_path, raw_sub
             ret, frame = cap.read()
             # 如果读取成功
             if ret:
-                # 根据默认字幕位置，则对视频帧进行裁剪，裁剪后处理
-                if default_subtitle_area is not None:
-                    frame = frame_preprocess(default_subtitle_area, frame)
-                ocr_queue.put((current_frame_no, frame, dt_box, rec_res))
+                # 根据字幕区域或默认字幕位置，对视频帧进行裁剪，裁剪后处理
+                frame_box = crop_box
+                if frame_box is None:
+                    frame_box = get_crop_box(default_subtitle_area, None, frame.shape[0], frame.shape[1])
+                ocr_queue.put((current_frame_no, crop_frame(frame, frame_box), dt_box, rec_res, None,
+                               (frame_box[2], frame_box[0])))
         except Exception as e:
             print(e)
             break
-    cap.release()
+    if cap is not None:
+        cap.release()
 
 
-def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, options):
+def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, options, frame_ring=None,
+                             crop_box=None, span_queue=None, recogniser=None):
     """
     创建并开启一个视频帧提取线程与一个ocr识别线程
-    :param task_queue 任务队列，(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
+    :param task_queue 任务队列，(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间, subtitle_area字幕区域, frame_slot共享内存槽位)
     :param progress_queue 进度队列
     :param video_path 视频路径
     :param raw_subtitle_path 原始字幕文件路径
     :param sub_area 字幕区域
     :param options 选项
+    :param frame_ring 共享内存视频帧缓冲区
+    :param crop_box 视频帧的裁剪范围(ymin, ymax, xmin, xmax)
+    :param span_queue 去重后的字幕段队列
+    :param recogniser 已加载的OcrRecogniser，为None时加载新的模型
     """
-    # 删除缓存
-    if os.path.exists(raw_subtitle_path):
-        os.remove(raw_subtitle_path)
+    # 删除缓存，从断点继续时保留之前的识别结果
+    if not (options.RESUME and os.path.exists(get_ocr_checkpoint_path(raw_subtitle_path))):
+        for path in (raw_subtitle_path, get_store_path(raw_subtitle_path), get_box_store_path(raw_subtitle_path),
+                     get_ocr_checkpoint_path(raw_subtitle_path)):
+            if os.path.exists(path):
+                os.remove(path)
     # 创建一个OCR队列，大小建议值8-20
     ocr_queue = queue.Queue(20)
     # 创建一个OCR事件生产者线程
     ocr_event_producer_thread = Thread(target=ocr_task_producer,
-                                       args=(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path,),
+                                       args=(ocr_queue, task_queue, progress_queue, video_path, raw_subtitle_path,
+                                             frame_ring, crop_box,),
                                        daemon=True)
     # 创建一个OCR事件消费者提取线程
     ocr_event_consumer_thread = Thread(target=ocr_task_consumer,
-                                       args=(ocr_queue, raw_subtitle_path, sub_area, video_path, options,),
+                                       args=(ocr_queue, raw_subtitle_path, sub_area, video_path, options, frame_ring,
+                                             span_queue, recogniser,),
                                        daemon=True)
     # 开启消费者线程
     ocr_event_producer_thread.start()
@@ -225,28 +455,77 @@ def subtitle_extract_handler(task_queue, progress_queue, video_path, raw_subtitl
     # join方法让主线程任务结束之后，进入阻塞状态，一直等待其他的子线程执行结束之后，主线程再终止
     ocr_event_producer_thread.join()
     ocr_event_consumer_thread.join()
+    if frame_ring is not None:
+        frame_ring.close()
 
 
-def async_start(video_path, raw_subtitle_path, sub_area, options):
+def check_options(options):
+    """
+    检查OCR任务的选项是否完整
+    """
+    assert 'REC_CHAR_TYPE' in options, "options缺少参数：REC_CHAR_TYPE"
+    assert 'DROP_SCORE' in options, "options缺少参数: DROP_SCORE'"
+    assert 'SUB_AREA_DEVIATION_RATE' in options, "options缺少参数: SUB_AREA_DEVIATION_RATE"
+    assert 'DEBUG_OCR_LOSS' in options, "options缺少参数: DEBUG_OCR_LOSS"
+    assert 'FRAME_DIFF_THRESHOLD' in options, "options缺少参数: FRAME_DIFF_THRESHOLD"
+    assert 'OCR_WORKER_NUM' in options, "options缺少参数: OCR_WORKER_NUM"
+    assert 'OCR_CPU_THREADS' in options, "options缺少参数: OCR_CPU_THREADS"
+    assert 'OCR_BATCH_FRAME_NUM' in options, "options缺少参数: OCR_BATCH_FRAME_NUM"
+    assert 'LINE_BAND_MODE' in options, "options缺少参数: LINE_BAND_MODE"
+    assert 'LINE_BAND_WARMUP_NUM' in options, "options缺少参数: LINE_BAND_WARMUP_NUM"
+    assert 'LINE_BAND_MIN_SCORE' in options, "options缺少参数: LINE_BAND_MIN_SCORE"
+    assert 'LINE_BAND_DETECT_INTERVAL' in options, "options缺少参数: LINE_BAND_DETECT_INTERVAL"
+    assert 'OCR_CACHE_SIZE' in options, "options缺少参数: OCR_CACHE_SIZE"
+    assert 'OCR_DISK_CACHE_PATH' in options, "options缺少参数: OCR_DISK_CACHE_PATH"
+    assert 'OCR_DISK_CACHE_SIZE_MB' in options, "options缺少参数: OCR_DISK_CACHE_SIZE_MB"
+    assert 'OCR_MODEL_ID' in options, "options缺少参数: OCR_MODEL_ID"
+    assert 'OCR_SIDECAR' in options, "options缺少参数: OCR_SIDECAR"
+    assert 'RESUME' in options, "options缺少参数: RESUME"
+    assert 'CHECKPOINT_INTERVAL' in options, "options缺少参数: CHECKPOINT_INTERVAL"
+    assert 'DEBUG_DUMP_RAW_TXT' in options, "options缺少参数: DEBUG_DUMP_RAW_TXT"
+    assert 'THRESHOLD_TEXT_SIMILARITY' in options, "options缺少参数: THRESHOLD_TEXT_SIMILARITY"
+    assert 'USE_VSF' in options, "options缺少参数: USE_VSF"
+
+
+def async_start(video_path, raw_subtitle_path, sub_area, options, frame_ring=None, crop_box=None, span_queue=None):
     """
     开始进程处理异步任务
+    span_queue: 边识别边去重的字幕段队列，为None时识别结束后再去重
+    frame_ring: 共享内存视频帧缓冲区，为None时OCR进程自行解码视频帧
+    crop_box: 送入OCR的视频帧裁剪范围(ymin, ymax, xmin, xmax)，为None时按默认字幕位置裁剪
     options.REC_CHAR_TYPE
     options.DROP_SCORE
     options.SUB_AREA_DEVIATION_RATE
     options.DEBUG_OCR_LOSS
+    options.FRAME_DIFF_THRESHOLD
+    options.OCR_WORKER_NUM
+    options.OCR_CPU_THREADS
+    options.OCR_BATCH_FRAME_NUM
+    options.LINE_BAND_MODE
+    options.LINE_BAND_WARMUP_NUM
+    options.LINE_BAND_MIN_SCORE
+    options.LINE_BAND_DETECT_INTERVAL
+    options.OCR_CACHE_SIZE
+    options.OCR_DISK_CACHE_PATH
+    options.OCR_DISK_CACHE_SIZE_MB
+    options.OCR_MODEL_ID
+    options.OCR_SIDECAR
+    options.RESUME
+    options.CHECKPOINT_INTERVAL
+    options.DEBUG_DUMP_RAW_TXT
+    options.THRESHOLD_TEXT_SIMILARITY
+    options.USE_VSF
     """
-    assert 'REC_CHAR_TYPE' in options, "options缺少参数：REC_CHAR_TYPE"
-    assert 'DROP_SCORE' in options, "options缺少参数: DROP_SCORE'"
-    assert 'SUB_AREA_DEVIATION_RATE' in options, "options缺少参数: SUB_AREA_DEVIATION_RATE"
-    assert 'DEBUG_OCR_LOSS' in options, "options缺少参数: DEBUG_OCR_LOSS"
+    check_options(options)
     # 创建一个任务队列
-    # 任务格式为：(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, subtitle_area字幕区域)
+    # 任务格式为：(total_frame_count总帧数, current_frame_no当前帧, dt_box检测框, rec_res识别结果, 当前帧时间, subtitle_area字幕区域, frame_slot共享内存槽位)
     task_queue = Queue()
     # 创建一个进度更新队列
     progress_queue = Queue()
     # 新建一个进程
     p = Process(target=subtitle_extract_handler,
-                args=(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, SimpleNamespace(**options),))
+                args=(task_queue, progress_queue, video_path, raw_subtitle_path, sub_area, SimpleNamespace(**options),
+                      frame_ring, crop_box, span_queue,))
     # 启动进程
     p.start()
     return p, task_queue, progress_queue
@@ -261,17 +540,62 @@ def frame_preprocess(subtitle_area, frame):
     # if self.frame_width > 1280:
     #     scale_rate = round(float(1280 / self.frame_width), 2)
     #     frames = cv2.resize(frames, None, fx=scale_rate, fy=scale_rate, interpolation=cv2.INTER_AREA)
-    # 如果字幕出现的区域在下部分
+    return crop_frame(frame, get_crop_box(subtitle_area, None, frame.shape[0], frame.shape[1]))
+
+
+def get_crop_box(subtitle_area, sub_area, frame_height, frame_width, deviation_rate=0, padding=0):
+    """
+    计算送入OCR的视频帧裁剪范围
+    指定了字幕区域时，裁剪为字幕区域加上允许的越界范围与padding，否则根据默认字幕位置裁剪上半部分或下半部分
+    :param subtitle_area 默认字幕位置
+    :param sub_area 用户指定的字幕区域(ymin, ymax, xmin, xmax)
+    :param deviation_rate 字幕区域允许越界的比例
+    :param padding 字幕区域四周额外保留的像素，给文本检测留出上下文
+    :return (ymin, ymax, xmin, xmax)
+    """
+    if sub_area is not None:
+        s_ymin, s_ymax, s_xmin, s_xmax = sub_area
+        margin_y = int((s_ymax - s_ymin) * deviation_rate) + padding
+        margin_x = int((s_xmax - s_xmin) * deviation_rate) + padding
+        ymin, ymax = max(s_ymin - margin_y, 0), min(s_ymax + margin_y, frame_height)
+        xmin, xmax = max(s_xmin - margin_x, 0), min(s_xmax + margin_x, frame_width)
+        if ymin < ymax and xmin < xmax:
+            return int(ymin), int(ymax), int(xmin), int(xmax)
+    # 如果字幕出现的区域在下部分，将视频帧切割为下半部分
     if subtitle_area == SubtitleArea.LOWER_PART:
-        cropped = int(frame.shape[0] // 2)
-        # 将视频帧切割为下半部分
-        frame = frame[cropped:]
-    # 如果字幕出现的区域在上半部分
+        return frame_height // 2, frame_height, 0, frame_width
+    # 如果字幕出现的区域在上半部分，将视频帧切割为上半部分
     elif subtitle_area == SubtitleArea.UPPER_PART:
-        cropped = int(frame.shape[0] // 2)
-        # 将视频帧切割为下半部分
-        frame = frame[:cropped]
-    return frame
+        return 0, frame_height // 2, 0, frame_width
+    return 0, frame_height, 0, frame_width
+
+
+def crop_frame(frame, crop_box):
+    """
+    按裁剪范围裁剪视频帧
+    """
+    ymin, ymax, xmin, xmax = crop_box
+    return frame[ymin:ymax, xmin:xmax]
+
+
+def shift_sub_area(sub_area, offset):
+    """
+    将原视频帧中的字幕区域换算到裁剪后的视频帧中
+    """
+    if sub_area is None or offset is None:
+        return sub_area
+    offset_x, offset_y = offset
+    return sub_area[0] - offset_y, sub_area[1] - offset_y, sub_area[2] - offset_x, sub_area[3] - offset_x
+
+
+def shift_dt_box(dt_box, offset):
+    """
+    将裁剪后视频帧中的检测框坐标换算回原视频帧
+    """
+    if offset is None or dt_box is None or len(dt_box) == 0 or offset == (0, 0):
+        return dt_box
+    offset_x, offset_y = offset
+    return [[(point[0] + offset_x, point[1] + offset_y) for point in box] for box in dt_box]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+"""Benchmark serial vs. process-pool word segmentation of an SRT file.
+
+Generates a synthetic SRT (run-together English words, typos from
+``typoMap.json``, mixed Chinese/English lines), runs
+``backend.tools.reformat.execute`` once serially and once with a worker pool
+on copies of it, and checks that both outputs are byte-identical.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pysrt  # noqa: E402
+
+from backend.tools import reformat  # noqa: E402
+
+WORDS = ["we", "don't", "know", "what", "to", "do", "about", "the", "weather", "tomorrow", "morning", "she",
+         "said", "that", "it's", "going", "to", "be", "fine", "let's", "go", "home", "now", "please", "listen",
+         "I'm", "sorry", "for", "your", "loss", "this", "is", "not", "over", "yet", "Dr.", "Smith", "50", "%"]
+CHINESE = ["你好", "我们走吧", "明天见", "这不是真的", "谢谢你"]
+TYPOS = ["l'm", "Let'sqo", "Iife"]
+
+
+def make_line(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(TYPOS))
+    # glue random neighbours together like OCR output without spaces
+    text = "".join(w if rng.random() < 0.6 else " " + w for w in words).strip()
+    text += rng.choice([".", "?", "!", ","])
+    if rng.random() < 0.2:
+        text = rng.choice(CHINESE) + "  " + text
+    return text
+
+
+def make_srt(path: str, lines: int, seed: int):
+    rng = random.Random(seed)
+    subs = pysrt.SubRipFile()
+    for i in range(lines):
+        subs.append(pysrt.SubRipItem(i + 1, start=pysrt.SubRipTime(milliseconds=i * 2000),
+                                     end=pysrt.SubRipTime(milliseconds=i * 2000 + 1500), text=make_line(rng)))
+    subs.save(path, encoding="utf-8")
+
+
+def timed_execute(source: str, target: str, lang: str, worker_num: int) -> float:
+    shutil.copy(source, target)
+    # every run starts cold, as a fresh extraction process would
+    reformat.segment.cache_clear()
+    start = time.perf_counter()
+    reformat.execute(target, lang, worker_num, min_lines_per_worker=1)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reformat.execute")
+    parser.add_argument("--lines", type=int, default=2000, help="Subtitle lines in the synthetic SRT")
+    parser.add_argument("--workers", default="2,4", help="Comma separated worker counts to compare with serial")
+    parser.add_argument("--lang", default="en", help="REC_CHAR_TYPE passed to reformat.execute")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.srt")
+        make_srt(source, args.lines, args.seed)
+        # load the word tables once so the serial run is not charged for it
+        reformat.get_segmenter()
+        serial_path = os.path.join(tmp, "serial.srt")
+        serial_time = timed_execute(source, serial_path, args.lang, 1)
+        with open(serial_path, "rb") as f:
+            serial = f.read()
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>9} {'equal':>6}")
+        print(f"{1:>8} {serial_time:>10.3f} {'1.0x':>9} {'-':>6}")
+        for worker_num in (int(w) for w in args.workers.split(",")):
+            path = os.path.join(tmp, f"pool{worker_num}.srt")
+            pool_time = timed_execute(source, path, args.lang, worker_num)
+            with open(path, "rb") as f:
+                equal = f.read() == serial
+            print(f"{worker_num:>8} {pool_time:>10.3f} {serial_time / pool_time:>8.1f}x {str(equal):>6}")
+
+
+if __name__ == "__main__":
+    main()
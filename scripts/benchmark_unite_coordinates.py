@@ -0,0 +1,79 @@
+"""Benchmark coordinate unification used before watermark detection.
+
+Compares the original pairwise ``_unite_coordinates`` loop against the grid
+index in ``backend.tools.coordinates`` on synthetic box sets: a few stable
+subtitle/watermark positions with detector jitter plus random scene text.
+Both results are checked to be identical.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.tools.coordinates import is_coordinate_similar, unite_coordinates  # noqa: E402
+
+
+def legacy_unite_coordinates(coordinates_list, tolerance_x, tolerance_y):
+    """The original O(n^2) implementation from SubtitleExtractor."""
+    coordinates_list = list(coordinates_list)
+    index = 0
+    for coordinate in coordinates_list:
+        for i in coordinates_list:
+            if is_coordinate_similar(coordinate, i, tolerance_x, tolerance_y):
+                coordinates_list[index] = i
+        index += 1
+    return coordinates_list
+
+
+def make_boxes(count: int, clusters: int, scene_rate: float, seed: int) -> list:
+    """Generate (xmin, xmax, ymin, ymax) boxes on a 1920x1080 frame."""
+    rng = random.Random(seed)
+    centres = [(rng.randint(0, 1500), rng.randint(0, 1000)) for _ in range(clusters)]
+    boxes = []
+    for _ in range(count):
+        if rng.random() < scene_rate:
+            x, y = rng.randint(0, 1800), rng.randint(0, 1040)
+            boxes.append((x, x + rng.randint(20, 400), y, y + rng.randint(20, 60)))
+            continue
+        x, y = rng.choice(centres)
+        width = 300 + (x % 7) * 40
+        boxes.append((x + rng.randint(-6, 6), x + width + rng.randint(-6, 6),
+                      y + rng.randint(-3, 3), y + 40 + rng.randint(-3, 3)))
+    return boxes
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark _unite_coordinates")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Comma separated box counts")
+    parser.add_argument("--clusters", type=int, default=8, help="Stable subtitle/watermark positions")
+    parser.add_argument("--scene-rate", type=float, default=0.2, help="Share of randomly placed scene text boxes")
+    parser.add_argument("--tolerance-x", type=int, default=100, help="PIXEL_TOLERANCE_X")
+    parser.add_argument("--tolerance-y", type=int, default=50, help="PIXEL_TOLERANCE_Y")
+    parser.add_argument("--legacy-limit", type=int, default=20000,
+                        help="Skip the quadratic implementation above this many boxes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'boxes':>8} {'legacy s':>10} {'grid s':>10} {'speedup':>9} {'equal':>6}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        boxes = make_boxes(size, args.clusters, args.scene_rate, args.seed)
+        grid, grid_time = timed(unite_coordinates, boxes, args.tolerance_x, args.tolerance_y)
+        if size > args.legacy_limit:
+            print(f"{size:>8} {'-':>10} {grid_time:>10.3f} {'-':>9} {'-':>6}")
+            continue
+        legacy, legacy_time = timed(legacy_unite_coordinates, boxes, args.tolerance_x, args.tolerance_y)
+        speedup = legacy_time / grid_time if grid_time else float("inf")
+        print(f"{size:>8} {legacy_time:>10.3f} {grid_time:>10.3f} {speedup:>8.1f}x {str(legacy == grid):>6}")
+
+
+if __name__ == "__main__":
+    main()
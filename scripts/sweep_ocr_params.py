@@ -0,0 +1,165 @@
+"""Sweep post-processing settings over a saved OCR result file.
+
+Loads a ``VIDEO.ocr.npz`` file written by an earlier extraction and scores a
+grid of ``THRESHOLD_TEXT_SIMILARITY``, ``DROP_SCORE``,
+``SUB_AREA_DEVIATION_RATE`` and ``PIXEL_TOLERANCE_X/Y`` values against a
+reference SRT. Every setting runs the same box selection, deduplication and
+timeline code as ``--from-ocr-cache``, in memory and without OCR. The grid is
+spread over a process pool.
+
+Without a subtitle area the extractor keeps every box whatever its score, so
+``DROP_SCORE`` and ``SUB_AREA_DEVIATION_RATE`` have no effect and only their
+first values are used. The watermark areas removed and the subtitle band chosen
+during the extraction are recorded in the OCR file and reapplied, as
+``--from-ocr-cache`` does. The pixel tolerances only unite box coordinates
+before watermark removal, so they are swept only when a watermark filter was
+recorded; otherwise only their first values are used.
+
+Scores per setting:
+  char_acc  1 - character error rate over the whole transcript
+  line_f1   F1 of subtitle lines matched by time overlap and text similarity
+  time_iou  mean temporal IoU of the matched reference lines
+  seconds   time spent regenerating the subtitles
+"""
+import argparse
+import csv
+import itertools
+import os
+import re
+import sys
+import time
+import unicodedata
+from multiprocessing import Pool, cpu_count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pysrt  # noqa: E402
+from Levenshtein import distance, ratio  # noqa: E402
+
+from backend import main as extractor_main  # noqa: E402
+
+config = extractor_main.config
+
+PARAMS = ("THRESHOLD_TEXT_SIMILARITY", "DROP_SCORE", "SUB_AREA_DEVIATION_RATE", "PIXEL_TOLERANCE_X",
+          "PIXEL_TOLERANCE_Y")
+
+# per worker process: the extractor restored from the OCR file and the reference subtitles
+_extractor = None
+_reference = None
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text))
+
+
+def read_reference(path: str) -> list:
+    """Return [(start_ms, end_ms, text), ...] from an SRT file."""
+    return [(sub.start.ordinal, sub.end.ordinal, sub.text) for sub in pysrt.open(path, encoding="utf-8")]
+
+
+def score(reference: list, hypothesis: list, match_threshold: float) -> dict:
+    """Compare generated subtitles against the reference, both as [(start_ms, end_ms, text), ...]."""
+    ref_text = [normalize(text) for _, _, text in reference]
+    hyp_text = [normalize(text) for _, _, text in hypothesis]
+    ref_all, hyp_all = "\n".join(ref_text), "\n".join(hyp_text)
+    char_acc = max(0.0, 1 - distance(ref_all, hyp_all) / max(len(ref_all), 1))
+    if len(reference) == 0 or len(hypothesis) == 0:
+        return {"char_acc": char_acc, "line_f1": 0.0, "time_iou": 0.0}
+    ref_start, ref_end = np.array([[s, e] for s, e, _ in reference], dtype=np.float64).T
+    hyp_start, hyp_end = np.array([[s, e] for s, e, _ in hypothesis], dtype=np.float64).T
+    # lines overlapping in time are the only candidates for a match
+    overlap = np.minimum(ref_end[:, None], hyp_end[None, :]) - np.maximum(ref_start[:, None], hyp_start[None, :])
+    union = np.maximum(ref_end[:, None], hyp_end[None, :]) - np.minimum(ref_start[:, None], hyp_start[None, :])
+    similarity = np.zeros(overlap.shape)
+    for i, j in zip(*np.nonzero(overlap > 0)):
+        similarity[i, j] = ratio(ref_text[i], hyp_text[j])
+    matched = similarity >= match_threshold
+    ref_matched = matched.any(axis=1)
+    recall = ref_matched.mean()
+    precision = matched.any(axis=0).mean()
+    line_f1 = 0.0 if recall + precision == 0 else 2 * recall * precision / (recall + precision)
+    # timing of each matched reference line against its most similar overlapping line
+    best = similarity.argmax(axis=1)
+    rows = np.nonzero(ref_matched)[0]
+    iou = overlap[rows, best[rows]] / np.maximum(union[rows, best[rows]], 1)
+    time_iou = float(iou.mean()) if len(rows) > 0 else 0.0
+    return {"char_acc": char_acc, "line_f1": float(line_f1), "time_iou": time_iou}
+
+
+def init_worker(sidecar_path: str, reference_path: str):
+    global _extractor, _reference
+    _extractor = extractor_main.SubtitleExtractor.from_ocr_sidecar(sidecar_path)
+    _reference = read_reference(reference_path)
+
+
+def evaluate(setting: dict, match_threshold: float) -> dict:
+    """Regenerate the subtitles with one setting and score them."""
+    for name, value in setting.items():
+        setattr(config, name, value)
+    start = time.perf_counter()
+    _extractor.select_ocr_sidecar_boxes()
+    subtitles = _extractor.generate_subtitle_items()
+    seconds = time.perf_counter() - start
+    return dict(setting, **score(_reference, subtitles, match_threshold), lines=len(subtitles), seconds=seconds)
+
+
+def values(text: str, cast) -> list:
+    return [cast(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep post-processing settings over a saved OCR result file")
+    parser.add_argument("ocr_file", help="VIDEO.ocr.npz written by an extraction with OCR_SIDECAR enabled")
+    parser.add_argument("reference", help="Reference SRT for the same video")
+    parser.add_argument("--similarity", default=str(config.THRESHOLD_TEXT_SIMILARITY),
+                        help="Comma separated THRESHOLD_TEXT_SIMILARITY values")
+    parser.add_argument("--drop-score", default=str(config.DROP_SCORE), help="Comma separated DROP_SCORE values")
+    parser.add_argument("--deviation-rate", default=str(config.SUB_AREA_DEVIATION_RATE),
+                        help="Comma separated SUB_AREA_DEVIATION_RATE values")
+    parser.add_argument("--tolerance-x", default=str(config.PIXEL_TOLERANCE_X),
+                        help="Comma separated PIXEL_TOLERANCE_X values")
+    parser.add_argument("--tolerance-y", default=str(config.PIXEL_TOLERANCE_Y),
+                        help="Comma separated PIXEL_TOLERANCE_Y values")
+    parser.add_argument("--match-threshold", type=float, default=0.8,
+                        help="Text similarity for a generated line to match a reference line")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="Worker processes")
+    parser.add_argument("--csv", help="Also write all results to this CSV file")
+    args = parser.parse_args()
+
+    drop_score, deviation_rate = values(args.drop_score, float), values(args.deviation_rate, float)
+    tolerance_x, tolerance_y = values(args.tolerance_x, int), values(args.tolerance_y, int)
+    meta = extractor_main.ocr_sidecar.load_sidecar(args.ocr_file).meta
+    if meta["sub_area"] is None:
+        drop_score, deviation_rate = drop_score[:1], deviation_rate[:1]
+        print("No subtitle area in the OCR file: DROP_SCORE and SUB_AREA_DEVIATION_RATE have no effect, "
+              "the recorded watermark and subtitle band choices are reapplied")
+    if meta["sub_area"] is not None or meta.get("watermark_areas") is None:
+        tolerance_x, tolerance_y = tolerance_x[:1], tolerance_y[:1]
+    grid = [dict(zip(PARAMS, combination)) for combination in
+            itertools.product(values(args.similarity, float), drop_score, deviation_rate, tolerance_x,
+                              tolerance_y)]
+    print(f"{len(grid)} settings on {min(args.workers, len(grid))} workers")
+    start = time.perf_counter()
+    with Pool(max(min(args.workers, len(grid)), 1), initializer=init_worker,
+              initargs=(args.ocr_file, args.reference)) as pool:
+        results = pool.starmap(evaluate, [(setting, args.match_threshold) for setting in grid])
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: (r["char_acc"], r["line_f1"], r["time_iou"]), reverse=True)
+
+    print(f"{'similarity':>10} {'drop':>6} {'dev':>6} {'tol_x':>6} {'tol_y':>6} "
+          f"{'char_acc':>9} {'line_f1':>8} {'time_iou':>9} {'lines':>6} {'seconds':>8}")
+    for r in results:
+        print(f"{r['THRESHOLD_TEXT_SIMILARITY']:>10} {r['DROP_SCORE']:>6} {r['SUB_AREA_DEVIATION_RATE']:>6} "
+              f"{r['PIXEL_TOLERANCE_X']:>6} {r['PIXEL_TOLERANCE_Y']:>6} {r['char_acc']:>9.4f} "
+              f"{r['line_f1']:>8.4f} {r['time_iou']:>9.4f} {r['lines']:>6} {r['seconds']:>8.3f}")
+    print(f"total {elapsed:.2f}s")
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()